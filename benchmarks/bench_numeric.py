@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''benchmark of the numeric modes (Decimal vs fixed-point)
+
+usage:
+    python benchmarks/bench_numeric.py
+'''
+
+import random
+import timeit
+from saapibf.common import n2d, n2fp, fp_div, PRICE_SCALE, SIZE_SCALE
+from saapibf.realtime import RealtimeAPI
+
+POSITIONS = 50
+NUMBER = 20000
+
+
+def make_positions():
+    '''positions as the raw JSON values (price, size)'''
+    rnd = random.Random(1)
+    return [(rnd.randrange(4900000, 5100000), rnd.randrange(1, 100000) / 10000) for _ in range(POSITIONS)]
+
+
+def make_ticker_msg():
+    '''ticker message as decoded by json'''
+    return {'product_code': 'FX_BTC_JPY', 'timestamp': '2019-01-01T00:00:00.1234567Z', 'tick_id': 1,
+            'best_bid': 5000000.0, 'best_ask': 5000100.0, 'best_bid_size': 0.12, 'best_ask_size': 1.5,
+            'total_bid_depth': 1000.0, 'total_ask_depth': 1000.0, 'ltp': 5000050.0,
+            'volume': 100000.0, 'volume_by_product': 100000.0}
+
+
+def bench(name, func, number=NUMBER):
+    '''print the time per call'''
+    elapsed = min(timeit.repeat(func, number=number, repeat=5))
+    print('{:<40} {:>8.2f} us'.format(name, elapsed / number * 1e6))
+
+
+def main():
+    '''run the benchmarks'''
+    raw = make_positions()
+    ltp = 5000050
+
+    # unrealized PnL of the positions (converted in advance as the model classes do)
+    dec_pos = [(n2d(price), n2d(size)) for price, size in raw]
+    dec_ltp = n2d(ltp)
+    fp_pos = [(n2fp(price, PRICE_SCALE), n2fp(size, SIZE_SCALE)) for price, size in raw]
+    fp_ltp = n2fp(ltp, PRICE_SCALE)
+
+    def pnl_decimal():
+        return sum((dec_ltp - price) * size for price, size in dec_pos)
+
+    def pnl_fixed():
+        # exact products, rounded once
+        return fp_div(sum((fp_ltp - price) * size for price, size in fp_pos), SIZE_SCALE)
+
+    bench('PnL of %d positions (Decimal)' % POSITIONS, pnl_decimal)
+    bench('PnL of %d positions (fixed-point)' % POSITIONS, pnl_fixed)
+
+    # conversion of the realtime ticker values
+    msg = make_ticker_msg()
+
+    def ticker_decimal():
+        data = RealtimeAPI.TickerData(msg)
+        return (n2d(data.best_bid), n2d(data.best_ask), n2d(data.ltp),
+                n2d(data.best_bid) + n2d(data.best_ask))
+
+    def ticker_fixed():
+        data = RealtimeAPI.TickerData(msg)
+        return (data.best_bid_fp, data.best_ask_fp, data.ltp_fp,
+                data.best_bid_fp + data.best_ask_fp)
+
+    bench('ticker prices (Decimal)', ticker_decimal)
+    bench('ticker prices (fixed-point *_fp)', ticker_fixed)
+
+
+if __name__ == '__main__':
+    main()
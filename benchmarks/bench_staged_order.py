@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+'''benchmark of the order path from the call to the wire (staged vs normal)
+
+The transport stamps the time when the request reaches it, so the
+numbers are the client side cost (check, serialize, sign, headers)
+without the network.
+
+usage:
+    python benchmarks/bench_staged_order.py [count]
+'''
+
+import statistics
+import sys
+import time
+
+from saapibf.broker import BrokerAPI
+from saapibf.const import OrderSide
+from saapibf.transport import FakeTransport
+
+COUNT = 20000
+PRICE = 5000000
+AMOUNT = 0.01
+
+
+class WireTransport(FakeTransport):
+    '''FakeTransport stamping the time of the request'''
+
+    def __init__(self):
+        super().__init__(record=False)
+        self.wire_time = None
+        self.add('POST', '/v1/me/sendchildorder', self.__send)
+
+    def __send(self, *_):
+        self.wire_time = time.perf_counter()
+        return 200, {'child_order_acceptance_id': 'JRF1'}
+
+
+def bench(name, transport, func, count):
+    '''print p50 and p99 from the call to the wire'''
+    elapsed = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        elapsed.append(transport.wire_time - start)
+    elapsed.sort()
+    print('{:<24} p50 {:>6.1f} us  p99 {:>6.1f} us'.format(
+        name, statistics.median(elapsed) * 1e6, elapsed[int(count * 0.99)] * 1e6))
+
+
+def main():
+    '''run the benchmarks'''
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    transport = WireTransport()
+    broker = BrokerAPI('key', 'secret', log=False, transport=transport)
+    armed = broker.stage_order(OrderSide.BUY, PRICE, AMOUNT, warm=False)
+    bench('order_buy_limit', transport, lambda: broker.order_buy_limit(PRICE, AMOUNT), count)
+    bench('stage_order + fire', transport, armed.fire, count)
+    broker.close()
+
+
+if __name__ == '__main__':
+    main()
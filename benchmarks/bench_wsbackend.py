@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+'''benchmark of the WebSocket backends (receive throughput)
+
+A local server pushes board frames as channelMessage notifications and
+closes the connection. Only the raw message callback of the backend is
+set, so the numbers are of the WebSocket layer.
+
+usage:
+    python benchmarks/bench_wsbackend.py [frames] [levels]
+'''
+
+import functools
+import json
+import random
+import sys
+import threading
+import time
+
+from websockets.sync.server import serve
+
+from saapibf.wsbackend import WebSocketClientBackend, WebsocketsBackend
+
+FRAMES = 20000
+LEVELS = 26
+
+
+def make_frames(count, levels):
+    '''board frames (about 2 KB each by default)'''
+    rnd = random.Random(1)
+    frames = []
+    for _ in range(count):
+        mid = rnd.randrange(4900000, 5100000)
+        board = {'mid_price': mid,
+                 'bids': [{'price': mid - i, 'size': rnd.randrange(1, 100000) / 10000} for i in range(levels)],
+                 'asks': [{'price': mid + i, 'size': rnd.randrange(1, 100000) / 10000} for i in range(levels)]}
+        frames.append(json.dumps({'jsonrpc': '2.0', 'method': 'channelMessage',
+                                  'params': {'channel': 'lightning_board_FX_BTC_JPY', 'message': board}}))
+    return frames
+
+
+class PushServer(object):
+    '''local server pushing the frames on each connection'''
+
+    def __init__(self, frames):
+        self.__frames = frames
+        self.__server = serve(self.__handler, '127.0.0.1', 0, compression=None, close_timeout=0.1)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    def __handler(self, ws):
+        for frame in self.__frames:
+            ws.send(frame)
+        ws.close()
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.__server.shutdown()
+        self.__thread.join()
+
+    @property
+    def url(self):
+        '''[property] URL of the server'''
+        return 'ws://127.0.0.1:%d' % self.__server.socket.getsockname()[1]
+
+
+def bench(name, backend, frames):
+    '''print the received messages per second'''
+    received = [0, None]
+
+    def on_message(_, __):
+        received[0] += 1
+        received[1] = time.perf_counter()
+
+    with PushServer(frames) as server:
+        conn = backend(server.url,
+                       on_open=lambda _: None,
+                       on_message=on_message,
+                       on_close=lambda _, *__: None,
+                       on_error=lambda _, __: None)
+        start = time.perf_counter()
+        conn.run_forever(0, 10)
+    count, end = received
+    if count != len(frames) or end is None:
+        print('{:<40} received {} of {}'.format(name, count, len(frames)))
+        return
+    print('{:<40} {:>8.1f}k msg/s'.format(name, count / (end - start) / 1000))
+
+
+def main():
+    '''run the benchmarks'''
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FRAMES
+    levels = int(sys.argv[2]) if len(sys.argv) > 2 else LEVELS
+    frames = make_frames(count, levels)
+    print('{} frames, {:.0f} bytes average'.format(count, sum(len(f) for f in frames) / count))
+    bench('websocket-client, UTF-8 validated', WebSocketClientBackend, frames)
+    bench('websocket-client, validation skipped',
+          functools.partial(WebSocketClientBackend, skip_utf8_validation=True), frames)
+    bench('websockets (sync)', WebsocketsBackend, frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''stress test of PrivateAPI shared by threads
+
+A local HTTP server answers the private requests and drops a part of
+the connections without response. The threads share one PrivateAPI and
+send GET and POST requests alternately. Each pool_size / thread_local
+setting prints the successes, the errors and the resets of the shared
+pool (a thread_local session is reset by its thread, not counted).
+A request is retried once, so an error is expected only when the retry
+is dropped too (about drop rate ** 2 of the requests).
+
+usage:
+    python benchmarks/stress_private.py [threads] [requests per thread] [drop rate]
+'''
+
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from saapibf.private import PrivateAPI
+from saapibf.transport import RequestsTransport
+
+THREADS = 64
+REQUESTS = 200
+DROP_RATE = 0.005
+
+
+class StressServer(ThreadingHTTPServer):
+    '''local server of the private API'''
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, drop_rate):
+        super().__init__(('127.0.0.1', 0), StressHandler)
+        self.drop_rate = drop_rate
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self):
+        '''[property] URL of the server'''
+        return 'http://127.0.0.1:%d' % self.server_port
+
+
+class StressHandler(BaseHTTPRequestHandler):
+    '''keep-alive handler dropping drop_rate of the requests'''
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_):     # pylint: disable=arguments-differ
+        pass
+
+    def do_GET(self):   # pylint: disable=invalid-name
+        '''GET'''
+        self.__reply()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        '''POST'''
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.__reply()
+
+    def __reply(self):
+        if random.random() < self.server.drop_rate:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        body = json.dumps({'child_order_acceptance_id': 'JRF1'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def stress(url, threads, requests, *, pool_size, thread_local):
+    '''run the threads on one PrivateAPI: (successes, errors, generation, elapsed)'''
+    transport = RequestsTransport(pool_size=pool_size, thread_local=thread_local)
+    api = PrivateAPI('key', 'secret', get_timeout=5, post_timeout=5, transport=transport)
+    api._PrivateAPI__api_endpoint = url     # pylint: disable=protected-access
+    successes = [0]
+    errors = []
+    lock = threading.Lock()
+
+    def run():
+        for i in range(requests):
+            try:
+                if i % 2:
+                    api.send_childorder('BTC_JPY', 'LIMIT', 'BUY', 5000000, 0.01)
+                else:
+                    api.get_getbalance()
+                with lock:
+                    successes[0] += 1
+            except Exception as e:     # pylint: disable=broad-except
+                with lock:
+                    errors.append(repr(e)[:80])
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    generation = transport.generation
+    transport.close()
+    return successes[0], errors, generation, elapsed
+
+
+def main():
+    '''run the stress test'''
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else THREADS
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else REQUESTS
+    drop_rate = float(sys.argv[3]) if len(sys.argv) > 3 else DROP_RATE
+    print('{} threads x {} requests, drop rate {}'.format(threads, requests, drop_rate))
+    with StressServer(drop_rate) as server:
+        for thread_local in (False, True):
+            for pool_size in (10, threads):
+                successes, errors, generation, elapsed = stress(server.url, threads, requests,
+                                                                pool_size=pool_size, thread_local=thread_local)
+                print('thread_local={!s:<5} pool_size={:<3} ok {:>6}  errors {:>4}  resets {:>4}  {:>6.0f} req/s'
+                      .format(thread_local, pool_size, successes, len(errors), generation, successes / elapsed))
+                for error in sorted(set(errors)):
+                    print('    ' + error)
+
+
+if __name__ == '__main__':
+    main()
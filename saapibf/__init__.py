@@ -1,10 +1,44 @@
 
 '''
 saapibf - bitFlyer Lightning API library for Python
+
+The subsystems are imported on first use (module __getattr__), so
+requests, urllib3 and websocket are not imported until needed.
 '''
-from .public import PublicAPI
-from .private import PrivateAPI
-from .broker import BrokerAPI
-from .brokerfx import BrokerFXAPI
-from .realtime import RealtimeAPI
-from . import const
+import importlib
+
+TYPE_CHECKING = False   # same as typing.TYPE_CHECKING without importing typing
+if TYPE_CHECKING:       # for static analysis (pylint E0603, IDEs); not imported at run time
+    from .public import PublicAPI
+    from .private import PrivateAPI
+    from .broker import BrokerAPI
+    from .brokerfx import BrokerFXAPI
+    from .realtime import RealtimeAPI
+    from . import const
+
+# attribute: (module, name in the module; None is the module itself)
+_LAZY_ATTRS = {
+    'PublicAPI': ('.public', 'PublicAPI'),
+    'PrivateAPI': ('.private', 'PrivateAPI'),
+    'BrokerAPI': ('.broker', 'BrokerAPI'),
+    'BrokerFXAPI': ('.brokerfx', 'BrokerFXAPI'),
+    'RealtimeAPI': ('.realtime', 'RealtimeAPI'),
+    'const': ('.const', None),
+}
+
+__all__ = list(_LAZY_ATTRS)     # pylint: disable=undefined-all-variable
+
+
+def __getattr__(name):
+    try:
+        module_name, attr_name = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name)) from None
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr_name is None else getattr(module, attr_name)
+    globals()[name] = value     # not called again
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+'''stream(realtime) API module for asyncio
+
+The same channels and message types as RealtimeAPI are delivered to
+async iterators on the event loop, without a thread. Several subscribers
+share one socket, and each subscriber has its own bounded queue. When the
+queue is full the oldest message is dropped (counted by dropped), so a
+slow subscriber does not block the others.
+
+usage:
+    feed = AsyncRealtimeAPI()
+    ticker = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+    fx = feed.subscribe_pair(AsyncRealtimeAPI.TradePair.FX_BTC_JPY)
+    task = asyncio.ensure_future(feed.run())
+    async for msg in ticker:
+        print(msg.pair, msg.data.ltp)
+
+msg is FeedMessage(channel, header, pair, data). data is BoardData,
+TickerData or the list of ExecutionData of RealtimeAPI, and is shared by
+the subscribers (do not modify it).
+
+requires websockets (optional dependency).
+'''
+
+import asyncio
+import collections
+import json
+import random
+import time
+import websockets
+from .realtime import RealtimeAPI, parse_channel
+
+
+FeedMessage = collections.namedtuple('FeedMessage', ['channel', 'header', 'pair', 'data'])
+
+
+class Subscription(object):
+    '''async iterator of the messages of the subscribed channels'''
+
+    __END = object()
+
+    def __init__(self, feed, channels, queue_size):
+        self.channels = channels
+        self.dropped = 0
+        self.closed = False
+        self.__feed = feed
+        self.__queue = asyncio.Queue(maxsize=queue_size)
+
+    def _put(self, msg):
+        '''put the message (drop the oldest if full)'''
+        queue = self.__queue
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(msg)
+
+    def _end(self):
+        '''end the iteration'''
+        if not self.closed:
+            self.closed = True
+            self._put(self.__END)
+
+    def qsize(self):
+        '''number of the queued messages'''
+        return self.__queue.qsize()
+
+    async def get(self):
+        '''get the next message (None if closed)'''
+        msg = await self.__queue.get()
+        if msg is self.__END:
+            return None
+        return msg
+
+    def close(self):
+        '''unsubscribe'''
+        self.__feed.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.get()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+
+class AsyncRealtimeAPI(object):
+    '''
+    Realtime API for bitFlyer by JSON-RPC 2.0 over WebSocket (asyncio)
+
+    run() keeps the connection until stop(). If reconnect is True, it
+    reconnects with jittered exponential backoff and subscribes the
+    channels again (also when the handshake is rejected, e.g. HTTP 503
+    in maintenance). The subscriptions are ended when run() returns.
+    stop() called before run() makes the next run() return at once.
+    An error in decoding a message is passed to on_error and the message
+    is skipped.
+    '''
+
+    WS_URL = RealtimeAPI.WS_URL
+    RECONNECT_STABLE_TIME = RealtimeAPI.RECONNECT_STABLE_TIME
+
+    TradePair = RealtimeAPI.TradePair
+    InfoChannel = RealtimeAPI.InfoChannel
+    ListenChannel = RealtimeAPI.ListenChannel
+
+    BoardData = RealtimeAPI.BoardData
+    TickerData = RealtimeAPI.TickerData
+    ExecutionData = RealtimeAPI.ExecutionData
+
+    def __init__(self,
+                 *,
+                 queue_size=1000,
+                 ping_interval=30,
+                 ping_timeout=10,
+                 reconnect=True,
+                 reconnect_min_wait=0.05,
+                 reconnect_max_wait=10.0,
+                 on_error=None):
+        self.__queue_size = queue_size
+        self.__ping_interval = ping_interval
+        self.__ping_timeout = ping_timeout
+        self.__reconnect = reconnect
+        self.__reconnect_min_wait = reconnect_min_wait
+        self.__reconnect_max_wait = reconnect_max_wait
+        self.__cb_on_error = on_error
+
+        # channel: tuple of subscriptions (replaced on change)
+        self.__subs = {}
+        self.__ws = None
+        self.__stopped = None
+        self.__stop_requested = False
+        self.reconnect_count = 0
+
+    # subscription
+    def subscribe(self, channels, *, queue_size=None):
+        '''
+        Subscribe the channels
+
+        channels: ListenChannel or list of ListenChannel
+        return: Subscription
+        '''
+        if isinstance(channels, self.ListenChannel):
+            channels = [channels]
+        channels = tuple(channel.value for channel in channels)
+        sub = Subscription(self, channels, queue_size or self.__queue_size)
+        for channel in channels:
+            subs = self.__subs.get(channel, ())
+            self.__subs[channel] = subs + (sub,)
+            if len(subs) == 0:  # pylint: disable-msg=C1801
+                self.__send_subscribe(channel)
+        return sub
+
+    def subscribe_pair(self, pair, *, headers=None, queue_size=None):
+        '''
+        Subscribe the channels of the pair
+
+        headers: list of InfoChannel (all if None)
+        return: Subscription
+        '''
+        headers = headers if headers is not None else list(self.InfoChannel)
+        channels = [self.ListenChannel(header.value + '_' + pair.value) for header in headers]
+        return self.subscribe(channels, queue_size=queue_size)
+
+    def unsubscribe(self, sub):
+        '''end the subscription'''
+        for channel in sub.channels:
+            subs = tuple(wk_sub for wk_sub in self.__subs.get(channel, ()) if wk_sub is not sub)
+            if len(subs) > 0:   # pylint: disable-msg=C1801
+                self.__subs[channel] = subs
+            elif channel in self.__subs:
+                del self.__subs[channel]
+                self.__send_unsubscribe(channel)
+        sub._end()  # pylint: disable=protected-access
+
+    def __send_subscribe(self, channel):
+        if self.__ws is not None:
+            asyncio.ensure_future(self.__send('subscribe', channel))
+
+    def __send_unsubscribe(self, channel):
+        if self.__ws is not None:
+            asyncio.ensure_future(self.__send('unsubscribe', channel))
+
+    async def __send(self, method, channel):
+        ws = self.__ws
+        if ws is None:
+            return
+        try:
+            await ws.send(json.dumps({"method": method, "params": {"channel": channel}}))
+        except websockets.ConnectionClosed:
+            pass    # subscribed again on reconnect
+
+    # message
+    def __on_message(self, message):
+        rcv_msg = json.loads(message)
+        if rcv_msg.get("method") != "channelMessage":
+            return
+
+        parsed_prms = rcv_msg["params"]
+        parsed_channel = parsed_prms["channel"]
+        subs = self.__subs.get(parsed_channel)
+        if not subs:
+            return
+
+        parsed_message = parsed_prms["message"]
+        parsed_ch_header, parsed_ch_pair = parse_channel(parsed_channel)
+        if parsed_ch_header == self.InfoChannel.BOARD_SNAPSHOT.value \
+                or parsed_ch_header == self.InfoChannel.BOARD.value:
+            data = self.BoardData(parsed_message)
+        elif parsed_ch_header == self.InfoChannel.TICKER.value:
+            data = self.TickerData(parsed_message)
+        elif parsed_ch_header == self.InfoChannel.EXECUTIONS.value:
+            data = [self.ExecutionData(execution) for execution in parsed_message]
+        else:
+            data = parsed_message
+
+        msg = FeedMessage(parsed_channel, parsed_ch_header, parsed_ch_pair, data)
+        for sub in subs:
+            sub._put(msg)   # pylint: disable=protected-access
+
+    def __on_error(self, e):
+        if self.__cb_on_error:
+            try:
+                self.__cb_on_error(self, e)
+            except:     # pylint: disable-msg=W0702
+                import traceback
+                traceback.print_exc()
+
+    # connection
+    async def __connect(self):
+        async with websockets.connect(self.WS_URL,
+                                      ping_interval=self.__ping_interval,
+                                      ping_timeout=self.__ping_timeout,
+                                      max_size=None) as ws:
+            self.__ws = ws
+            if self.__stopped.is_set():
+                return
+            for channel in list(self.__subs):
+                await ws.send(json.dumps({"method": "subscribe", "params": {"channel": channel}}))
+            async for message in ws:
+                try:
+                    self.__on_message(message)
+                except Exception as e:  # pylint: disable=broad-except
+                    self.__on_error(e)
+
+    async def run(self):
+        '''To start listening (until stop)'''
+        self.__stopped = asyncio.Event()
+        if self.__stop_requested:
+            self.__stopped.set()
+        wait = self.__reconnect_min_wait
+        try:
+            while not self.__stopped.is_set():
+                connected_time = time.time()
+                try:
+                    await self.__connect()
+                except (websockets.exceptions.WebSocketException, OSError, asyncio.TimeoutError) as e:
+                    # closed, or the handshake failed (e.g. HTTP 503 in maintenance)
+                    self.__on_error(e)
+                finally:
+                    self.__ws = None
+                if self.__stopped.is_set() or not self.__reconnect:
+                    break
+
+                # disconnected
+                if time.time() - connected_time >= self.RECONNECT_STABLE_TIME:
+                    wait = self.__reconnect_min_wait
+                try:
+                    await asyncio.wait_for(self.__stopped.wait(), random.uniform(0, wait))
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                wait = min(wait * 2, self.__reconnect_max_wait)
+                self.reconnect_count += 1
+        finally:
+            self.__stopped = None
+            self.__stop_requested = False
+            for subs in list(self.__subs.values()):
+                for sub in subs:
+                    sub._end()  # pylint: disable=protected-access
+            self.__subs = {}
+
+    async def stop(self):
+        '''To stop listening (also before run())'''
+        if self.__stopped is not None:
+            self.__stopped.set()
+        else:
+            self.__stop_requested = True
+        ws = self.__ws
+        if ws is not None:
+            await ws.close()
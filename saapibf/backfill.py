@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+'''historical executions backfill module
+
+The execution id range (from_id, to_id] is split into segments and the
+segments are fetched by a small worker pool under a shared request rate.
+Each segment is paged backward by the before/after cursor of
+getexecutions, so one id is never written twice.
+
+The output is CSV or fixed-width binary (RECORD_FORMAT). The order of
+records is not sorted. With a state file, the backfill can be resumed
+after interruption: the output is truncated to the last committed page
+and each segment restarts from its committed cursor.
+
+usage: python -m saapibf.backfill PAIR FROM_ID TO_ID OUTPUT [options]
+'''
+
+import argparse
+import csv
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .common import str2ns
+from .const import OrderSide
+from .public import PublicAPI
+
+# id, side(1:BUY, -1:SELL, 0:other), price, size, exec_ns, buy aid, sell aid
+RECORD_FORMAT = '<qbddq25s25s'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+CSV_HEADER = ['id', 'side', 'price', 'size', 'exec_date',
+              'buy_child_order_acceptance_id', 'sell_child_order_acceptance_id']
+_SIDE_TO_CODE = {OrderSide.BUY: 1, OrderSide.SELL: -1}
+
+
+class RateLimiter(object):
+    '''request rate limiter shared by threads (requests per second)'''
+
+    def __init__(self, rate):
+        self.__interval = 1.0 / rate
+        self.__next_time = time.time()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        '''wait for the next request slot'''
+        with self.__lock:
+            now = time.time()
+            wait = self.__next_time - now
+            self.__next_time = max(now, self.__next_time) + self.__interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ExecutionBackfill(object):
+    '''Parallel backfill of historical executions'''
+
+    FORMAT_CSV = 'csv'
+    FORMAT_BIN = 'bin'
+
+    def __init__(self, pair, from_id, to_id, output_path,
+                 *,
+                 fmt=FORMAT_CSV,
+                 workers=4,
+                 segments=None,
+                 rate=1.0,
+                 page_size=500,
+                 state_path=None,
+                 retry=3,
+                 timeout=10):
+        self.pair = pair
+        self.from_id = int(from_id)
+        self.to_id = int(to_id)
+        self.output_path = output_path
+        self.fmt = fmt
+        self.workers = workers
+        self.page_size = page_size
+        self.state_path = state_path
+        self.retry = retry
+        self.written = 0
+        self.__segment_count = segments if segments is not None else workers * 4
+        self.__limiter = RateLimiter(rate)
+        self.__api = PublicAPI(timeout=timeout)
+        self.__lock = threading.Lock()
+        self.__state = None
+        self.__fout = None
+
+    def __make_segments(self):
+        '''split (from_id, to_id] into segments [after, before)'''
+        span = self.to_id - self.from_id
+        count = max(1, min(self.__segment_count, span))
+        bounds = [self.from_id + (span * i) // count for i in range(count + 1)]
+        return [{'after': bounds[i], 'cursor': bounds[i + 1] + 1, 'done': False} for i in range(count)]
+
+    def __load_state(self):
+        if self.state_path is not None and os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as fstate:
+                state = json.load(fstate)
+            if (state['pair'] == self.pair
+                    and state['from_id'] == self.from_id and state['to_id'] == self.to_id
+                    and os.path.exists(self.output_path)):
+                return state
+        return {'pair': self.pair, 'from_id': self.from_id, 'to_id': self.to_id,
+                'offset': 0, 'written': 0, 'segments': self.__make_segments()}
+
+    def __save_state(self):
+        if self.state_path is None:
+            return
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as fstate:
+            json.dump(self.__state, fstate)
+        os.replace(tmp_path, self.state_path)
+
+    def __open_output(self):
+        offset = self.__state['offset']
+        if offset > 0 and os.path.exists(self.output_path):
+            # resume: discard records after the last committed page
+            fout = open(self.output_path, 'r+b')
+            fout.truncate(offset)
+            fout.seek(offset)
+        else:
+            fout = open(self.output_path, 'wb')
+            if self.fmt == self.FORMAT_CSV:
+                fout.write(self.__encode_csv_rows([CSV_HEADER]))
+            self.__state['offset'] = fout.tell()
+        return fout
+
+    @staticmethod
+    def __encode_csv_rows(rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerows(rows)
+        return buf.getvalue().encode('utf8')
+
+    def __encode(self, executions):
+        if self.fmt == self.FORMAT_BIN:
+            return b''.join(struct.pack(RECORD_FORMAT,
+                                        ex['id'], _SIDE_TO_CODE.get(ex['side'], 0),
+                                        ex['price'], ex['size'], str2ns(ex['exec_date']),
+                                        ex['buy_child_order_acceptance_id'].encode('ascii'),
+                                        ex['sell_child_order_acceptance_id'].encode('ascii'))
+                            for ex in executions)
+        return self.__encode_csv_rows([[ex['id'], ex['side'], ex['price'], ex['size'], ex['exec_date'],
+                                        ex['buy_child_order_acceptance_id'],
+                                        ex['sell_child_order_acceptance_id']]
+                                       for ex in executions])
+
+    def __commit(self, segment, executions, cursor, done):
+        '''write the page and commit the cursor'''
+        data = self.__encode(executions) if executions else b''
+        with self.__lock:
+            if data:
+                self.__fout.write(data)
+                self.__fout.flush()
+            segment['cursor'] = cursor
+            segment['done'] = done
+            self.__state['offset'] = self.__fout.tell()
+            self.__state['written'] += len(executions)
+            self.written = self.__state['written']
+            self.__save_state()
+
+    def __fetch(self, segment):
+        '''fetch one page (with retry)'''
+        for count in range(self.retry):
+            self.__limiter.acquire()
+            try:
+                return self.__api.get_executions(self.pair, count=self.page_size,
+                                                 before=segment['cursor'], after=segment['after'])
+            except:     # pylint: disable-msg=W0702
+                if count + 1 >= self.retry:
+                    raise
+                time.sleep(2 ** count)
+        return []
+
+    def __run_segment(self, segment):
+        while not segment['done']:
+            res_list = self.__fetch(segment)
+            # dedupe: accept only the ids in the segment before the cursor
+            executions = [ex for ex in res_list if segment['after'] < ex['id'] < segment['cursor']]
+            if len(executions) == 0:
+                self.__commit(segment, [], segment['cursor'], True)
+                break
+            cursor = min(ex['id'] for ex in executions)
+            self.__commit(segment, executions, cursor, cursor <= segment['after'] + 1)
+
+    def run(self):
+        '''
+        Run the backfill
+
+        return: True if all segments are completed
+        '''
+        self.__state = self.__load_state()
+        self.__fout = self.__open_output()
+        try:
+            segments = [seg for seg in self.__state['segments'] if not seg['done']]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self.__run_segment, seg) for seg in segments]
+            result = True
+            for future in futures:
+                if future.exception() is not None:
+                    result = False
+        finally:
+            self.__fout.close()
+            self.__fout = None
+        return result
+
+
+def main(argv=None):
+    '''command line entry'''
+    parser = argparse.ArgumentParser(prog='python -m saapibf.backfill',
+                                     description='Backfill bitFlyer executions of the id range (FROM_ID, TO_ID].')
+    parser.add_argument('pair')
+    parser.add_argument('from_id', type=int)
+    parser.add_argument('to_id', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--format', dest='fmt', choices=[ExecutionBackfill.FORMAT_CSV, ExecutionBackfill.FORMAT_BIN],
+                        default=ExecutionBackfill.FORMAT_CSV)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1.0, help='requests per second')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--state', default=None, help='state file for resume (default: OUTPUT.state)')
+    args = parser.parse_args(argv)
+
+    backfill = ExecutionBackfill(args.pair, args.from_id, args.to_id, args.output,
+                                 fmt=args.fmt, workers=args.workers, rate=args.rate,
+                                 page_size=args.page_size,
+                                 state_path=args.state if args.state is not None else args.output + '.state')
+    result = backfill.run()
+    print('written=%d completed=%s' % (backfill.written, str(result)))
+    return 0 if result else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 '''Broker access module'''
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from .common import get_dt_short, get_dt_long, n2d
-from .const import ProductCode, HealthStatus, StateStatus, OrderSide, OrderType, OrderConditionType, OrderState
+from .common import get_dt_short, get_dt_long, n2j, n2p, n2s
+from .const import Asset, ProductCode, HealthStatus, StateStatus, OrderSide, OrderType, OrderConditionType, OrderState
 from .private import PrivateAPI
 from .public import PublicAPI
 
@@ -21,6 +25,10 @@ class BrokerAPI(object):
         ORDER_ALL_CANCEL = 'ORDER_ALL_CANCEL'
         OCO_BUY_LIMIT_STOP = 'OCO_BUY_LIMIT_STOP'
         OCO_SELL_LIMIT_STOP = 'OCO_SELL_LIMIT_STOP'
+        SPECIAL_ORDER_SIMPLE = 'SPECIAL_ORDER_SIMPLE'
+        SPECIAL_ORDER_IFD = 'SPECIAL_ORDER_IFD'
+        SPECIAL_ORDER_OCO = 'SPECIAL_ORDER_OCO'
+        SPECIAL_ORDER_IFDOCO = 'SPECIAL_ORDER_IFDOCO'
         SPECIAL_ORDER_CANCEL = 'SPECIAL_ORDER_CANCEL'
 
     @staticmethod
@@ -37,8 +45,9 @@ class BrokerAPI(object):
         '''get product code'''
         return ProductCode.BTC_JPY
 
-    def __init__(self, key, secret, log=True, *, get_timeout=None, post_timeout=None):
-        """イニシャライザ"""
+    def __init__(self, key, secret, log=True, *, get_timeout=None, post_timeout=None, transport=None,
+                 pool_size=10, thread_local=False):
+        """イニシャライザ(pool_size, thread_local: connections of the private API, see PrivateAPI)"""
         self.broker_name = 'bitflyer'
         self.product_code = self.get_product_code()
 
@@ -46,9 +55,22 @@ class BrokerAPI(object):
         self.__api_secret = secret
         self.__get_timeout = get_timeout
         self.__post_timeout = post_timeout
+        self._pub_api = PublicAPI(timeout=self.__get_timeout, transport=transport)
         self._prv_api = PrivateAPI(self.__api_key, self.__api_secret,
                                    get_timeout=self.__get_timeout,
-                                   post_timeout=self.__post_timeout)
+                                   post_timeout=self.__post_timeout,
+                                   transport=transport,
+                                   pool_size=pool_size,
+                                   thread_local=thread_local)
+
+        self.__fill_tracker = None
+        self.__risk_gate = None
+        self.__pacer = None
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        # special orders by so_send (parent_order_acceptance_id: parent_order_id, child acceptance ids)
+        self.__parent_orders = {}
+        self.__parent_lock = threading.Lock()
 
         self.__log = log
         if self.__log:
@@ -86,6 +108,114 @@ class BrokerAPI(object):
             with open(self.__log_path, 'a') as flog:
                 flog.writelines(wstr)
 
+    def set_fill_tracker(self, fill_tracker):
+        '''Set FillTracker to register own orders (None to disable)'''
+        if self.__fill_tracker is not None and self.__risk_gate is not None:
+            self.__fill_tracker.remove_listener(self.__risk_gate.on_fill)
+        self.__fill_tracker = fill_tracker
+        if self.__fill_tracker is not None and self.__risk_gate is not None:
+            self.__fill_tracker.add_listener(self.__risk_gate.on_fill)
+
+    def set_risk_gate(self, risk_gate):
+        '''Set RiskGate to check orders before sending (None to disable)'''
+        if self.__fill_tracker is not None and self.__risk_gate is not None:
+            self.__fill_tracker.remove_listener(self.__risk_gate.on_fill)
+        self.__risk_gate = risk_gate
+        if self.__fill_tracker is not None and self.__risk_gate is not None:
+            self.__fill_tracker.add_listener(self.__risk_gate.on_fill)
+
+    def set_pacer(self, pacer):
+        '''Set OrderPacer to pace orders by the exchange health (None to disable)'''
+        self.__pacer = pacer
+
+    def __check_order(self, event, side, price, amount):
+        '''
+        Check the order by RiskGate and OrderPacer (rejection is logged)
+
+        return: (result, reservation of RiskGate)
+        '''
+        reservation = None
+        if self.__risk_gate is not None:
+            result, reservation = self.__risk_gate.check(side, price, amount)
+            if not result:
+                self.__logging_event(event, None, price, amount, False, 'RISK:' + str(reservation))
+                return False, None
+        if self.__pacer is not None:
+            result, reason = self.__pacer.acquire()
+            if not result:
+                if reservation is not None:
+                    self.__risk_gate.release(reservation, sent=False)
+                self.__logging_event(event, None, price, amount, False, 'PACE:' + str(reason))
+                return False, None
+        return True, reservation
+
+    def __record_order(self, start_time, result, error=None):
+        '''Record the result of the order request to OrderPacer (error: exception of the request)'''
+        if self.__pacer is not None:
+            self.__pacer.record(result, time.time() - start_time, rejected=getattr(error, 'rejected', False))
+
+    def __release_order(self, reservation):
+        '''Release the reservation of the order not accepted'''
+        if reservation is not None:
+            self.__risk_gate.release(reservation)
+
+    def __track_order(self, order_id, side, order_type, price, amount, reservation=None):
+        '''Register the order to RiskGate and FillTracker'''
+        if order_id is None:
+            self.__release_order(reservation)
+            return
+        if self.__risk_gate is not None:
+            self.__risk_gate.on_order(order_id, side, price, amount, reservation)
+        if self.__fill_tracker is not None:
+            self.__fill_tracker.register(order_id, self.product_code, side, order_type, price, amount)
+
+    def __track_parent(self, acceptance_id, side, price, amount, reservation):
+        '''Register the special order to RiskGate (released by so_sync or so_cancel)'''
+        if acceptance_id is None:
+            self.__release_order(reservation)
+            return
+        if self.__risk_gate is not None:
+            self.__risk_gate.on_order(acceptance_id, side, price, amount, reservation)
+        with self.__parent_lock:
+            self.__parent_orders[acceptance_id] = {'parent_order_id': None, 'children': set()}
+
+    def __register_children(self, parent):
+        '''Register the child orders of the special order to FillTracker'''
+        res_infos = self._prv_api.get_childorders(self.product_code, parent_order_id=parent['parent_order_id'])
+        for info in res_infos:
+            child_id = info['child_order_acceptance_id']
+            if child_id in parent['children']:
+                continue
+            parent['children'].add(child_id)
+            price = info.get('price') or None
+            self.__fill_tracker.register(child_id, self.product_code, info['side'], info['child_order_type'],
+                                         price, info['size'])
+
+    def __finish_parent(self, acceptance_id):
+        '''Release the special order from RiskGate and FillTracker'''
+        with self.__parent_lock:
+            parent = self.__parent_orders.pop(acceptance_id, None)
+        if parent is None:
+            return
+        if self.__risk_gate is not None:
+            self.__risk_gate.on_cancel(acceptance_id)
+        if self.__fill_tracker is not None:
+            for child_id in parent['children']:
+                self.__fill_tracker.unregister(child_id)
+
+    def __parent_aid(self, parent_order_id):
+        '''parent_order_acceptance_id of the tracked special order (None if not tracked)'''
+        with self.__parent_lock:
+            for acceptance_id, parent in self.__parent_orders.items():
+                if parent['parent_order_id'] == parent_order_id:
+                    return acceptance_id
+            if not self.__parent_orders:
+                return None
+        try:
+            return self._prv_api.get_parentorder(parent_order_id=parent_order_id)['parent_order_acceptance_id']
+        except:     # pylint: disable-msg=W0702
+            return None
+
     # -------------------------------------------------------------------------
     # Private API
     # -------------------------------------------------------------------------
@@ -111,8 +241,9 @@ class BrokerAPI(object):
             for blance in res_balances:
                 asset_info = self.AssetInfo()
                 asset_info.name = blance['currency_code']
-                asset_info.onhand_amount = n2d(blance['amount'])
-                asset_info.free_amount = n2d(blance['available'])
+                n2a = n2j if asset_info.name == Asset.JPY else n2s
+                asset_info.onhand_amount = n2a(blance['amount'])
+                asset_info.free_amount = n2a(blance['available'])
                 rtn_assets[asset_info.name] = asset_info
             result = True
         except:     # pylint: disable-msg=W0702
@@ -137,6 +268,46 @@ class BrokerAPI(object):
             rtn_order = None
         return result, rtn_order
 
+    def _snapshot_parts(self):
+        '''parts of account snapshot (name: method)'''
+        return {
+            'assets': self.get_assets,
+            'broker_status': self.get_broker_status
+        }
+
+    def account_snapshot(self):
+        '''Get account snapshot (the requests of each part are sent concurrently)'''
+        parts = self._snapshot_parts()
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=len(parts))
+            executor = self.__executor
+        snapshot = AccountSnapshot()
+        snapshot.timestamp = datetime.now()
+        start_time = time.time()
+        futures = {name: executor.submit(method) for name, method in parts.items()}
+        for name, future in futures.items():
+            try:
+                res = future.result()
+            except:     # pylint: disable-msg=W0702
+                res = (False,)
+            snapshot.set_part(name, res)
+        snapshot.elapsed = time.time() - start_time
+        return snapshot.result, snapshot
+
+    def close(self):
+        '''
+        Stop the worker threads of account_snapshot (created again if used
+        after close) and close the connections of the public and private API
+        '''
+        with self.__executor_lock:
+            executor = self.__executor
+            self.__executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self._pub_api.close()
+        self._prv_api.close()
+
     # -------------------------------------------------------------------------
     # Public API
     # -------------------------------------------------------------------------
@@ -145,7 +316,7 @@ class BrokerAPI(object):
         result = False
         res_dct = None
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_markets()
+            res_dct = self._pub_api.get_markets()
             result = True
         except:     # pylint: disable-msg=W0702
             result = False
@@ -157,31 +328,48 @@ class BrokerAPI(object):
         result = False
         res_dct = None
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_depth(self.product_code)
+            res_dct = self._pub_api.get_depth(self.product_code)
             result = True
         except:     # pylint: disable-msg=W0702
             result = False
             res_dct = None
         return result, res_dct
 
+    def estimate_market_order(self, side, amount):
+        '''成行注文の約定価格を板情報から推定(average price, slippage)'''
+        result = False
+        ave_price = None
+        slippage = None
+        try:
+            from .depth import DepthAnalyzer
+            res_dct = self._pub_api.get_depth(self.product_code)
+            ave_price, slippage, filled = DepthAnalyzer(res_dct).estimate_fill(side, float(amount))
+            result = filled >= float(amount)
+        except:     # pylint: disable-msg=W0702
+            result = False
+            ave_price = None
+            slippage = None
+        return result, ave_price, slippage
+
     def get_ticker(self):
         '''Tickerの取得'''
         result = False
         res_dct = None
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_ticker(self.product_code)
+            res_dct = self._pub_api.get_ticker(self.product_code)
             result = True
         except:     # pylint: disable-msg=W0702
             result = False
             res_dct = None
         return result, res_dct
 
-    def get_executions(self):
+    def get_executions(self, *, count=None, before=None, after=None):
         ''' 約定履歴の取得 '''
         result = False
         res_dct = None
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_executions(self.product_code)
+            res_dct = self._pub_api.get_executions(self.product_code,
+                                                   count=count, before=before, after=after)
             result = True
         except:     # pylint: disable-msg=W0702
             result = False
@@ -194,7 +382,7 @@ class BrokerAPI(object):
         health = HealthStatus.STOP
         state = StateStatus.CLOSED
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_boardstate(self.product_code)
+            res_dct = self._pub_api.get_boardstate(self.product_code)
             health = res_dct['health']
             state = res_dct['state']
             result = True
@@ -204,12 +392,22 @@ class BrokerAPI(object):
             state = StateStatus.CLOSED
         return result, health, state
 
+    def warm_connection(self):
+        '''Open the connection of the private API in advance (to send orders without connecting)'''
+        result = False
+        try:
+            self._prv_api.warm_connection()
+            result = True
+        except:     # pylint: disable-msg=W0702
+            result = False
+        return result
+
     def get_broker_status(self):
         ''' 取引所の状態の取得 '''
         result = False
         health = HealthStatus.STOP
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_health(self.product_code)
+            res_dct = self._pub_api.get_health(self.product_code)
             health = res_dct['status']
             result = True
         except:     # pylint: disable-msg=W0702
@@ -222,7 +420,7 @@ class BrokerAPI(object):
         result = False
         res_dct = None
         try:
-            res_dct = PublicAPI(timeout=self.__get_timeout).get_chats()
+            res_dct = self._pub_api.get_chats()
             result = True
         except:     # pylint: disable-msg=W0702
             result = False
@@ -234,8 +432,14 @@ class BrokerAPI(object):
     # -------------------------------------------------------------------------
     def order_buy_limit(self, price, amount):
         '''指値買い注文を出す'''
+        checked, reservation = self.__check_order(self.EventLog.ORDER_BUY_LIMIT, OrderSide.BUY, price, amount)
+        if not checked:
+            return False, None
+
         result = False
         order_id = None
+        error = None
+        start_time = time.time()
         try:
             res_order = self._prv_api.send_childorder_limit_buy(self.product_code, float(price), float(amount))
             order_id = res_order['child_order_acceptance_id']
@@ -243,6 +447,13 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             order_id = None
             result = False
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+
+        if result:
+            self.__track_order(order_id, OrderSide.BUY, OrderType.LIMIT, price, amount, reservation)
+        else:
+            self.__release_order(reservation)
 
         self.__logging_event(self.EventLog.ORDER_BUY_LIMIT,
                              order_id,
@@ -253,8 +464,14 @@ class BrokerAPI(object):
 
     def order_buy_market(self, amount):
         '''成行買い注文を出す'''
+        checked, reservation = self.__check_order(self.EventLog.ORDER_BUY_MARKET, OrderSide.BUY, None, amount)
+        if not checked:
+            return False, None
+
         result = False
         order_id = None
+        error = None
+        start_time = time.time()
         try:
             res_order = self._prv_api.send_childorder_market_buy(self.product_code, float(amount))
             order_id = res_order['child_order_acceptance_id']
@@ -262,6 +479,13 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
             order_id = None
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+
+        if result:
+            self.__track_order(order_id, OrderSide.BUY, OrderType.MARKET, None, amount, reservation)
+        else:
+            self.__release_order(reservation)
 
         self.__logging_event(self.EventLog.ORDER_BUY_MARKET,
                              order_id,
@@ -272,8 +496,14 @@ class BrokerAPI(object):
 
     def order_sell_limit(self, price, amount):
         '''指値買い注文を出す'''
+        checked, reservation = self.__check_order(self.EventLog.ORDER_SELL_LIMIT, OrderSide.SELL, price, amount)
+        if not checked:
+            return False, None
+
         result = False
         order_id = None
+        error = None
+        start_time = time.time()
         try:
             res_order = self._prv_api.send_childorder_limit_sell(self.product_code, float(price), float(amount))
             order_id = res_order['child_order_acceptance_id']
@@ -281,6 +511,13 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
             order_id = None
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+
+        if result:
+            self.__track_order(order_id, OrderSide.SELL, OrderType.LIMIT, price, amount, reservation)
+        else:
+            self.__release_order(reservation)
 
         self.__logging_event(self.EventLog.ORDER_SELL_LIMIT,
                              order_id,
@@ -291,8 +528,14 @@ class BrokerAPI(object):
 
     def order_sell_market(self, amount):
         '''成行売り注文を出す'''
+        checked, reservation = self.__check_order(self.EventLog.ORDER_SELL_MARKET, OrderSide.SELL, None, amount)
+        if not checked:
+            return False, None
+
         result = False
         order_id = None
+        error = None
+        start_time = time.time()
         try:
             res_order = self._prv_api.send_childorder_market_sell(self.product_code, float(amount))
             order_id = res_order['child_order_acceptance_id']
@@ -300,6 +543,13 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
             order_id = None
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+
+        if result:
+            self.__track_order(order_id, OrderSide.SELL, OrderType.MARKET, None, amount, reservation)
+        else:
+            self.__release_order(reservation)
 
         self.__logging_event(self.EventLog.ORDER_SELL_MARKET,
                              order_id,
@@ -308,6 +558,59 @@ class BrokerAPI(object):
 
         return result, order_id
 
+    def stage_order(self, side, price, amount, *, minute_to_expire=None, time_in_force=None, warm=True):
+        '''
+        Stage the order to fire later with minimum latency
+
+        The body is serialized and the HMAC key is prepared now, and the
+        connection is opened if warm is True. price None is market order.
+        return: ArmedOrder (fire() sends it, and can be called again)
+        '''
+        order_type = OrderType.MARKET if price is None else OrderType.LIMIT
+        if side == OrderSide.BUY:
+            event = self.EventLog.ORDER_BUY_MARKET if price is None else self.EventLog.ORDER_BUY_LIMIT
+        else:
+            event = self.EventLog.ORDER_SELL_MARKET if price is None else self.EventLog.ORDER_SELL_LIMIT
+        staged = self._prv_api.stage_childorder(self.product_code, order_type, side,
+                                                float(price) if price is not None else None, float(amount),
+                                                minute_to_expire=minute_to_expire,
+                                                time_in_force=time_in_force)
+        if warm:
+            self.warm_connection()
+        return ArmedOrder(self, event, side, order_type, price, amount, staged)
+
+    def fire_order(self, armed):
+        '''Send the staged order (see stage_order)'''
+        checked, reservation = self.__check_order(armed.event, armed.side, armed.price, armed.amount)
+        if not checked:
+            return False, None
+
+        result = False
+        order_id = None
+        error = None
+        start_time = time.time()
+        try:
+            res_order = self._prv_api.send_staged(armed.staged)
+            order_id = res_order['child_order_acceptance_id']
+            result = True
+        except:     # pylint: disable-msg=W0702
+            result = False
+            order_id = None
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+
+        if result:
+            self.__track_order(order_id, armed.side, armed.order_type, armed.price, armed.amount, reservation)
+        else:
+            self.__release_order(reservation)
+
+        self.__logging_event(armed.event,
+                             order_id,
+                             armed.price, armed.amount,
+                             result, 'ARMED')
+
+        return result, order_id
+
     def order_cancel(self, order_id):
         '''注文をキャンセルする'''
         result = False
@@ -317,6 +620,11 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
 
+        if result and self.__risk_gate is not None:
+            self.__risk_gate.on_cancel(order_id)
+        if result and self.__fill_tracker is not None:
+            self.__fill_tracker.unregister(order_id)
+
         self.__logging_event(self.EventLog.ORDER_CANCEL,
                              order_id,
                              None, None,
@@ -333,6 +641,11 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
 
+        if result and self.__risk_gate is not None:
+            self.__risk_gate.on_cancel_all()
+        if result and self.__fill_tracker is not None:
+            self.__fill_tracker.unregister_all(self.product_code)
+
         self.__logging_event(self.EventLog.ORDER_ALL_CANCEL, None, None, None, result, '')
         return result
 
@@ -391,6 +704,162 @@ class BrokerAPI(object):
         }
         return res_dict
 
+    def so_mk_prms_market(self, product_code, side, size) -> dict:
+        '''return parameters of dicttype parent order'''
+        res_dict = {
+            'product_code': product_code,
+            'condition_type': OrderConditionType.MARKET,
+            'side': side,
+            'size': size
+        }
+        return res_dict
+
+    def so_mk_prms_stop_limit(self, product_code, side, price, trigger_price, size) -> dict:
+        '''return parameters of dicttype parent order'''
+        res_dict = {
+            'product_code': product_code,
+            'condition_type': OrderConditionType.STOP_LIMIT,
+            'side': side,
+            'price': price,
+            'trigger_price': trigger_price,
+            'size': size
+        }
+        return res_dict
+
+    def so_mk_prms_trail(self, product_code, side, offset, size) -> dict:
+        '''return parameters of dicttype parent order'''
+        res_dict = {
+            'product_code': product_code,
+            'condition_type': OrderConditionType.TRAIL,
+            'side': side,
+            'offset': offset,
+            'size': size
+        }
+        return res_dict
+
+    def so_send(self, order_method, parameters, *, event=None, minute_to_expire=None, time_in_force=None):
+        '''
+        send special order by one request
+
+        order_method: OrderType (SIMPLE, IFD, OCO, IFDOCO)
+        parameters: list of so_mk_prms_* (in the order of the order method)
+        The first order is checked by RiskGate, and each order is logged.
+        The exposure of the first order is kept in RiskGate by
+        parent_order_acceptance_id until the order is finished (see
+        so_sync) or canceled by so_cancel.
+        return: (result, parent_order_acceptance_id)
+        '''
+        if event is None:
+            event = getattr(self.EventLog, 'SPECIAL_ORDER_' + order_method)
+        first = parameters[0]
+        checked, reservation = self.__check_order(event, first['side'], first.get('price'), first['size'])
+        if not checked:
+            return False, None
+
+        result = False
+        order_id = None
+        error = None
+        start_time = time.time()
+        try:
+            res_order = self._prv_api.send_parentorder(order_method, parameters,
+                                                       minute_to_expire=minute_to_expire,
+                                                       time_in_force=time_in_force)
+            order_id = res_order['parent_order_acceptance_id']
+            result = True
+        except:     # pylint: disable-msg=W0702
+            result = False
+            order_id = None
+            error = sys.exc_info()[1]
+        self.__record_order(start_time, result, error)
+        self.__track_parent(order_id, first['side'], first.get('price'), first['size'], reservation)
+
+        for index, prms in enumerate(parameters):
+            price = prms.get('price', prms.get('trigger_price', prms.get('offset')))
+            self.__logging_event(event,
+                                 order_id,
+                                 price, prms['size'],
+                                 result, '%s%d:%s:%s' % (order_method, index + 1,
+                                                         prms['side'], prms['condition_type']))
+
+        return result, order_id
+
+    def so_sync(self, count=100):
+        '''
+        Sync the special orders sent by so_send with the latest count parent orders
+
+        The child orders are registered to FillTracker (their executions
+        are applied to the position of RiskGate), and the finished orders
+        (COMPLETED, CANCELED, EXPIRED, REJECTED) are released. Call it
+        periodically while the special orders are active.
+        return: result
+        '''
+        with self.__parent_lock:
+            if not self.__parent_orders:
+                return True
+        result = False
+        try:
+            res_infos = self._prv_api.get_parentorders(self.product_code, count=count)
+            for info in res_infos:
+                acceptance_id = info['parent_order_acceptance_id']
+                with self.__parent_lock:
+                    parent = self.__parent_orders.get(acceptance_id)
+                if parent is None:
+                    continue
+                parent['parent_order_id'] = info['parent_order_id']
+                if self.__fill_tracker is not None:
+                    self.__register_children(parent)
+                if info['parent_order_state'] != OrderState.ACTIVE:
+                    self.__finish_parent(acceptance_id)
+            result = True
+        except:     # pylint: disable-msg=W0702
+            result = False
+        return result
+
+    def so_stop_limit(self, side, price, trigger_price, amount, **kwargs):
+        '''stop limit order (SIMPLE)'''
+        prms = self.so_mk_prms_stop_limit(self.product_code, side, float(price), float(trigger_price), float(amount))
+        return self.so_send(OrderType.SIMPLE, [prms], **kwargs)
+
+    def so_trail(self, side, offset, amount, **kwargs):
+        '''trailing stop order (SIMPLE)'''
+        prms = self.so_mk_prms_trail(self.product_code, side, float(offset), float(amount))
+        return self.so_send(OrderType.SIMPLE, [prms], **kwargs)
+
+    def so_ifd(self, if_prms, done_prms, **kwargs):
+        '''IFD order (done_prms is ordered after if_prms is executed)'''
+        return self.so_send(OrderType.IFD, [if_prms, done_prms], **kwargs)
+
+    def so_oco(self, prms1, prms2, **kwargs):
+        '''OCO order'''
+        return self.so_send(OrderType.OCO, [prms1, prms2], **kwargs)
+
+    def so_ifdoco(self, if_prms, oco_prms1, oco_prms2, **kwargs):
+        '''IFDOCO order (OCO is ordered after if_prms is executed)'''
+        return self.so_send(OrderType.IFDOCO, [if_prms, oco_prms1, oco_prms2], **kwargs)
+
+    def so_bracket(self, side, price, profit_price, amount, *, stop_price=None, trail_offset=None, **kwargs):
+        '''
+        bracket order by IFDOCO in one request
+
+        entry: limit order of side (market order if price is None)
+        exit : limit order at profit_price, and stop order at stop_price
+               or trailing stop of trail_offset (exactly one of them is given)
+        '''
+        if (stop_price is None) == (trail_offset is None):
+            raise ValueError('exactly one of stop_price and trail_offset is required')
+        amount = float(amount)
+        exit_side = OrderSide.SELL if side == OrderSide.BUY else OrderSide.BUY
+        if price is None:
+            if_prms = self.so_mk_prms_market(self.product_code, side, amount)
+        else:
+            if_prms = self.so_mk_prms_limit(self.product_code, side, float(price), amount)
+        profit_prms = self.so_mk_prms_limit(self.product_code, exit_side, float(profit_price), amount)
+        if trail_offset is not None:
+            stop_prms = self.so_mk_prms_trail(self.product_code, exit_side, float(trail_offset), amount)
+        else:
+            stop_prms = self.so_mk_prms_stop(self.product_code, exit_side, float(stop_price), amount)
+        return self.so_ifdoco(if_prms, profit_prms, stop_prms, **kwargs)
+
     def so_oco_buy_limit_stop(self, o_price, s_price, amount):
         '''oco type buying order of limit and trail'''
         result = False
@@ -475,10 +944,79 @@ class BrokerAPI(object):
         except:     # pylint: disable-msg=W0702
             result = False
 
+        if result:
+            if parent_order_acceptance_id is None:
+                parent_order_acceptance_id = self.__parent_aid(parent_order_id)
+            self.__finish_parent(parent_order_acceptance_id)
+
         self.__logging_event(self.EventLog.SPECIAL_ORDER_CANCEL, c_id, None, None, result, memo)
         return result
 
 
+class ArmedOrder(object):
+    '''order staged by BrokerAPI.stage_order'''
+
+    def __init__(self, broker, event, side, order_type, price, amount, staged):
+        self.broker = broker
+        self.event = event
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.amount = amount
+        self.staged = staged
+
+    def fire(self):
+        '''send the order: (result, child_order_acceptance_id)'''
+        return self.broker.fire_order(self)
+
+
+class AccountSnapshot(object):
+    '''account snapshot class'''
+    timestamp = None            # request start time
+    elapsed = None              # seconds
+    success = None              # part name: result
+    assets = None               # get_assets
+    broker_health = None        # get_broker_status
+    margin_trading = None       # get_margin_trading (FX)
+    positions = None            # get_positions (FX)
+    positions_ave_price = None
+    positions_total_amount = None
+
+    def __init__(self):
+        self.success = {}
+
+    @property
+    def result(self):
+        '''[property] True if all parts succeeded'''
+        return len(self.success) > 0 and all(self.success.values())
+
+    def set_part(self, name, res):
+        '''set result tuple of the part'''
+        self.success[name] = res[0]
+        if not res[0]:
+            return
+        if name == 'assets':
+            self.assets = res[1]
+        elif name == 'broker_status':
+            self.broker_health = res[1]
+        elif name == 'margin_trading':
+            self.margin_trading = res[1]
+        elif name == 'positions':
+            self.positions, self.positions_ave_price, self.positions_total_amount = res[1:]
+
+    def out_shell(self):
+        '''Display information to shell'''
+        print('timestamp', self.timestamp)
+        print('elapsed', self.elapsed)
+        print('success', self.success)
+        print('assets', self.assets)
+        print('broker_health', self.broker_health)
+        print('margin_trading', self.margin_trading)
+        print('positions', self.positions)
+        print('positions_ave_price', self.positions_ave_price)
+        print('positions_total_amount', self.positions_total_amount)
+
+
 class OrderInfo(object):
     '''order information class'''
     order_id = None
@@ -509,13 +1047,13 @@ class OrderInfo(object):
             self.order_pair = info['product_code']
             self.order_side = info['side']
             self.order_type = info['child_order_type']
-            self.order_price = n2d(info['price'])
-            self.order_amount = n2d(info['size'])
-            self.executed_ave_price = n2d(info['average_price'])
-            self.executed_amount = n2d(info['executed_size'])
-            self.executed_commission = n2d(info['total_commission'])
-            self.outstanding_amount = n2d(info['outstanding_size'])
-            self.canceled_amount = n2d(info['cancel_size'])
+            self.order_price = n2p(info['price'])
+            self.order_amount = n2s(info['size'])
+            self.executed_ave_price = n2j(info['average_price'])
+            self.executed_amount = n2s(info['executed_size'])
+            self.executed_commission = n2s(info['total_commission'])
+            self.outstanding_amount = n2s(info['outstanding_size'])
+            self.canceled_amount = n2s(info['cancel_size'])
             self.expire_date = BrokerAPI.str2dt(info['expire_date'])
             self.order_date = BrokerAPI.str2dt(info['child_order_date'])
             self.order_state = info['child_order_state']
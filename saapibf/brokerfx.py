@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 '''Broker access module for FX'''
-from .common import n2d
+from .common import n2d, n2j, n2p, n2s, num_div
 from .broker import BrokerAPI
-from .const import ProductCode
+from .const import Asset, ProductCode
 
 
 class BrokerFXAPI(BrokerAPI):
@@ -13,6 +13,13 @@ class BrokerFXAPI(BrokerAPI):
         '''get product code'''
         return ProductCode.FX_BTC_JPY
 
+    def _snapshot_parts(self):     # override
+        '''parts of account snapshot (name: method)'''
+        parts = super()._snapshot_parts()
+        parts['margin_trading'] = self.get_margin_trading
+        parts['positions'] = self.get_positions
+        return parts
+
     # -------------------------------------------------------------------------
     # Private API
     # -------------------------------------------------------------------------
@@ -25,7 +32,8 @@ class BrokerFXAPI(BrokerAPI):
             for blance in res_infos:
                 asset_info = self.AssetInfo()
                 asset_info.name = blance['currency_code']
-                asset_info.onhand_amount = asset_info.free_amount = n2d(blance['amount'])
+                n2a = n2j if asset_info.name == Asset.JPY else n2s
+                asset_info.onhand_amount = asset_info.free_amount = n2a(blance['amount'])
                 rtn_assets[asset_info.name] = asset_info
             result = True
         except:     # pylint: disable-msg=W0702
@@ -50,18 +58,18 @@ class BrokerFXAPI(BrokerAPI):
         '''Get open positions'''
         result = False
         rtn_pi_list = []
-        rtn_ave_price = n2d(0)
-        rtn_total_amount = n2d(0)
+        rtn_ave_price = n2p(0)
+        rtn_total_amount = n2s(0)
         try:
             res_postions = self._prv_api.get_getpositions(self.product_code)
-            ave_divisor = n2d(0)
+            ave_divisor = 0
             for pos in res_postions:
                 pi = PositionInfo(pos)
                 rtn_pi_list.append(pi)
                 rtn_total_amount += pi.amount
                 ave_divisor = ave_divisor + (pi.price * pi.amount)
             if rtn_total_amount > 0:
-                rtn_ave_price = ave_divisor / rtn_total_amount
+                rtn_ave_price = num_div(ave_divisor, rtn_total_amount)
             result = True
         except:
             result = False
@@ -80,10 +88,10 @@ class MarginTradingInfo(object):
 
     def __init__(self, info=None):
         if info is not None:
-            self.margin_deposit = n2d(info['collateral'])
-            self.required_margin = n2d(info['require_collateral'])
+            self.margin_deposit = n2j(info['collateral'])
+            self.required_margin = n2j(info['require_collateral'])
             self.margin_rate = n2d(info['keep_rate'])
-            self.profit_loss = n2d(info['open_position_pnl'])
+            self.profit_loss = n2j(info['open_position_pnl'])
 
     def out_shell(self):
         '''Display information to shell'''
@@ -111,15 +119,15 @@ class PositionInfo(object):
         if info is not None:
             self.pair = info['product_code']
             self.side = info['side']
-            self.price = n2d(info['price'])
-            self.amount = n2d(info['size'])
-            self.commission = n2d(info['commission'])
-            self.swap = n2d(info['swap_point_accumulate'])
-            self.required_margin = n2d(info['require_collateral'])
+            self.price = n2p(info['price'])
+            self.amount = n2s(info['size'])
+            self.commission = n2j(info['commission'])
+            self.swap = n2j(info['swap_point_accumulate'])
+            self.required_margin = n2j(info['require_collateral'])
             self.open_date = BrokerAPI.str2dt(info['open_date'])
             self.leverage = n2d(info['leverage'])
-            self.profit_loss = n2d(info['pnl'])
-            self.sfd = n2d(info['sfd'])
+            self.profit_loss = n2j(info['pnl'])
+            self.sfd = n2j(info['sfd'])
 
     def out_shell(self):
         '''Display information to shell'''
@@ -1,8 +1,22 @@
 # -*- coding: utf-8 -*-
 '''共通ロジックモジュール'''
 
+import calendar
 import datetime
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_EVEN
+
+
+class APIError(Exception):
+    '''API error (args[0] is the JSON response or the message)'''
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rejected(self):
+        '''[property] rejected for the request content (HTTP 4xx except 429, e.g. insufficient funds)'''
+        return self.status_code is not None and 400 <= self.status_code < 500 and self.status_code != 429
 
 
 def error_parser(response):
@@ -16,10 +30,10 @@ def error_parser(response):
         return res_json
     else:
         if res_json is not None:
-            raise Exception(res_json)
+            raise APIError(res_json, response.status_code)
         else:
             errmsg = str('レスポンスを取得できませんでした。')
-            raise Exception(errmsg)
+            raise APIError(errmsg, response.status_code)
 
     return None
 
@@ -37,3 +51,135 @@ def get_dt_long():
 def n2d(value) -> Decimal:
     '''数値(int,float)をDecimal型へ変換'''
     return Decimal(str(value))
+
+
+# -----------------------------------------------------------------------------
+# numeric mode
+# -----------------------------------------------------------------------------
+PRICE_SCALE = 100           # 価格(JPY)の固定小数点倍率(0.01JPY単位)
+SIZE_SCALE = 100000000      # 数量の固定小数点倍率(1satoshi単位)
+
+
+class NumericMode():    # pylint: disable=too-few-public-methods
+    '''numeric mode of the model classes'''
+    DECIMAL = 'DECIMAL'     # Decimal (default)
+    FIXED = 'FIXED'         # scaled int (price: PRICE_SCALE, size: SIZE_SCALE)
+
+
+_NUMERIC_MODE = {'mode': NumericMode.DECIMAL}
+
+
+def set_numeric_mode(mode):
+    '''数値モードの設定(モデルクラスの生成前に設定すること)'''
+    if mode not in (NumericMode.DECIMAL, NumericMode.FIXED):
+        raise ValueError(mode)
+    _NUMERIC_MODE['mode'] = mode
+
+
+def get_numeric_mode():
+    '''数値モードの取得'''
+    return _NUMERIC_MODE['mode']
+
+
+def n2fp(value, scale, exact=True) -> int:
+    '''
+    数値を固定小数点(scale倍のint)へ変換
+    exact=Trueの場合、端数が出ると例外を発生させます(Falseの場合は偶数丸め)
+    '''
+    # fast path: int, and float which is the nearest double of the scaled int
+    if type(value) is int:     # pylint: disable=unidiomatic-typecheck
+        return value * scale
+    if type(value) is float:   # pylint: disable=unidiomatic-typecheck
+        integral = round(value * scale)
+        if integral / scale == value:
+            return integral
+    scaled = Decimal(str(value)) * scale
+    integral = scaled.to_integral_value(rounding=ROUND_HALF_EVEN)
+    if exact and scaled != integral:
+        raise ValueError('%s cannot be represented with scale %d' % (str(value), scale))
+    return int(integral)
+
+
+def fp2d(value, scale) -> Decimal:
+    '''固定小数点(scale倍のint)をDecimal型へ変換'''
+    return Decimal(value) / scale
+
+
+def fp_mul(value_a, value_b, scale_b) -> int:
+    '''固定小数点の乗算(結果はvalue_aの倍率、端数は偶数丸め)'''
+    return fp_div(value_a * value_b, scale_b)
+
+
+def fp_div(numerator, denominator) -> int:
+    '''整数の除算(端数は偶数丸め)'''
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+
+def n2p(value):
+    '''数値を価格(JPY)へ変換(数値モードに従う)'''
+    if _NUMERIC_MODE['mode'] == NumericMode.FIXED:
+        return n2fp(value, PRICE_SCALE)
+    return n2d(value)
+
+
+def n2j(value):
+    '''数値を金額・平均価格(JPY)へ変換(数値モードに従う、固定小数点の場合は端数を偶数丸め)'''
+    if _NUMERIC_MODE['mode'] == NumericMode.FIXED:
+        return n2fp(value, PRICE_SCALE, False)
+    return n2d(value)
+
+
+def n2s(value):
+    '''数値を数量へ変換(数値モードに従う)'''
+    if _NUMERIC_MODE['mode'] == NumericMode.FIXED:
+        return n2fp(value, SIZE_SCALE)
+    return n2d(value)
+
+
+def num_div(numerator, denominator):
+    '''除算(固定小数点の場合は偶数丸めのint)'''
+    if isinstance(numerator, int) and isinstance(denominator, int):
+        return fp_div(numerator, denominator)
+    return numerator / denominator
+
+
+def p2d(value) -> Decimal:
+    '''
+    価格(n2p/n2jの値、数値モードに従う)をDecimal型へ変換
+    固定小数点モードではPRICE_SCALE倍のintのみ受け付けます(生の値はn2dを使用)
+    '''
+    if _NUMERIC_MODE['mode'] == NumericMode.FIXED:
+        return fp2d(_scaled(value), PRICE_SCALE)
+    return n2d(value)
+
+
+def s2d(value) -> Decimal:
+    '''
+    数量(n2sの値、数値モードに従う)をDecimal型へ変換
+    固定小数点モードではSIZE_SCALE倍のintのみ受け付けます(生の値はn2dを使用)
+    '''
+    if _NUMERIC_MODE['mode'] == NumericMode.FIXED:
+        return fp2d(_scaled(value), SIZE_SCALE)
+    return n2d(value)
+
+
+def _scaled(value) -> int:
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError('fixed-point value must be int, not %s' % type(value).__name__)
+    return value
+
+
+def str2ns(str_dt) -> int:
+    '''日時文字列(ISO8601 UTC, 例:2019-01-01T00:00:00.1234567Z)をエポックからのナノ秒へ変換'''
+    sec = calendar.timegm((int(str_dt[0:4]), int(str_dt[5:7]), int(str_dt[8:10]),
+                           int(str_dt[11:13]), int(str_dt[14:16]), int(str_dt[17:19]),
+                           0, 0, 0))
+    nsec = 0
+    if len(str_dt) > 20 and str_dt[19] == '.':
+        frac = str_dt[20:].rstrip('Z')
+        nsec = int((frac + '000000000')[0:9])
+    return sec * 1000000000 + nsec
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''depth(board) analytics module
+
+Board data is converted into NumPy price/size arrays once, and the
+analytics are calculated by vector operations.
+Available for the getboard dict of REST API and for BoardData of
+RealtimeAPI (board snapshot).
+'''
+
+import numpy as np
+from .const import OrderSide
+
+
+def _to_arrays(levels, descending):
+    '''Convert board levels into sorted price and size arrays.'''
+    count = len(levels)
+    prices = np.fromiter((level['price'] for level in levels), dtype=np.float64, count=count)
+    sizes = np.fromiter((level['size'] for level in levels), dtype=np.float64, count=count)
+    valid = sizes > 0
+    prices = prices[valid]
+    sizes = sizes[valid]
+    order = np.argsort(-prices if descending else prices, kind='stable')
+    return prices[order], sizes[order]
+
+
+class DepthAnalyzer(object):
+    '''
+    Depth analytics class
+
+    side of each method is the side of the order (OrderSide).
+    A buy order consumes asks and a sell order consumes bids.
+    '''
+
+    def __init__(self, board):
+        if isinstance(board, dict):
+            mid_price = board['mid_price']
+            bids = board['bids']
+            asks = board['asks']
+        else:
+            mid_price = board.mid_price
+            bids = board.bids
+            asks = board.asks
+        self.mid_price = float(mid_price)
+        self.bid_prices, self.bid_sizes = _to_arrays(bids, True)
+        self.ask_prices, self.ask_sizes = _to_arrays(asks, False)
+        self.__cum = {}
+
+    @property
+    def best_bid(self):
+        '''[property] best bid price'''
+        return float(self.bid_prices[0]) if len(self.bid_prices) > 0 else None
+
+    @property
+    def best_ask(self):
+        '''[property] best ask price'''
+        return float(self.ask_prices[0]) if len(self.ask_prices) > 0 else None
+
+    def __levels(self, side):
+        '''levels consumed by the order side'''
+        if side == OrderSide.BUY:
+            return self.ask_prices, self.ask_sizes
+        return self.bid_prices, self.bid_sizes
+
+    def __cumulative(self, side):
+        '''cumulative size and notional (cached)'''
+        if side not in self.__cum:
+            prices, sizes = self.__levels(side)
+            self.__cum[side] = (np.cumsum(sizes), np.cumsum(prices * sizes))
+        return self.__cum[side]
+
+    def cum_depth(self, side):
+        '''cumulative depth (prices, cumulative sizes)'''
+        prices, _ = self.__levels(side)
+        cum_sizes, _ = self.__cumulative(side)
+        return prices, cum_sizes
+
+    def estimate_fill(self, side, size):
+        '''
+        Estimate the result of a market order
+
+        return: (average price, slippage, filled size)
+        slippage is the difference between the average price and the best
+        price (positive is unfavorable). If the depth is not enough,
+        filled size is less than size.
+        '''
+        prices, _ = self.__levels(side)
+        if len(prices) == 0 or size <= 0:
+            return None, None, 0.0
+        cum_sizes, cum_notional = self.__cumulative(side)
+        index = int(np.searchsorted(cum_sizes, size, side='left'))
+        if index >= len(cum_sizes):
+            filled = float(cum_sizes[-1])
+            notional = float(cum_notional[-1])
+        else:
+            filled = float(size)
+            before_size = float(cum_sizes[index - 1]) if index > 0 else 0.0
+            before_notional = float(cum_notional[index - 1]) if index > 0 else 0.0
+            notional = before_notional + (filled - before_size) * float(prices[index])
+        ave_price = notional / filled
+        if side == OrderSide.BUY:
+            slippage = ave_price - float(prices[0])
+        else:
+            slippage = float(prices[0]) - ave_price
+        return ave_price, slippage, filled
+
+    def depth_within(self, pct):
+        '''total size of (bids, asks) within pct(%) of mid price'''
+        width = self.mid_price * pct / 100.0
+        bid_depth = float(self.bid_sizes[self.bid_prices >= self.mid_price - width].sum())
+        ask_depth = float(self.ask_sizes[self.ask_prices <= self.mid_price + width].sum())
+        return bid_depth, ask_depth
+
+    def imbalance(self, pct=None):
+        '''
+        book imbalance (bids - asks) / (bids + asks)
+
+        The range is -1.0 (asks only) to 1.0 (bids only).
+        If pct is specified, only levels within pct(%) of mid price are used.
+        '''
+        if pct is None:
+            bid_depth = float(self.bid_sizes.sum())
+            ask_depth = float(self.ask_sizes.sum())
+        else:
+            bid_depth, ask_depth = self.depth_within(pct)
+        total = bid_depth + ask_depth
+        if total <= 0:
+            return 0.0
+        return (bid_depth - ask_depth) / total
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+'''execution store module
+
+Executions are appended to fixed-width memory-mapped column files,
+one directory per day (UTC).
+
+*** Directory layout ***
+<root>/<YYYYMMDD>/
+    id.i8 side.i1 price.f8 size.f8 exec_ns.i8 buy_aid.S32 sell_aid.S32
+        column files (capacity rows, pre-allocated)
+    count.u8    number of valid rows (written after the rows)
+    index.i8    sparse time index (exec_ns of every INDEX_STRIDE rows)
+
+One writer and many readers are supported. The writer publishes the row
+count only after the rows are written, so a reader never sees a
+partial row. Executions are expected in exec_date order (the order of
+the realtime feed and of the id).
+'''
+
+import datetime
+import os
+import numpy as np
+from .common import str2ns
+from .const import OrderSide
+
+try:
+    import fcntl
+except ImportError:     # not POSIX
+    fcntl = None
+
+INDEX_STRIDE = 1024
+DEFAULT_CAPACITY = 1 << 20
+
+_COLUMNS = (
+    ('id', np.int64),
+    ('side', np.int8),
+    ('price', np.float64),
+    ('size', np.float64),
+    ('exec_ns', np.int64),
+    ('buy_aid', 'S32'),
+    ('sell_aid', 'S32'),
+)
+_SIDE_TO_CODE = {OrderSide.BUY: 1, OrderSide.SELL: -1}
+
+
+def _column_path(day_dir, name, dtype):
+    return os.path.join(day_dir, name + '.' + np.dtype(dtype).str[1:])
+
+
+def _day_name(exec_ns):
+    return datetime.datetime.fromtimestamp(exec_ns // 1000000000, datetime.timezone.utc).strftime('%Y%m%d')
+
+
+class ExecutionChunk(object):
+    '''columns of executions in one day (zero-copy views of the store)'''
+    def __init__(self, day, columns, begin, end):
+        self.day = day
+        self.id = columns['id'][begin:end]
+        self.side = columns['side'][begin:end]
+        self.price = columns['price'][begin:end]
+        self.size = columns['size'][begin:end]
+        self.exec_ns = columns['exec_ns'][begin:end]
+        self.buy_aid = columns['buy_aid'][begin:end]
+        self.sell_aid = columns['sell_aid'][begin:end]
+
+    def __len__(self):
+        return len(self.id)
+
+
+class _DayColumns(object):
+    '''memory maps of one day'''
+
+    def __init__(self, day_dir, writable, capacity=None):
+        self.day_dir = day_dir
+        self.writable = writable
+        mode = 'r+' if writable else 'r'
+        if writable and not os.path.exists(os.path.join(day_dir, 'count.u8')):
+            os.makedirs(day_dir, exist_ok=True)
+            for name, dtype in _COLUMNS:
+                np.memmap(_column_path(day_dir, name, dtype), dtype=dtype, mode='w+', shape=(capacity,)).flush()
+            np.memmap(os.path.join(day_dir, 'index.i8'), dtype=np.int64, mode='w+',
+                      shape=(capacity // INDEX_STRIDE + 1,)).flush()
+            np.memmap(os.path.join(day_dir, 'count.u8'), dtype=np.uint64, mode='w+', shape=(1,)).flush()
+        self.count_map = np.memmap(os.path.join(day_dir, 'count.u8'), dtype=np.uint64, mode=mode, shape=(1,))
+        self.columns = {}
+        self.index = None
+        self.capacity = 0
+        self.__mode = mode
+        self.remap()
+
+    def remap(self):
+        '''(re)map the column files'''
+        for name, dtype in _COLUMNS:
+            self.columns[name] = np.memmap(_column_path(self.day_dir, name, dtype), dtype=dtype, mode=self.__mode)
+        self.index = np.memmap(os.path.join(self.day_dir, 'index.i8'), dtype=np.int64, mode=self.__mode)
+        self.capacity = len(self.columns['id'])
+
+    def grow(self, capacity):
+        '''extend the column files (writer only)'''
+        for name, dtype in _COLUMNS:
+            path = _column_path(self.day_dir, name, dtype)
+            with open(path, 'r+b') as fcol:
+                fcol.truncate(capacity * np.dtype(dtype).itemsize)
+        with open(os.path.join(self.day_dir, 'index.i8'), 'r+b') as fidx:
+            fidx.truncate((capacity // INDEX_STRIDE + 1) * 8)
+        self.remap()
+
+    @property
+    def count(self):
+        '''[property] number of valid rows'''
+        return int(self.count_map[0])
+
+
+class ExecutionStoreWriter(object):
+    '''
+    Execution store writer (only one per root directory)
+
+    on_message_executions can be passed directly to RealtimeAPI.
+    '''
+
+    def __init__(self, root_dir, *, capacity=DEFAULT_CAPACITY, pair=None):
+        self.root_dir = root_dir
+        self.pair = pair
+        self.__capacity = capacity
+        self.__days = {}
+        os.makedirs(root_dir, exist_ok=True)
+        self.__lock_file = open(os.path.join(root_dir, 'writer.lock'), 'w')
+        if fcntl is not None:
+            # raise if another writer exists
+            fcntl.flock(self.__lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def __get_day(self, day):
+        day_cols = self.__days.get(day)
+        if day_cols is None:
+            day_cols = _DayColumns(os.path.join(self.root_dir, day), True, self.__capacity)
+            self.__days[day] = day_cols
+        return day_cols
+
+    def append(self, executions):
+        '''append ExecutionData list (or dict list of getexecutions)'''
+        rows = {}
+        for execution in executions:
+            if isinstance(execution, dict):
+                row = (execution['id'], execution['side'], execution['price'], execution['size'],
+                       str2ns(execution['exec_date']),
+                       execution['buy_child_order_acceptance_id'],
+                       execution['sell_child_order_acceptance_id'])
+            else:
+                row = (execution.order_id, execution.side, execution.price, execution.size,
+                       str2ns(execution.exec_date),
+                       execution.buy_child_order_acceptance_id,
+                       execution.sell_child_order_acceptance_id)
+            rows.setdefault(_day_name(row[4]), []).append(row)
+
+        for day, day_rows in rows.items():
+            self.__append_day(self.__get_day(day), day_rows)
+
+    @staticmethod
+    def __append_day(day_cols, day_rows):
+        begin = day_cols.count
+        end = begin + len(day_rows)
+        if end > day_cols.capacity:
+            capacity = day_cols.capacity
+            while capacity < end:
+                capacity *= 2
+            day_cols.grow(capacity)
+
+        cols = day_cols.columns
+        cols['id'][begin:end] = [row[0] for row in day_rows]
+        cols['side'][begin:end] = [_SIDE_TO_CODE.get(row[1], 0) for row in day_rows]
+        cols['price'][begin:end] = [row[2] for row in day_rows]
+        cols['size'][begin:end] = [row[3] for row in day_rows]
+        cols['exec_ns'][begin:end] = [row[4] for row in day_rows]
+        cols['buy_aid'][begin:end] = [row[5].encode('ascii') for row in day_rows]
+        cols['sell_aid'][begin:end] = [row[6].encode('ascii') for row in day_rows]
+
+        # sparse index
+        first = -(-begin // INDEX_STRIDE)
+        last = (end - 1) // INDEX_STRIDE
+        if first <= last:
+            positions = np.arange(first, last + 1) * INDEX_STRIDE
+            day_cols.index[first:last + 1] = cols['exec_ns'][positions]
+
+        # publish
+        day_cols.count_map[0] = end
+
+    def on_message_executions(self, _, pair, data_list):
+        '''[callback] executions'''
+        if self.pair is None or pair == self.pair:
+            self.append(data_list)
+
+    def flush(self):
+        '''flush to the disk'''
+        for day_cols in self.__days.values():
+            for column in day_cols.columns.values():
+                column.flush()
+            day_cols.index.flush()
+            day_cols.count_map.flush()
+
+    def close(self):
+        '''flush and release the writer lock'''
+        self.flush()
+        self.__days = {}
+        if self.__lock_file is not None:
+            self.__lock_file.close()
+        self.__lock_file = None
+
+
+class ExecutionStoreReader(object):
+    '''Execution store reader'''
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.__days = {}
+
+    def days(self):
+        '''list of stored days (YYYYMMDD)'''
+        if not os.path.exists(self.root_dir):
+            return []
+        return sorted(name for name in os.listdir(self.root_dir)
+                      if os.path.exists(os.path.join(self.root_dir, name, 'count.u8')))
+
+    def __get_day(self, day):
+        day_cols = self.__days.get(day)
+        if day_cols is None:
+            day_cols = _DayColumns(os.path.join(self.root_dir, day), False)
+            self.__days[day] = day_cols
+        count = day_cols.count
+        if count > day_cols.capacity:   # the writer has grown the files
+            day_cols.remap()
+        return day_cols, count
+
+    @staticmethod
+    def __search(day_cols, count, exec_ns):
+        '''first row with exec_ns >= value (sparse index then block search)'''
+        if count == 0:
+            return 0
+        blocks = (count - 1) // INDEX_STRIDE + 1
+        block = int(np.searchsorted(day_cols.index[:blocks], exec_ns, side='left'))
+        begin = max(block - 1, 0) * INDEX_STRIDE
+        end = min(block * INDEX_STRIDE + 1, count)
+        return begin + int(np.searchsorted(day_cols.columns['exec_ns'][begin:end], exec_ns, side='left'))
+
+    def range(self, start_ns, end_ns):
+        '''
+        executions of start_ns <= exec_ns < end_ns
+
+        return: list of ExecutionChunk (one per day)
+        '''
+        res_chunks = []
+        start_day = _day_name(start_ns)
+        end_day = _day_name(end_ns - 1)
+        for day in self.days():
+            if day < start_day or day > end_day:
+                continue
+            day_cols, count = self.__get_day(day)
+            begin = self.__search(day_cols, count, start_ns)
+            end = self.__search(day_cols, count, end_ns)
+            if begin < end:
+                res_chunks.append(ExecutionChunk(day, day_cols.columns, begin, end))
+        return res_chunks
+
+    def range_dt(self, start_dt, end_dt):
+        '''range() by datetime (naive datetime is UTC)'''
+        return self.range(self.dt2ns(start_dt), self.dt2ns(end_dt))
+
+    @staticmethod
+    def dt2ns(value):
+        '''datetime to nanoseconds since the epoch'''
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return int(value.timestamp()) * 1000000000 + value.microsecond * 1000
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+'''realtime feed fan-out module
+
+One RealtimeAPI connection receives the feed and routes each message to
+worker processes through multiprocessing queues.
+
+*** The description of worker function ***
+worker_func(pair, header, message) is called in the worker process.
+It must be picklable (module level function).
+header is the value of RealtimeAPI.InfoChannel and message is the decoded
+"message" part of channelMessage.
+'''
+
+import json
+import multiprocessing
+import queue
+import re
+import threading
+import time
+import zlib
+from .realtime import RealtimeAPI, parse_channel
+
+_RE_CHANNEL = re.compile(r'"channel"\s*:\s*"([^"]+)"')
+
+
+def _worker_main(worker_func, rcv_queue, processed):
+    '''main loop of the worker process'''
+    while True:
+        item = rcv_queue.get()
+        if item is None:
+            break
+        if isinstance(item, str):
+            # raw message
+            rcv_msg = json.loads(item)
+            if rcv_msg.get('method') != 'channelMessage':
+                continue
+            header, pair = parse_channel(rcv_msg['params']['channel'])
+            message = rcv_msg['params']['message']
+        else:
+            pair, header, message = item
+        try:
+            worker_func(pair, header, message)
+        except:     # pylint: disable-msg=W0702
+            import traceback
+            traceback.print_exc()
+        processed.value += 1
+
+
+class RealtimeFanout(object):
+    '''
+    Fan-out of the realtime feed to worker processes
+
+    routes is a dict of routing. The key is ListenChannel, channel name or
+    pair name and the value is a list of worker indexes. Channel routes take
+    precedence over pair routes. A channel without routes is routed to one
+    worker decided by the hash of the channel name.
+
+    If raw is True, the received text is not decoded by the feed process.
+    Only the channel name is picked out for routing and the text is decoded
+    by the worker process.
+    '''
+
+    class WorkerInfo(object):
+        '''worker process information'''
+        def __init__(self, index):
+            self.index = index
+            self.process = None
+            self.queue = None
+            self.processed = None
+            self.sent = 0
+            self.dropped = 0
+            self.restarts = 0
+            self.last_processed = 0
+            self.last_time = time.time()
+
+    def __init__(self,
+                 channel_list,
+                 worker_func,
+                 *,
+                 workers=2,
+                 routes=None,
+                 raw=False,
+                 queue_size=10000,
+                 restart_interval=1.0,
+                 on_close=None,
+                 on_error=None,
+                 ping_interval=30,
+                 ping_timeout=10):
+
+        self.__worker_func = worker_func
+        self.__queue_size = queue_size
+        self.__restart_interval = restart_interval
+        self.__routes = {}
+        if routes is not None:
+            for key, indexes in routes.items():
+                key = key.value if isinstance(key, RealtimeAPI.ListenChannel) else key
+                self.__routes[key] = list(indexes)
+        self.__route_cache = {}
+
+        self.__workers = [self.WorkerInfo(i) for i in range(workers)]
+        self.__running = False
+        self.__supervisor = None
+        self.__lock = threading.Lock()
+
+        if raw:
+            self.__api = RealtimeAPI(channel_list,
+                                     on_raw_message=self.__on_raw_message,
+                                     on_close=on_close,
+                                     on_error=on_error,
+                                     ping_interval=ping_interval,
+                                     ping_timeout=ping_timeout)
+        else:
+            self.__api = RealtimeAPI(channel_list,
+                                     on_message=self.__on_message,
+                                     on_close=on_close,
+                                     on_error=on_error,
+                                     ping_interval=ping_interval,
+                                     ping_timeout=ping_timeout)
+
+    def __route(self, channel):
+        '''worker indexes of the channel'''
+        indexes = self.__route_cache.get(channel)
+        if indexes is None:
+            if channel in self.__routes:
+                indexes = self.__routes[channel]
+            else:
+                _, pair = parse_channel(channel)
+                if pair in self.__routes:
+                    indexes = self.__routes[pair]
+                else:
+                    indexes = [zlib.crc32(channel.encode('utf8')) % len(self.__workers)]
+            self.__route_cache[channel] = indexes
+        return indexes
+
+    def __send(self, channel, item):
+        for index in self.__route(channel):
+            worker = self.__workers[index]
+            try:
+                worker.queue.put_nowait(item)
+                worker.sent += 1
+            except queue.Full:
+                worker.dropped += 1
+
+    def __on_message(self, _, pair, header, message):
+        self.__send(header + '_' + pair, (pair, header, message))
+
+    def __on_raw_message(self, _, message):
+        match = _RE_CHANNEL.search(message)
+        if match is None:
+            return
+        self.__send(match.group(1), message)
+
+    def __start_worker(self, worker):
+        worker.process = multiprocessing.Process(target=_worker_main,
+                                                 args=(self.__worker_func, worker.queue, worker.processed),
+                                                 daemon=True)
+        worker.process.start()
+
+    def __supervise(self):
+        '''restart dead workers'''
+        while self.__running:
+            time.sleep(self.__restart_interval)
+            with self.__lock:
+                if not self.__running:
+                    break
+                for worker in self.__workers:
+                    if not worker.process.is_alive():
+                        worker.restarts += 1
+                        self.__start_worker(worker)
+
+    def get_metrics(self):
+        '''
+        Get per-worker metrics
+
+        msgs_per_sec is the throughput since the previous call.
+        '''
+        res_list = []
+        now = time.time()
+        for worker in self.__workers:
+            processed = worker.processed.value if worker.processed is not None else 0
+            elapsed = now - worker.last_time
+            rate = (processed - worker.last_processed) / elapsed if elapsed > 0 else 0.0
+            worker.last_processed = processed
+            worker.last_time = now
+            try:
+                backlog = worker.queue.qsize() if worker.queue is not None else 0
+            except NotImplementedError:
+                backlog = None
+            res_list.append({
+                'index': worker.index,
+                'alive': worker.process is not None and worker.process.is_alive(),
+                'pid': worker.process.pid if worker.process is not None else None,
+                'sent': worker.sent,
+                'dropped': worker.dropped,
+                'processed': processed,
+                'backlog': backlog,
+                'restarts': worker.restarts,
+                'msgs_per_sec': rate
+            })
+        return res_list
+
+    def start(self):
+        '''To start workers and listening (blocking)'''
+        with self.__lock:
+            self.__running = True
+            for worker in self.__workers:
+                worker.queue = multiprocessing.Queue(self.__queue_size)
+                worker.processed = multiprocessing.RawValue('Q', 0)
+                worker.last_processed = 0
+                worker.last_time = time.time()
+                self.__start_worker(worker)
+        self.__supervisor = threading.Thread(target=self.__supervise, daemon=True)
+        self.__supervisor.start()
+        self.__api.start()
+
+    def stop(self, timeout=5.0):
+        '''To stop listening and workers'''
+        self.__api.stop()
+        with self.__lock:
+            self.__running = False
+            for worker in self.__workers:
+                if worker.queue is not None:
+                    try:
+                        worker.queue.put_nowait(None)
+                    except queue.Full:
+                        pass
+            for worker in self.__workers:
+                if worker.process is not None:
+                    worker.process.join(timeout)
+                    if worker.process.is_alive():
+                        worker.process.terminate()
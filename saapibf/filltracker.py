@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''fill tracking module
+
+Own orders are matched against the realtime executions by
+buy/sell_child_order_acceptance_id, and the executed size and the average
+price are updated without REST calls.
+
+usage:
+    tracker = FillTracker(on_fill=...)
+    broker.set_fill_tracker(tracker)
+    RealtimeAPI([RealtimeAPI.ListenChannel.EXECUTIONS_BTC_JPY],
+                on_message_executions=tracker.on_message_executions)
+
+*** The description of callback ***
+on_fill(tracker, order, price, size) is called for each execution of the
+own order. order is OrderInfo updated by the execution. Whether the order
+is fully executed can be checked by order.order_state (COMPLETED).
+Other callbacks of the same form can be added by add_listener().
+'''
+
+import threading
+from collections import OrderedDict
+from .broker import OrderInfo
+from .common import n2j, n2p, n2s, num_div
+from .const import OrderState
+
+
+class FillTracker(object):
+    '''Fill tracker of own orders'''
+
+    def __init__(self, *, on_fill=None, pending_size=10000):
+        self.__listeners = [on_fill] if on_fill is not None else []
+        self.__orders = {}
+        # executions received before the order is registered
+        self.__pending = OrderedDict()
+        self.__pending_size = pending_size
+        self.__lock = threading.Lock()
+
+    def register(self, acceptance_id, pair, side, order_type, price, amount):
+        '''register own order (called by BrokerAPI)'''
+        order = OrderInfo()
+        order.order_id = acceptance_id
+        order.order_pair = pair
+        order.order_side = side
+        order.order_type = order_type
+        order.order_state = OrderState.ACTIVE
+        order.order_price = n2p(price) if price is not None else None
+        order.order_amount = n2s(amount)
+        order.executed_ave_price = n2j(0)
+        order.executed_amount = n2s(0)
+        order.outstanding_amount = n2s(amount)
+        with self.__lock:
+            self.__orders[acceptance_id] = order
+            fills = [self.__apply(order, price, size)
+                     for price, size in self.__pending.pop(acceptance_id, [])]
+        for exec_price, exec_size in fills:
+            self.__notify(order, exec_price, exec_size)
+        return order
+
+    def add_listener(self, on_fill):
+        '''add on_fill callback'''
+        if on_fill not in self.__listeners:
+            self.__listeners.append(on_fill)
+
+    def remove_listener(self, on_fill):
+        '''remove on_fill callback'''
+        if on_fill in self.__listeners:
+            self.__listeners.remove(on_fill)
+
+    def unregister(self, acceptance_id):
+        '''stop tracking the order'''
+        with self.__lock:
+            return self.__orders.pop(acceptance_id, None)
+
+    def unregister_all(self, pair=None):
+        '''stop tracking all the orders (of the pair)'''
+        with self.__lock:
+            ids = [order_id for order_id, order in self.__orders.items()
+                   if pair is None or order.order_pair == pair]
+            return [self.__orders.pop(order_id) for order_id in ids]
+
+    def get(self, acceptance_id):
+        '''OrderInfo of the tracked order'''
+        return self.__orders.get(acceptance_id)
+
+    def __apply(self, order, price, size):
+        '''update the order by the execution (with lock)'''
+        exec_price = n2p(price)
+        exec_size = n2s(size)
+        total = order.executed_amount + exec_size
+        order.executed_ave_price = num_div((order.executed_ave_price * order.executed_amount)
+                                           + (exec_price * exec_size), total)
+        order.executed_amount = total
+        order.outstanding_amount = max(order.order_amount - total, n2s(0))
+        if order.outstanding_amount == 0:
+            order.order_state = OrderState.COMPLETED
+            self.__orders.pop(order.order_id, None)
+        return exec_price, exec_size
+
+    def __notify(self, order, exec_price, exec_size):
+        '''call the listeners (without lock)'''
+        for listener in self.__listeners:
+            try:
+                listener(self, order, exec_price, exec_size)
+            except:     # pylint: disable-msg=W0702
+                import traceback
+                traceback.print_exc()
+
+    def __match(self, acceptance_id, price, size):
+        with self.__lock:
+            order = self.__orders.get(acceptance_id)
+            if order is None:
+                # keep recent executions for the order not registered yet
+                self.__pending.setdefault(acceptance_id, []).append((price, size))
+                self.__pending.move_to_end(acceptance_id)
+                if len(self.__pending) > self.__pending_size:
+                    self.__pending.popitem(last=False)
+                return
+            exec_price, exec_size = self.__apply(order, price, size)
+        self.__notify(order, exec_price, exec_size)
+
+    def on_message_executions(self, _, __, data_list):
+        '''[callback] executions of RealtimeAPI'''
+        for data in data_list:
+            self.__match(data.buy_child_order_acceptance_id, data.price, data.size)
+            self.__match(data.sell_child_order_acceptance_id, data.price, data.size)
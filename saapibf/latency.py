@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+'''latency instrumentation module for the realtime feed
+
+The lag from the exchange time (ticker timestamp, executions exec_date)
+to the local receive time and to the start/end of the callbacks, and the
+callback duration are recorded per channel in log-scale histograms.
+The board channels have no exchange time, so only dispatch and callback
+durations are recorded for them.
+
+*** Clock offset ***
+The minimum of (receive time - exchange time) in the recent window is the
+local clock offset plus the minimum network latency. It is reported as
+clock_offset (seconds) and is an upper bound of the clock offset.
+
+*** Slow callback ***
+A watchdog thread samples the stack of the callback running longer than
+slow_callback seconds and calls on_slow_callback(monitor, channel,
+elapsed, stack) once per callback. stack is the formatted stack string.
+Without on_slow_callback the watchdog is not started and only the count
+is recorded.
+'''
+
+import bisect
+import sys
+import threading
+import time
+import traceback
+from .common import str2ns
+
+
+class LatencyHistogram(object):
+    '''log-scale histogram of latency (seconds)'''
+
+    # upper bounds of buckets (seconds), the last bucket is unbounded
+    BOUNDS = (0.0001, 0.0002, 0.0005,
+              0.001, 0.002, 0.005,
+              0.01, 0.02, 0.05,
+              0.1, 0.2, 0.5,
+              1.0, 2.0, 5.0)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        '''add a value (seconds)'''
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        '''approximate percentile (upper bound of the bucket)'''
+        if self.count == 0:
+            return None
+        rank = self.count * pct / 100.0
+        acc = 0
+        for index, num in enumerate(self.buckets):
+            acc += num
+            if acc >= rank:
+                if index < len(self.BOUNDS):
+                    return min(self.BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        '''histogram as dict'''
+        return {
+            'count': self.count,
+            'ave': self.total / self.count if self.count > 0 else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': list(zip(self.BOUNDS + (None,), self.buckets))
+        }
+
+
+class LatencyMonitor(object):
+    '''latency monitor of the realtime feed'''
+
+    METRICS = ('recv_lag', 'start_lag', 'end_lag', 'dispatch', 'callback')
+    OFFSET_WINDOW = 60.0    # seconds
+
+    def __init__(self, *, slow_callback=0.1, on_slow_callback=None):
+        self.slow_callback = slow_callback
+        self.__cb_on_slow_callback = on_slow_callback
+        self.slow_callbacks = 0
+        self.__channels = {}
+        self.__lock = threading.Lock()
+
+        # clock offset (minimum of the current and the previous window)
+        self.__offset_cur = None
+        self.__offset_prv = None
+        self.__offset_time = time.time()
+
+        # running callback (thread id: [start time, channel, sampled])
+        self.__running = {}
+        self.__watchdog = None
+        self.__stop_event = threading.Event()
+
+    def __channel(self, channel):
+        '''histograms of the channel (with lock)'''
+        hists = self.__channels.get(channel)
+        if hists is None:
+            hists = {name: LatencyHistogram() for name in self.METRICS}
+            hists['slow_callbacks'] = 0
+            self.__channels[channel] = hists
+        return hists
+
+    def begin(self, channel):
+        '''mark the start of the callbacks'''
+        start_time = time.time()
+        self.__running[threading.get_ident()] = [start_time, channel, False]
+        return start_time
+
+    def end(self, channel, recv_time, start_time, exchange_time=None):
+        '''
+        mark the end of the callbacks and record the latency
+
+        recv_time, start_time: time.time() of receive and of begin()
+        exchange_time: exchange time string (ISO8601) or None
+        '''
+        end_time = time.time()
+        self.__running.pop(threading.get_ident(), None)
+        exchange_sec = str2ns(exchange_time) / 1000000000 if exchange_time else None
+        duration = end_time - start_time
+        with self.__lock:
+            hists = self.__channel(channel)
+            hists['dispatch'].add(start_time - recv_time)
+            hists['callback'].add(duration)
+            if duration > self.slow_callback:
+                hists['slow_callbacks'] += 1
+                self.slow_callbacks += 1
+            if exchange_sec is not None:
+                recv_lag = recv_time - exchange_sec
+                hists['recv_lag'].add(recv_lag)
+                hists['start_lag'].add(start_time - exchange_sec)
+                hists['end_lag'].add(end_time - exchange_sec)
+                self.__update_offset(recv_lag, recv_time)
+
+    def __update_offset(self, recv_lag, now):
+        '''update the clock offset estimate (with lock)'''
+        if now - self.__offset_time > self.OFFSET_WINDOW:
+            self.__offset_prv = self.__offset_cur
+            self.__offset_cur = None
+            self.__offset_time = now
+        if self.__offset_cur is None or recv_lag < self.__offset_cur:
+            self.__offset_cur = recv_lag
+
+    @property
+    def clock_offset(self):
+        '''[property] estimated clock offset (seconds, local - exchange)'''
+        offsets = [offset for offset in (self.__offset_cur, self.__offset_prv) if offset is not None]
+        return min(offsets) if len(offsets) > 0 else None   # pylint: disable-msg=C1801
+
+    def get_metrics(self):
+        '''metrics snapshot'''
+        with self.__lock:
+            res_channels = {}
+            for channel, hists in self.__channels.items():
+                res_channels[channel] = {name: hists[name].to_dict() for name in self.METRICS}
+                res_channels[channel]['slow_callbacks'] = hists['slow_callbacks']
+            return {
+                'channels': res_channels,
+                'clock_offset': self.clock_offset,
+                'slow_callbacks': self.slow_callbacks
+            }
+
+    def reset(self):
+        '''clear the histograms'''
+        with self.__lock:
+            self.__channels = {}
+            self.slow_callbacks = 0
+
+    # watchdog
+    def start_watchdog(self):
+        '''start the slow callback watchdog thread'''
+        if self.__cb_on_slow_callback is None:
+            return
+        self.__stop_event.clear()
+        if self.__watchdog is not None and self.__watchdog.is_alive():
+            return
+        self.__watchdog = threading.Thread(target=self.__watch, daemon=True)
+        self.__watchdog.start()
+
+    def stop_watchdog(self):
+        '''stop the slow callback watchdog thread'''
+        self.__stop_event.set()
+        watchdog = self.__watchdog
+        if watchdog is not None and watchdog is not threading.current_thread():
+            watchdog.join()
+
+    def __watch(self):
+        interval = self.slow_callback / 2
+        while not self.__stop_event.wait(interval):
+            now = time.time()
+            for thread_id, running in list(self.__running.items()):
+                start_time, channel, sampled = running
+                if sampled or now - start_time <= self.slow_callback:
+                    continue
+                running[2] = True
+                frame = sys._current_frames().get(thread_id)     # pylint: disable=protected-access
+                if frame is None:
+                    continue
+                try:
+                    self.__cb_on_slow_callback(self, channel, now - start_time,
+                                               ''.join(traceback.format_stack(frame)))
+                except:     # pylint: disable-msg=W0702
+                    traceback.print_exc()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+'''local PnL and margin engine module for FX
+
+Positions and collateral are loaded once by REST, own fills are applied
+incrementally and the unrealized PnL and the keep rate are repriced on
+every realtime ticker ltp. REST is used again only for reconciliation
+at a low rate.
+
+The fills applied while the reconciliation is in flight are recorded
+and applied again on top of the REST snapshot (the positions of REST
+are updated after the fills of the realtime stream).
+
+usage:
+    engine = MarginEngine(broker_fx, on_alert=..., alert_rates=[1.5, 1.2])
+    engine.load()
+    tracker = FillTracker(on_fill=engine.on_fill)
+    RealtimeAPI([RealtimeAPI.ListenChannel.TICKER_FX_BTC_JPY, ...],
+                on_message_ticker=engine.on_message_ticker, ...)
+
+*** The description of callback ***
+on_alert(engine, margin_rate, alert_rate) is called when the keep rate
+falls below alert_rate. It is called again after the keep rate recovers
+above alert_rate.
+'''
+
+import threading
+import time
+from .common import n2d, p2d, s2d
+from .const import OrderSide
+
+
+class MarginEngine(object):
+    '''PnL and margin engine'''
+
+    def __init__(self, broker, *,
+                 reconcile_interval=60.0,
+                 leverage=2,
+                 alert_rates=None,
+                 on_alert=None):
+        self.__broker = broker
+        self.pair = broker.product_code
+        self.__reconcile_interval = reconcile_interval
+        self.__cb_on_alert = on_alert
+        self.__alert_rates = sorted([n2d(rate) for rate in alert_rates], reverse=True) if alert_rates else []
+        self.__alerted = set()
+        self.__lock = threading.Lock()
+        self.__load_lock = threading.Lock()
+        self.__fills_in_flight = None   # fills applied during load (side, price, size)
+        self.__reconciling = False
+        self.last_reconcile_time = None
+
+        self.collateral = n2d(0)        # 預入証拠金(JPY, 未実現損益を除く)
+        self.net_amount = n2d(0)        # 建玉数量(買い:正, 売り:負)
+        self.ave_price = n2d(0)         # 建玉平均価格
+        self.leverage = n2d(leverage)
+        self.ltp = None
+        self.profit_loss = n2d(0)       # 未実現損益(JPY)
+        self.required_margin = n2d(0)   # 必要証拠金(JPY)
+        self.margin_rate = None         # 証拠金維持率
+
+    def load(self):
+        '''load collateral and positions by REST'''
+        with self.__load_lock:
+            with self.__lock:
+                self.__fills_in_flight = []
+            try:
+                return self.__load()
+            finally:
+                with self.__lock:
+                    self.__fills_in_flight = None
+
+    def __load(self):
+        result, mti = self.__broker.get_margin_trading()
+        if not result:
+            return False
+        result, pi_list, _, _ = self.__broker.get_positions()
+        if not result:
+            return False
+
+        net_amount = n2d(0)
+        divisor = n2d(0)
+        leverage = self.leverage
+        total = n2d(0)
+        for pos in pi_list:
+            amount = s2d(pos.amount)
+            net_amount += amount if pos.side == OrderSide.BUY else -amount
+            divisor += p2d(pos.price) * amount
+            total += amount
+            leverage = pos.leverage
+
+        with self.__lock:
+            self.collateral = p2d(mti.margin_deposit)
+            self.net_amount = net_amount
+            self.ave_price = divisor / total if total > 0 else n2d(0)
+            self.leverage = leverage
+            # the fills after the request are not in the snapshot
+            for side, price, size in self.__fills_in_flight:
+                self.__apply_fill(side, price, size)
+            self.last_reconcile_time = time.time()
+            self.__reprice()
+        self.__check_alert()
+        return True
+
+    def apply_fill(self, side, price, size):
+        '''apply own fill (price and size of the numeric mode, as given by FillTracker)'''
+        price = p2d(price)
+        size = s2d(size)
+        with self.__lock:
+            if self.__fills_in_flight is not None:
+                self.__fills_in_flight.append((side, price, size))
+            self.__apply_fill(side, price, size)
+            self.__reprice()
+        self.__check_alert()
+
+    def __apply_fill(self, side, price, size):
+        '''update the position by the fill (with lock)'''
+        signed = size if side == OrderSide.BUY else -size
+        net = self.net_amount
+        if net == 0 or (net > 0) == (signed > 0):
+            # open or add
+            total = net + signed
+            self.ave_price = ((self.ave_price * abs(net)) + (price * abs(signed))) / abs(total)
+            self.net_amount = total
+        else:
+            # close (and reverse)
+            close_amount = min(abs(signed), abs(net))
+            direction = 1 if net > 0 else -1
+            self.collateral += (price - self.ave_price) * close_amount * direction
+            total = net + signed
+            if total == 0:
+                self.ave_price = n2d(0)
+            elif (total > 0) != (net > 0):
+                self.ave_price = price
+            self.net_amount = total
+
+    def __reprice(self):
+        '''recalculate PnL and keep rate (with lock)'''
+        if self.ltp is not None and self.net_amount != 0:
+            self.profit_loss = (self.ltp - self.ave_price) * self.net_amount
+        else:
+            self.profit_loss = n2d(0)
+        self.required_margin = self.ave_price * abs(self.net_amount) / self.leverage
+        if self.required_margin > 0:
+            self.margin_rate = (self.collateral + self.profit_loss) / self.required_margin
+        else:
+            self.margin_rate = None
+
+    def __check_alert(self):
+        if self.__cb_on_alert is None or len(self.__alert_rates) == 0:  # pylint: disable-msg=C1801
+            return
+        margin_rate = self.margin_rate
+        for alert_rate in self.__alert_rates:
+            if margin_rate is not None and margin_rate < alert_rate:
+                if alert_rate not in self.__alerted:
+                    self.__alerted.add(alert_rate)
+                    try:
+                        self.__cb_on_alert(self, margin_rate, alert_rate)
+                    except:     # pylint: disable-msg=W0702
+                        import traceback
+                        traceback.print_exc()
+            else:
+                self.__alerted.discard(alert_rate)
+
+    def update_ltp(self, ltp):
+        '''reprice by the last traded price'''
+        with self.__lock:
+            self.ltp = n2d(ltp)
+            self.__reprice()
+        self.__check_alert()
+        self.__reconcile_if_needed()
+
+    def __reconcile_if_needed(self):
+        if self.__reconcile_interval is None or self.__reconciling:
+            return
+        if self.last_reconcile_time is not None \
+                and time.time() - self.last_reconcile_time < self.__reconcile_interval:
+            return
+        self.__reconciling = True
+        threading.Thread(target=self.__reconcile, daemon=True).start()
+
+    def __reconcile(self):
+        try:
+            if not self.load():
+                # retry at the next interval
+                self.last_reconcile_time = time.time()
+        finally:
+            self.__reconciling = False
+
+    # callbacks
+    def on_message_ticker(self, _, pair, data):
+        '''[callback] ticker of RealtimeAPI'''
+        if pair == self.pair:
+            self.update_ltp(data.ltp)
+
+    def on_fill(self, _, order, price, size):
+        '''[callback] fill of FillTracker'''
+        if order.order_pair == self.pair:
+            self.apply_fill(order.order_side, price, size)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+'''health-aware order pacing module
+
+The order rate is limited by a token bucket whose rate is scaled by the
+exchange health (get_depth_status polled periodically)
+and by the recent order latency. The circuit is opened and the orders
+fail locally without requests:
+- while the health is NO ORDER/STOP or the board is not accepting orders
+  (until the poll reports a good status)
+- when the recent error rate exceeds error_rate (half-open after
+  open_time seconds: one order is tried and closes the circuit if
+  succeeded)
+The two reasons are kept separately, and the circuit is closed only
+when both are cleared. The orders rejected by the exchange for their
+content (e.g. insufficient funds) are not counted as errors.
+
+usage:
+    pacer = OrderPacer(base_rate=5.0)
+    pacer.start_polling(broker)
+    broker.set_pacer(pacer)
+'''
+
+import threading
+import time
+from collections import deque
+from .const import HealthStatus, StateStatus
+
+
+class OrderPacer(object):
+    '''Health-aware order pacing controller and circuit breaker'''
+
+    class CircuitState():   # pylint: disable=too-few-public-methods
+        '''circuit state'''
+        CLOSED = 'CLOSED'
+        OPEN = 'OPEN'
+        HALF_OPEN = 'HALF_OPEN'
+
+    class Reason():     # pylint: disable=too-few-public-methods
+        '''reject reason'''
+        CIRCUIT_OPEN = 'CIRCUIT_OPEN'
+        RATE = 'RATE'
+
+    HEALTH_LEVELS = [HealthStatus.NORMAL,
+                     HealthStatus.BUSY,
+                     HealthStatus.VERY_BUSY,
+                     HealthStatus.SUPER_BUSY,
+                     HealthStatus.NO_ORDER,
+                     HealthStatus.STOP]
+
+    # ratio of base_rate per health
+    HEALTH_FACTORS = {
+        HealthStatus.NORMAL: 1.0,
+        HealthStatus.BUSY: 0.5,
+        HealthStatus.VERY_BUSY: 0.25,
+        HealthStatus.SUPER_BUSY: 0.1,
+        HealthStatus.NO_ORDER: 0.0,
+        HealthStatus.STOP: 0.0
+    }
+
+    # board states not accepting orders
+    BLOCK_STATES = (StateStatus.CLOSED, StateStatus.STARTING, StateStatus.MATURED)
+
+    def __init__(self, *,
+                 base_rate=5.0,
+                 burst=None,
+                 max_wait=0.0,
+                 factors=None,
+                 window=50,
+                 min_samples=10,
+                 error_rate=0.5,
+                 latency_limit=2.0,
+                 open_time=30.0):
+        self.base_rate = base_rate                  # 注文数/秒(NORMAL)
+        self.burst = burst                          # バケット容量(None: 1秒分)
+        self.max_wait = max_wait                    # 待機する最大秒数(超える場合は拒否)
+        self.factors = dict(self.HEALTH_FACTORS)
+        if factors is not None:
+            self.factors.update(factors)
+        self.min_samples = min_samples
+        self.error_rate = error_rate
+        self.latency_limit = latency_limit          # 平均応答時間がこれを超えると1段階悪化扱い
+        self.open_time = open_time
+
+        self.health = HealthStatus.NORMAL
+        self.state = StateStatus.RUNNING
+        self.circuit = self.CircuitState.CLOSED
+        self.status_time = None
+        self.__status_open = False                  # opened by the status (until a good poll)
+        self.__error_circuit = self.CircuitState.CLOSED     # circuit by the error rate
+        self.__open_until = None                    # end of the cooldown of the error rate
+        self.__trial = False
+        self.__results = deque(maxlen=window)   # (success, latency)
+        self.__tokens = None
+        self.__token_time = time.time()
+        self.__lock = threading.Lock()
+        self.__poll_thread = None
+        self.__poll_stop = threading.Event()
+
+    # status
+    def update_status(self, health, state=None):
+        '''update the exchange status (by the poll)'''
+        with self.__lock:
+            self.health = health
+            if state is not None:
+                self.state = state
+            self.status_time = time.time()
+            self.__status_open = self.__status_blocked()
+            self.__update_circuit()
+
+    def __status_blocked(self):
+        return self.factors.get(self.health, 0.0) <= 0.0 or self.state in self.BLOCK_STATES
+
+    def __update_circuit(self):
+        '''circuit of both reasons (open by the status, or the circuit by the error rate)'''
+        self.circuit = self.CircuitState.OPEN if self.__status_open else self.__error_circuit
+
+    def __close(self):
+        self.__error_circuit = self.CircuitState.CLOSED
+        self.__open_until = None
+        self.__trial = False
+        self.__results.clear()
+
+    def record(self, success, latency, *, rejected=False):
+        '''
+        record the result and the latency (seconds) of the order request
+
+        rejected: the exchange rejected the order for its content (e.g.
+                  insufficient funds). It is counted as a good response.
+        '''
+        success = bool(success or rejected)
+        with self.__lock:
+            self.__results.append((success, latency))
+            if self.__error_circuit == self.CircuitState.HALF_OPEN:
+                if success:
+                    self.__close()
+                else:
+                    self.__open()
+            elif self.__error_circuit == self.CircuitState.CLOSED and len(self.__results) >= self.min_samples:
+                errors = sum(1 for res in self.__results if not res[0])
+                if errors / len(self.__results) >= self.error_rate:
+                    self.__open()
+            self.__update_circuit()
+
+    def __open(self):
+        self.__error_circuit = self.CircuitState.OPEN
+        self.__open_until = time.time() + self.open_time
+        self.__trial = False
+
+    @property
+    def level(self):
+        '''[property] effective health (worse by one level if the latency is high)'''
+        health = self.health
+        results = self.__results
+        if self.latency_limit is not None and health in self.HEALTH_LEVELS \
+                and len(results) > 0:  # pylint: disable-msg=C1801
+            latency = sum(res[1] for res in results) / len(results)
+            index = self.HEALTH_LEVELS.index(health)
+            if latency > self.latency_limit and index < self.HEALTH_LEVELS.index(HealthStatus.SUPER_BUSY):
+                health = self.HEALTH_LEVELS[index + 1]
+        return health
+
+    @property
+    def rate(self):
+        '''[property] current order rate (orders per second)'''
+        return self.base_rate * self.factors.get(self.level, 0.0)
+
+    # pacing
+    def acquire(self):
+        '''
+        Acquire the order slot (waiting up to max_wait seconds)
+
+        return: (result, reject reason)
+        '''
+        with self.__lock:
+            now = time.time()
+            if self.__status_open:
+                return False, self.Reason.CIRCUIT_OPEN
+            if self.__error_circuit == self.CircuitState.OPEN:
+                if now < self.__open_until:
+                    return False, self.Reason.CIRCUIT_OPEN
+                self.__error_circuit = self.circuit = self.CircuitState.HALF_OPEN
+            if self.__error_circuit == self.CircuitState.HALF_OPEN:
+                if self.__trial:
+                    return False, self.Reason.CIRCUIT_OPEN
+                self.__trial = True
+                return True, None
+
+            rate = self.rate
+            if rate <= 0.0:
+                return False, self.Reason.CIRCUIT_OPEN
+            capacity = self.burst if self.burst is not None else max(1.0, rate)
+            if self.__tokens is None:
+                self.__tokens = capacity
+            self.__tokens = min(capacity, self.__tokens + (now - self.__token_time) * rate)
+            self.__token_time = now
+            wait = (1.0 - self.__tokens) / rate if self.__tokens < 1.0 else 0.0
+            if wait > self.max_wait:
+                return False, self.Reason.RATE
+            self.__tokens -= 1.0    # reserved (may be negative while waiting)
+        if wait > 0:
+            time.sleep(wait)
+        return True, None
+
+    # polling
+    def poll(self, broker):
+        '''poll the exchange status by BrokerAPI (getboardstate has the health and the state)'''
+        result, health, state = broker.get_depth_status()
+        if result:
+            self.update_status(health, state)
+        return result
+
+    def start_polling(self, broker, interval=5.0):
+        '''poll the exchange status on a background thread'''
+        if self.__poll_thread is not None and self.__poll_thread.is_alive():
+            return
+        self.__poll_stop.clear()
+
+        def run():
+            while True:
+                try:
+                    self.poll(broker)
+                except:     # pylint: disable-msg=W0702
+                    import traceback
+                    traceback.print_exc()
+                if self.__poll_stop.wait(interval):
+                    break
+
+        self.__poll_thread = threading.Thread(target=run, daemon=True)
+        self.__poll_thread.start()
+
+    def stop_polling(self):
+        '''stop the polling thread'''
+        self.__poll_stop.set()
+
+    def get_status(self):
+        '''status as dict'''
+        with self.__lock:
+            results = self.__results
+            count = len(results)
+            return {
+                'health': self.health,
+                'state': self.state,
+                'level': self.level,
+                'rate': self.rate,
+                'circuit': self.circuit,
+                'samples': count,
+                'error_rate': sum(1 for res in results if not res[0]) / count if count > 0 else 0.0,
+                'latency_ave': sum(res[1] for res in results) / count if count > 0 else None
+            }
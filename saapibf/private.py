@@ -6,29 +6,78 @@ import json
 from urllib.parse import urlencode
 from hashlib import sha256
 import hmac
-import requests
 from .common import error_parser
+from .transport import RequestsTransport
+
+
+class StagedRequest(object):
+    '''
+    POST request staged in advance
+
+    The body is serialized and the headers are templated when staged.
+    Only the timestamp and the signature are made when it is sent.
+    '''
+
+    def __init__(self, path, uri, data, api_key, hmac_base):
+        self.path = path
+        self.uri = uri
+        self.data = data
+        self.__sign_text = bytes('POST' + path + data, 'utf8')
+        self.__hmac_base = hmac_base
+        self.__headers = {
+            'ACCESS-KEY': api_key,
+            'Content-Type': 'application/json'
+        }
+
+    def make_header(self):
+        '''headers with the current timestamp and the signature'''
+        access_timestamp = str(time.time())
+        mac = self.__hmac_base.copy()
+        mac.update(bytes(access_timestamp, 'utf8'))
+        mac.update(self.__sign_text)
+        headers = self.__headers.copy()
+        headers['ACCESS-TIMESTAMP'] = access_timestamp
+        headers['ACCESS-SIGN'] = mac.hexdigest()
+        return headers
 
 
 class PrivateAPI(object):
-    '''private API class'''
+    '''
+    private API class
+
+    transport is the HTTP transport (see transport module, default:
+    RequestsTransport of pool_size connections).
+
+    *** Thread safety ***
+    The instance can be shared by threads. The connection pool is shared
+    (size it by pool_size for the number of threads), or each thread has
+    its own session if thread_local is True. The reconnect on a broken
+    connection drops the pool only once even if the threads notice it at
+    the same time.
+    '''
 
-    def __init__(self, api_key, api_secret, *, get_timeout=None, post_timeout=None):
+    def __init__(self, api_key, api_secret, *, get_timeout=None, post_timeout=None, transport=None,
+                 pool_size=10, thread_local=False):
         '''イニシャライザー'''
         self.__api_endpoint = "https://api.bitflyer.com"
         self.__api_key = api_key
         self.__api_secret = api_secret
         self.__get_timeout = get_timeout
         self.__post_timeout = post_timeout
-        self.__session = None
+        self.__own_transport = transport is None
+        if transport is None:
+            transport = RequestsTransport(pool_size=pool_size, thread_local=thread_local)
+        self.__transport = transport
+        # keyed HMAC (copied for each request)
+        self.__hmac_base = hmac.new(bytearray(self.__api_secret, 'utf8'), digestmod=sha256)
 
     def __make_header(self, query_data):
         '''リクエストヘッダーの生成'''
         access_timestamp = str(time.time())
         plain_text = access_timestamp + query_data
-        hmac_key = bytearray(self.__api_secret, 'utf8')
-        hmac_msg = bytearray(plain_text, 'utf8')
-        access_sign = hmac.new(hmac_key, hmac_msg, sha256).hexdigest()
+        mac = self.__hmac_base.copy()
+        mac.update(bytearray(plain_text, 'utf8'))
+        access_sign = mac.hexdigest()
         return {
             'ACCESS-KEY': self.__api_key,
             "ACCESS-TIMESTAMP": access_timestamp,
@@ -36,11 +85,6 @@ class PrivateAPI(object):
             'Content-Type': 'application/json'
         }
 
-    def __get_session(self):
-        if self.__session is None:
-            self.__session = requests.Session()
-        return self.__session
-
     def __get_query(self, path, query_dct):
         '''GET Method'''
         query = ''
@@ -48,14 +92,16 @@ class PrivateAPI(object):
             query = '?' + urlencode(query_dct)
         headers = self.__make_header('GET' + path + query)
         uri = self.__api_endpoint + path + query
+        transport = self.__transport
+        generation = transport.generation
         try:
-            response = self.__get_session().get(uri, headers=headers, timeout=self.__get_timeout)
-        except requests.exceptions.ConnectionError:
+            response = transport.get(uri, headers=headers, timeout=self.__get_timeout)
+        except transport.connection_errors:
             # If session disconnect, reconnect the session and command retry.
             with open('error_session.log', 'a') as ferr:
                 ferr.write(str(datetime.now()) + '\n')
-            self.__session = None
-            response = self.__get_session().get(uri, headers=headers, timeout=self.__get_timeout)
+            transport.reset(generation)
+            response = transport.get(uri, headers=headers, timeout=self.__get_timeout)
         return error_parser(response)
 
     def __post_query(self, path, query_dct):
@@ -63,18 +109,50 @@ class PrivateAPI(object):
         data = ''
         if len(query_dct) > 0:  # pylint: disable-msg=C1801
             data = json.dumps(query_dct)
-        headers = self.__make_header('POST' + path + data)
         uri = self.__api_endpoint + path
+        plain_text = 'POST' + path + data
+        # signed for each attempt (same as the staged request)
+        return self.__post(uri, data, lambda: self.__make_header(plain_text))
+
+    def __post(self, uri, data, make_header):
+        '''POST with retry on the broken connection'''
+        transport = self.__transport
+        generation = transport.generation
         try:
-            response = self.__get_session().post(uri, data=data, headers=headers, timeout=self.__post_timeout)
-        except requests.exceptions.ConnectionError:
+            response = transport.post(uri, data, headers=make_header(), timeout=self.__post_timeout)
+        except transport.connection_errors:
             # If session disconnect, reconnect the session and command retry.
             with open('error_session.log', 'a') as ferr:
                 ferr.write(str(datetime.now()) + '\n')
-            self.__session = None
-            response = self.__get_session().post(uri, data=data, headers=headers, timeout=self.__post_timeout)
+            transport.reset(generation)
+            response = transport.post(uri, data, headers=make_header(), timeout=self.__post_timeout)
         return error_parser(response)
 
+    def stage_post(self, path, query_dct):
+        '''stage POST request (sent by send_staged)'''
+        data = ''
+        if len(query_dct) > 0:  # pylint: disable-msg=C1801
+            data = json.dumps(query_dct)
+        return StagedRequest(path, self.__api_endpoint + path, data, self.__api_key, self.__hmac_base)
+
+    def send_staged(self, staged):
+        '''send the staged request (the timestamp and the signature are made now)'''
+        return self.__post(staged.uri, staged.data, staged.make_header)
+
+    @property
+    def transport(self):
+        '''[property] HTTP transport'''
+        return self.__transport
+
+    def close(self):
+        '''close the connections (the given transport is not closed)'''
+        if self.__own_transport:
+            self.__transport.close()
+
+    def warm_connection(self):
+        '''open the pooled connection in advance (by public gethealth)'''
+        self.__transport.get(self.__api_endpoint + '/v1/gethealth', timeout=self.__get_timeout)
+
     def get_permissions(self):
         '''API キーの権限を取得'''
         path = '/v1/me/getpermissions'
@@ -192,6 +270,21 @@ class PrivateAPI(object):
                         price, size,
                         *, minute_to_expire=None, time_in_force=None):
         '''新規注文を出す'''
+        path, query_dct = self.__mk_childorder(product_code, child_order_type, side, price, size,
+                                               minute_to_expire, time_in_force)
+        return self.__post_query(path, query_dct)
+
+    def stage_childorder(self, product_code,
+                         child_order_type, side,
+                         price, size,
+                         *, minute_to_expire=None, time_in_force=None):
+        '''[EXTRA]新規注文を準備する(send_stagedで送信)'''
+        path, query_dct = self.__mk_childorder(product_code, child_order_type, side, price, size,
+                                               minute_to_expire, time_in_force)
+        return self.stage_post(path, query_dct)
+
+    @staticmethod
+    def __mk_childorder(product_code, child_order_type, side, price, size, minute_to_expire, time_in_force):
         path = '/v1/me/sendchildorder'
         query_dct = {
             'product_code': product_code,
@@ -204,7 +297,7 @@ class PrivateAPI(object):
             query_dct['minute_to_expire'] = minute_to_expire
         if time_in_force is not None:
             query_dct['time_in_force'] = time_in_force
-        return self.__post_query(path, query_dct)
+        return path, query_dct
 
     def send_childorder_limit_buy(self, product_code,
                                   price, size,
@@ -1,22 +1,143 @@
 # -*- coding: utf-8 -*-
 '''public API module'''
 
-import requests
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from .common import error_parser
+from .transport import RequestsTransport
 
 
 class PublicAPI(object):
-    '''public API class'''
+    '''
+    public API class
 
-    def __init__(self, *, timeout=None):
+    transport is the HTTP transport (see transport module, default:
+    RequestsTransport).
+
+    *** Hedged requests ***
+    If hedge is True, the latency-critical idempotent GETs (getboard,
+    getticker, getboardstate, gethealth) are hedged: when no response
+    arrives within hedge_delay seconds (default: observed p95 latency),
+    a second identical GET is sent on another pooled connection and the
+    first response wins. The loser is cancelled if it has not started,
+    otherwise its response is discarded. The ratio of hedged requests in
+    the recent window is capped by hedge_max_ratio.
+    '''
+
+    HEDGE_WINDOW = 1000         # requests of the hedge ratio window
+    LATENCY_WINDOW = 500        # samples of the p95 latency
+    HEDGE_DEFAULT_DELAY = 0.1   # seconds (until p95 is observed)
+
+    def __init__(self, *, timeout=None,
+                 hedge=False, hedge_delay=None, hedge_max_ratio=0.1, pool_size=4,
+                 transport=None):
         self.__api_endpoint = "https://api.bitflyer.com"
         self.__timeout = timeout
+        self.__own_transport = transport is None
+        self.__transport = transport if transport is not None else RequestsTransport(pool_size=pool_size)
+
+        # hedged requests
+        self.__hedge = hedge
+        self.__hedge_delay = hedge_delay
+        self.__hedge_max_ratio = hedge_max_ratio
+        self.__executor = None
+        if hedge:
+            self.__executor = ThreadPoolExecutor(max_workers=pool_size)
+        self.__lock = threading.Lock()
+        self.__latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.__samples = 0
+        self.__p95 = None
+        self.__hedge_window = deque(maxlen=self.HEDGE_WINDOW)
+        self.__hedge_window_count = 0
+        self.request_count = 0
+        self.hedge_count = 0
+        self.hedge_win_count = 0
 
-    def __query(self, query_url):
+    def __query(self, query_url, hedge=False):
         '''query'''
-        response = requests.get(query_url, timeout=self.__timeout)
+        if hedge and self.__hedge:
+            return self.__hedged_query(query_url)
+        response = self.__transport.get(query_url, timeout=self.__timeout)
         return error_parser(response)
 
+    def __timed_get(self, query_url):
+        start_time = time.time()
+        response = self.__transport.get(query_url, timeout=self.__timeout)
+        return response, time.time() - start_time
+
+    def __record(self, latency, hedged):
+        with self.__lock:
+            self.request_count += 1
+            if latency is not None:
+                self.__latencies.append(latency)
+                self.__samples += 1
+                if self.__p95 is None or self.__samples % 50 == 0:   # not on every request
+                    latencies = sorted(self.__latencies)
+                    self.__p95 = latencies[int(len(latencies) * 0.95)]
+            if len(self.__hedge_window) == self.__hedge_window.maxlen:
+                self.__hedge_window_count -= self.__hedge_window[0]
+            self.__hedge_window.append(1 if hedged else 0)
+            self.__hedge_window_count += 1 if hedged else 0
+
+    def __hedge_allowed(self):
+        with self.__lock:
+            count = len(self.__hedge_window) + 1
+            return (self.__hedge_window_count + 1) / count <= self.__hedge_max_ratio
+
+    def __hedged_query(self, query_url):
+        '''query with hedged request'''
+        delay = self.__hedge_delay
+        if delay is None:
+            delay = self.__p95 if self.__p95 is not None else self.HEDGE_DEFAULT_DELAY
+
+        first = self.__executor.submit(self.__timed_get, query_url)
+        done, _ = wait([first], timeout=delay)
+        if len(done) > 0 or not self.__hedge_allowed():     # pylint: disable-msg=C1801
+            try:
+                response, latency = first.result()
+            except:     # pylint: disable-msg=W0702
+                self.__record(None, False)
+                raise
+            self.__record(latency, False)
+            return error_parser(response)
+
+        with self.__lock:
+            self.hedge_count += 1
+        second = self.__executor.submit(self.__timed_get, query_url)
+        pending = {first, second}
+        error = None
+        while len(pending) > 0:     # pylint: disable-msg=C1801
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                response, latency = future.result()
+                if future is second:
+                    with self.__lock:
+                        self.hedge_win_count += 1
+                    latency += delay
+                self.__record(latency, True)
+                return error_parser(response)
+        self.__record(None, True)
+        raise error
+
+    def get_hedge_stats(self):
+        '''statistics of hedged requests'''
+        with self.__lock:
+            window = len(self.__hedge_window)
+            return {
+                'requests': self.request_count,
+                'hedged': self.hedge_count,
+                'hedge_wins': self.hedge_win_count,
+                'hedge_ratio': self.__hedge_window_count / window if window > 0 else 0.0,
+                'p95_latency': self.__p95
+            }
+
     def get_by_url(self, url):
         '''get by URL(include endpoint)'''
         return self.__query(url)
@@ -31,34 +152,48 @@ class PublicAPI(object):
         ''' 板情報の取得 '''
         path = '/v1/getboard'
         query = '?product_code=' + pair
-        return self.__query(self.__api_endpoint + path + query)
+        return self.__query(self.__api_endpoint + path + query, hedge=True)
 
     def get_ticker(self, pair):
         '''Tickerの取得'''
         path = '/v1/getticker'
         query = '?product_code=' + pair
-        return self.__query(self.__api_endpoint + path + query)
+        return self.__query(self.__api_endpoint + path + query, hedge=True)
 
-    def get_executions(self, pair):
+    def get_executions(self, pair, *, count=None, before=None, after=None):
         ''' 約定履歴の取得 '''
         path = '/v1/getexecutions'
         query = '?product_code=' + pair
+        if count is not None:
+            query += '&count=' + str(count)
+        if before is not None:
+            query += '&before=' + str(before)
+        if after is not None:
+            query += '&after=' + str(after)
         return self.__query(self.__api_endpoint + path + query)
 
     def get_boardstate(self, pair):
         ''' 板の状態の取得 '''
         path = '/v1/getboardstate'
         query = '?product_code=' + pair
-        return self.__query(self.__api_endpoint + path + query)
+        return self.__query(self.__api_endpoint + path + query, hedge=True)
 
     def get_health(self, pair):
         ''' 取引所の状態の取得 '''
         path = '/v1/gethealth'
         query = '?product_code=' + pair
-        return self.__query(self.__api_endpoint + path + query)
+        return self.__query(self.__api_endpoint + path + query, hedge=True)
 
     def get_chats(self):
         ''' チャットの取得 '''
         path = '/v1/getchats'
         query = ''
         return self.__query(self.__api_endpoint + path + query)
+
+    def close(self):
+        '''close the connections (the given transport is not closed) and the hedge workers'''
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+        if self.__own_transport:
+            self.__transport.close()
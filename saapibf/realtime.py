@@ -2,8 +2,66 @@
 '''stream(realtime) API module'''
 
 from enum import Enum
+import itertools
 import json
-import websocket
+import random
+import threading
+import time
+from .common import n2fp, PRICE_SCALE, SIZE_SCALE
+from .latency import LatencyMonitor
+from .wsbackend import WebSocketClientBackend
+
+
+_CHANNEL_CACHE = {}
+
+
+def parse_channel(channel):
+    '''Separate channel name into header and pair.'''
+    cached = _CHANNEL_CACHE.get(channel)
+    if cached is not None:
+        return cached
+
+    res_header = None
+    res_pair = None
+    for header in RealtimeAPI.InfoChannel:
+        if header.value + '_' in channel:
+            wk_pair = channel.replace(header.value + '_', '')
+            exist_pair = False
+            for pair in RealtimeAPI.TradePair:
+                if wk_pair == pair.value:
+                    exist_pair = True
+                    break
+            if exist_pair:  # board_snapshotとboardの区別チェック
+                res_header = header.value
+                res_pair = wk_pair
+                break
+    _CHANNEL_CACHE[channel] = (res_header, res_pair)
+    return res_header, res_pair
+
+
+class _FixedPoint(object):     # pylint: disable=too-few-public-methods
+    '''
+    fixed-point value of the attribute (scaled int)
+
+    Computed on first access and kept in the instance, so the later
+    accesses are plain attribute lookups.
+    '''
+
+    def __init__(self, attr, scale):
+        self.attr = attr
+        self.scale = scale
+        self.name = None
+        self.__doc__ = '[property] {} ({})'.format(attr, 'PRICE_SCALE' if scale == PRICE_SCALE else 'SIZE_SCALE')
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = n2fp(instance.__dict__[self.attr], self.scale)
+        instance.__dict__[self.name] = value
+        return value
 
 
 class RealtimeAPI(object):
@@ -12,11 +70,47 @@ class RealtimeAPI(object):
 
     *** The description of callback ***
     on_message and on_close are normal callbacks from websocket.
+    on_raw_message receives the received text before decoding. If it is
+    the only message callback, the message is not decoded at all.
     on_message_board, on_message_board_snapshot, on_message_ticker
     and on_message_executions are special callbacks created
     by parsing message.
+    on_reconnect(api, gap) is called when the connection is recovered.
+    gap is the seconds without messages.
+    on_slow_callback(api, channel, elapsed, stack) is called from the
+    latency watchdog (see Latency).
+
+    *** Reconnect ***
+    If reconnect is True, start() does not return on disconnection. It
+    reconnects with jittered exponential backoff (reconnect_min_wait to
+    reconnect_max_wait seconds) and subscribes listen_channels again.
+    The board of a pair subscribing the board or the board snapshot is
+    marked stale on disconnection (is_board_stale). If the board snapshot
+    is subscribed, board differences are not delivered until the next
+    board snapshot, which clears the mark. Otherwise the differences are
+    delivered and the mark stays until clear_board_stale() is called,
+    e.g. after rebuilding the board from getboard in on_reconnect.
+
+    *** Subscription ***
+    subscribe() and unsubscribe() change the channels on the live
+    connection without reconnecting. The requests have JSON-RPC ids and
+    the confirmed channels are kept in confirmed_channels. The messages
+    of unsubscribed channels still in flight are dropped.
+
+    *** WebSocket backend ***
+    ws_backend creates the connection (see wsbackend module, default:
+    WebSocketClientBackend). The callbacks are not changed by the backend.
+
+    *** Latency ***
+    If latency is True, the lag from the exchange time to the receive
+    time and to the callbacks, and the callback duration are recorded per
+    channel (see latency.LatencyMonitor). The stack of a callback running
+    longer than slow_callback seconds is passed to on_slow_callback.
+    get_metrics() returns the snapshot.
     '''
 
+    RECONNECT_STABLE_TIME = 10.0    # seconds to reset the backoff
+
     WS_URL = 'wss://ws.lightstream.bitflyer.com/json-rpc'
 
     class TradePair(Enum):
@@ -68,6 +162,13 @@ class RealtimeAPI(object):
             self.volume = msg['volume']
             self.volume_by_product = msg['volume_by_product']
 
+        # fixed-point values (scaled int, see common.NumericMode)
+        best_bid_fp = _FixedPoint('best_bid', PRICE_SCALE)
+        best_ask_fp = _FixedPoint('best_ask', PRICE_SCALE)
+        best_bid_size_fp = _FixedPoint('best_bid_size', SIZE_SCALE)
+        best_ask_size_fp = _FixedPoint('best_ask_size', SIZE_SCALE)
+        ltp_fp = _FixedPoint('ltp', PRICE_SCALE)
+
     class ExecutionData(object):
         '''executions data class for callback'''
         def __init__(self, msg):
@@ -81,71 +182,251 @@ class RealtimeAPI(object):
             self.sell_child_order_acceptance_id = \
                 msg['sell_child_order_acceptance_id']
 
+        # fixed-point values (scaled int, see common.NumericMode)
+        price_fp = _FixedPoint('price', PRICE_SCALE)
+        size_fp = _FixedPoint('size', SIZE_SCALE)
+
     def __init__(self,
                  channel_list,
                  *,
                  on_message=None,
+                 on_raw_message=None,
                  on_message_board=None,
                  on_message_board_snapshot=None,
                  on_message_ticker=None,
                  on_message_executions=None,
                  on_close=None,
                  on_error=None,
+                 on_reconnect=None,
+                 on_slow_callback=None,
                  ping_interval=30,
-                 ping_timeout=10):
+                 ping_timeout=10,
+                 reconnect=False,
+                 reconnect_min_wait=0.05,
+                 reconnect_max_wait=10.0,
+                 latency=False,
+                 slow_callback=0.1,
+                 ws_backend=None):
 
         # callback
         self.__cb_on_message = on_message
+        self.__cb_on_raw_message = on_raw_message
         self.__cb_on_message_board = on_message_board
         self.__cb_on_message_board_snapshot = on_message_board_snapshot
         self.__cb_on_message_ticker = on_message_ticker
         self.__cb_on_message_executions = on_message_executions
         self.__cb_on_close = on_close
         self.__cb_on_error = on_error
+        self.__cb_on_reconnect = on_reconnect
+        self.__cb_on_slow_callback = on_slow_callback
+        self.__decode = any([on_message,
+                             on_message_board, on_message_board_snapshot,
+                             on_message_ticker, on_message_executions])
 
-        # listen channels
+        # listen channels (replaced as a whole on change)
         self.listen_channels = []
         for channel in channel_list:
             self.listen_channels.append(channel.value)
+        self.__routes = frozenset(self.listen_channels)
+        self.confirmed_channels = set()
+        self.__channel_lock = threading.Lock()
+        self.__rpc_id = itertools.count(1)
+        self.__pending = {}     # JSON-RPC id: [method, channel, event, result]
 
         # websocket
         self.__ws = None
+        self.__ws_backend = ws_backend if ws_backend is not None else WebSocketClientBackend
         self.__ws_ping_interval = ping_interval
         self.__ws_ping_timeout = ping_timeout
 
+        # reconnect
+        self.__reconnect = reconnect
+        self.__reconnect_min_wait = reconnect_min_wait
+        self.__reconnect_max_wait = reconnect_max_wait
+        self.__stopped = threading.Event()
+        self.__connected_time = None
+        self.__disconnected = False
+        self.__last_recv_time = None
+        self.__stale_pairs = set()
+        self.reconnect_count = 0
+        self.last_gap = None
+
+        # latency
+        self.latency = None
+        if latency:
+            self.latency = LatencyMonitor(slow_callback=slow_callback,
+                                          on_slow_callback=self.__latency_on_slow_callback
+                                          if on_slow_callback else None)
+
     def __ws_on_open(self, ws):  # pylint: disable-msg=C0103
+        if self.__stopped.is_set():
+            # stop() was called while connecting
+            ws.close()
+            return
+        self.__connected_time = time.time()
+        self.confirmed_channels = set()
+        for channel in self.listen_channels:
+            self.__send_rpc(ws, 'subscribe', channel)
+        if self.__disconnected:
+            self.__disconnected = False
+            self.reconnect_count += 1
+            if self.__last_recv_time is not None:
+                self.last_gap = self.__connected_time - self.__last_recv_time
+            self.__callback(self.__cb_on_reconnect, self.last_gap)
+
+    def __send_rpc(self, ws, method, channel):
+        '''send subscribe/unsubscribe request and return the pending entry'''
+        rpc_id = next(self.__rpc_id)
+        pending = [method, channel, threading.Event(), False]
+        self.__pending[rpc_id] = pending
+        ws.send(json.dumps({"jsonrpc": "2.0", "method": method, "params": {"channel": channel}, "id": rpc_id}))
+        return pending
+
+    def __ws_on_response(self, rcv_msg):
+        pending = self.__pending.pop(rcv_msg.get("id"), None)
+        if pending is None:
+            return
+        method, channel, event, _ = pending
+        result = rcv_msg.get("result") is True and "error" not in rcv_msg
+        if result:
+            if method == 'subscribe':
+                self.confirmed_channels.add(channel)
+            else:
+                self.confirmed_channels.discard(channel)
+        pending[3] = result
+        event.set()
+
+    def __request(self, method, channel, timeout):
+        '''send the request on the live connection and wait for the confirmation'''
+        ws = self.__ws
+        if ws is None or self.__connected_time is None:
+            # sent on the next connection
+            return timeout is None
+        try:
+            pending = self.__send_rpc(ws, method, channel)
+        except ws.connection_errors:
+            return timeout is None
+        if timeout is None:
+            return True
+        pending[2].wait(timeout)
+        return pending[3]
+
+    def __fail_pending(self):
+        '''the requests are not confirmed on the closed connection'''
+        pending_list = list(self.__pending.values())
+        self.__pending.clear()
+        self.confirmed_channels = set()
+        for pending in pending_list:
+            pending[2].set()
+
+    def subscribe(self, channel, *, timeout=None):
+        '''
+        Subscribe the channel without reconnecting
+
+        channel: ListenChannel
+        timeout: seconds to wait for the confirmation (None: not wait)
+        return: result (False if not confirmed in timeout)
+        '''
+        channel = channel.value
+        with self.__channel_lock:
+            if channel in self.__routes:
+                return True
+            self.listen_channels = self.listen_channels + [channel]
+            self.__routes = frozenset(self.listen_channels)
+        return self.__request('subscribe', channel, timeout)
+
+    def unsubscribe(self, channel, *, timeout=None):
+        '''
+        Unsubscribe the channel without reconnecting
+
+        channel: ListenChannel
+        timeout: seconds to wait for the confirmation (None: not wait)
+        return: result (False if not confirmed in timeout)
+        '''
+        channel = channel.value
+        with self.__channel_lock:
+            if channel not in self.__routes:
+                return True
+            self.listen_channels = [wk_channel for wk_channel in self.listen_channels if wk_channel != channel]
+            self.__routes = frozenset(self.listen_channels)
+            header, pair = self.__parse_channel(channel)
+            if header in self.__board_headers() and not self.__has_board(pair):
+                self.__stale_pairs.discard(pair)
+        return self.__request('unsubscribe', channel, timeout)
+
+    def is_board_stale(self, pair):
+        '''True if the board of the pair is waiting for the board snapshot'''
+        return pair in self.__stale_pairs
+
+    def clear_board_stale(self, pair):
+        '''Clear the stale mark of the board resynchronized by the caller'''
+        self.__stale_pairs.discard(pair)
+
+    def __board_headers(self):
+        return (self.InfoChannel.BOARD_SNAPSHOT.value, self.InfoChannel.BOARD.value)
+
+    def __has_board(self, pair, headers=None):
+        '''True if the board channel of the pair is subscribed'''
+        return any(header + '_' + pair in self.__routes
+                   for header in (headers or self.__board_headers()))
+
+    def __mark_board_stale(self):
+        board_headers = self.__board_headers()
         for channel in self.listen_channels:
-            ws.send(json.dumps({"method": "subscribe", "params": {"channel": channel}}))
+            header, pair = self.__parse_channel(channel)
+            if header in board_headers:
+                self.__stale_pairs.add(pair)
 
     def __parse_channel(self, channel):
         '''Separate channel name into header and pair.'''
-        res_header = None
-        res_pair = None
-        for header in self.InfoChannel:
-            if header.value + '_' in channel:
-                wk_pair = channel.replace(header.value + '_', '')
-                exist_pair = False
-                for pair in self.TradePair:
-                    if wk_pair == pair.value:
-                        exist_pair = True
-                        break
-                if exist_pair:  # board_snapshotとboardの区別チェック
-                    res_header = header.value
-                    res_pair = wk_pair
-                    break
-        return res_header, res_pair
+        return parse_channel(channel)
 
     def __ws_on_message(self, _, message):
+        recv_time = time.time()
+        self.__last_recv_time = recv_time
+
+        # raw callback
+        if self.__cb_on_raw_message:
+            self.__callback(self.__cb_on_raw_message, message)
+            if not self.__decode and not self.__pending:
+                return
+
         rcv_msg = json.loads(message)
-        if rcv_msg["method"] != "channelMessage":
+        rcv_method = rcv_msg.get("method")
+        if rcv_method is None and "id" in rcv_msg:
+            self.__ws_on_response(rcv_msg)
+            return
+        if rcv_method != "channelMessage" or not self.__decode:
             return
 
         # parse message
         parsed_prms = rcv_msg["params"]
         parsed_channel = parsed_prms["channel"]
+        if parsed_channel not in self.__routes:
+            return  # unsubscribed
         parsed_message = parsed_prms["message"]
         parsed_ch_header, parsed_ch_pair = self.__parse_channel(parsed_channel)
 
+        if self.latency is None:
+            self.__dispatch(parsed_ch_header, parsed_ch_pair, parsed_message)
+            return
+
+        start_time = self.latency.begin(parsed_channel)
+        try:
+            self.__dispatch(parsed_ch_header, parsed_ch_pair, parsed_message)
+        finally:
+            self.latency.end(parsed_channel, recv_time, start_time,
+                             self.__exchange_time(parsed_ch_header, parsed_message))
+
+    def __exchange_time(self, header, message):
+        '''exchange time string of the message (None if not included)'''
+        if header == self.InfoChannel.TICKER.value:
+            return message.get('timestamp')
+        if header == self.InfoChannel.EXECUTIONS.value and len(message) > 0:    # pylint: disable-msg=C1801
+            return message[-1].get('exec_date')
+        return None
+
+    def __dispatch(self, parsed_ch_header, parsed_ch_pair, parsed_message):
         # normal callback
         self.__callback(self.__cb_on_message, parsed_ch_pair, parsed_ch_header, parsed_message)
 
@@ -163,9 +444,13 @@ class RealtimeAPI(object):
 
     def __ws_on_message_board_snapshot(self, rcv_pair, rcv_message):
         data = self.BoardData(rcv_message)
+        self.__stale_pairs.discard(rcv_pair)
         self.__callback(self.__cb_on_message_board_snapshot, rcv_pair, data)
 
     def __ws_on_message_board(self, rcv_pair, rcv_message):
+        if rcv_pair in self.__stale_pairs \
+                and self.__has_board(rcv_pair, (self.InfoChannel.BOARD_SNAPSHOT.value,)):
+            return
         data = self.BoardData(rcv_message)
         self.__callback(self.__cb_on_message_board, rcv_pair, data)
 
@@ -186,6 +471,9 @@ class RealtimeAPI(object):
     def __ws_on_error(self, _, e):
         self.__callback(self.__cb_on_error, e)
 
+    def __latency_on_slow_callback(self, _, channel, elapsed, stack):
+        self.__callback(self.__cb_on_slow_callback, channel, elapsed, stack)
+
     def __callback(self, callback, *args):
         if callback:
             try:
@@ -199,16 +487,53 @@ class RealtimeAPI(object):
         if self.__ws is not None:
             self.stop()
 
-        self.__ws = websocket.WebSocketApp(self.WS_URL,
-                                           on_message=self.__ws_on_message,
-                                           on_open=self.__ws_on_open,
-                                           on_close=self.__ws_on_close,
-                                           on_error=self.__ws_on_error)
-        self.__ws.run_forever(ping_interval=self.__ws_ping_interval,
-                              ping_timeout=self.__ws_ping_timeout)
+        self.__stopped.clear()
+        if self.latency is not None:
+            self.latency.start_watchdog()
+        wait = self.__reconnect_min_wait
+        while True:
+            self.__connected_time = None
+            self.__ws = self.__ws_backend(self.WS_URL,
+                                          on_message=self.__ws_on_message,
+                                          on_open=self.__ws_on_open,
+                                          on_close=self.__ws_on_close,
+                                          on_error=self.__ws_on_error)
+            self.__ws.run_forever(ping_interval=self.__ws_ping_interval,
+                                  ping_timeout=self.__ws_ping_timeout)
+            self.__fail_pending()
+            if self.__stopped.is_set() or not self.__reconnect:
+                break
+
+            # disconnected
+            self.__disconnected = True
+            self.__mark_board_stale()
+            if self.__connected_time is not None \
+                    and time.time() - self.__connected_time >= self.RECONNECT_STABLE_TIME:
+                wait = self.__reconnect_min_wait
+            if self.__stopped.wait(random.uniform(0, wait)):
+                break
+            wait = min(wait * 2, self.__reconnect_max_wait)
 
     def stop(self):
         '''To stop listening'''
+        self.__stopped.set()
+        if self.latency is not None:
+            self.latency.stop_watchdog()
         if self.__ws is not None:
             self.__ws.close()
         self.__ws = None
+
+    def get_metrics(self):
+        '''
+        Get the metrics snapshot
+
+        The latency metrics are included only if latency is True.
+        '''
+        res_metrics = {
+            'reconnect_count': self.reconnect_count,
+            'last_gap': self.last_gap,
+            'stale_pairs': sorted(self.__stale_pairs)
+        }
+        if self.latency is not None:
+            res_metrics.update(self.latency.get_metrics())
+        return res_metrics
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+'''order reconciliation module
+
+The state of many orders is reconciled by a few paged getchildorders
+calls instead of one call per order.
+1. ACTIVE child orders are fetched page by page.
+2. Tracked orders which are no longer ACTIVE (changed recently) are
+   looked up in the latest pages of all child orders.
+'''
+
+import time
+from collections import OrderedDict
+from .broker import OrderInfo
+from .const import OrderState
+
+
+class LRUCache(object):
+    '''simple LRU cache'''
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.__data = OrderedDict()
+
+    def get(self, key, default=None):
+        '''get value (and mark as recently used)'''
+        if key not in self.__data:
+            return default
+        self.__data.move_to_end(key)
+        return self.__data[key]
+
+    def put(self, key, value):
+        '''put value'''
+        self.__data[key] = value
+        self.__data.move_to_end(key)
+        if len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def __len__(self):
+        return len(self.__data)
+
+
+class OrderReconciler(object):
+    '''
+    Order reconciler
+
+    orders is the local table of child_order_acceptance_id -> OrderInfo.
+    '''
+
+    FINAL_STATES = (OrderState.COMPLETED, OrderState.CANCELED, OrderState.EXPIRED, OrderState.REJECTED)
+
+    def __init__(self, broker, *, page_size=100, max_pages=5, cache_size=10000):
+        self.__broker = broker
+        self.__page_size = page_size
+        self.__max_pages = max_pages
+        self.orders = {}
+        self.__aid_to_oid = LRUCache(cache_size)
+        self.__parent_aid_to_oid = LRUCache(cache_size)
+        self.__aid_to_seq = {}
+        self.request_count = 0
+
+    def __iter_pages(self, *, child_order_state=None, stop_seq=None):
+        '''get child orders page by page (newest first)'''
+        before = None
+        for _ in range(self.__max_pages):
+            self.request_count += 1
+            prv_api = self.__broker._prv_api    # pylint: disable=protected-access
+            page = prv_api.get_childorders(self.__broker.product_code,
+                                           count=self.__page_size,
+                                           before=before,
+                                           child_order_state=child_order_state)
+            yield page
+            if len(page) < self.__page_size:
+                break
+            before = min(info['id'] for info in page)
+            if stop_seq is not None and before <= stop_seq:
+                break
+
+    def __update(self, info):
+        '''update the local table and return True if changed'''
+        aid = info['child_order_acceptance_id']
+        self.__aid_to_oid.put(aid, info['child_order_id'])
+        self.__aid_to_seq[aid] = info['id']
+        new_order = OrderInfo(info)
+        old_order = self.orders.get(aid)
+        self.orders[aid] = new_order
+        return (old_order is None
+                or old_order.order_state != new_order.order_state
+                or old_order.executed_amount != new_order.executed_amount)
+
+    def track(self, acceptance_id):
+        '''add the order to the local table (state is UNKNOWN until the next sync)'''
+        if acceptance_id not in self.orders:
+            self.orders[acceptance_id] = OrderInfo()
+
+    def untrack(self, acceptance_id):
+        '''remove the order from the local table'''
+        self.orders.pop(acceptance_id, None)
+        self.__aid_to_seq.pop(acceptance_id, None)
+
+    def sync(self):
+        '''
+        reconcile the local table with the broker
+
+        return: (result, list of changed acceptance ids)
+        '''
+        changed = []
+        try:
+            active_aids = set()
+            for page in self.__iter_pages(child_order_state=OrderState.ACTIVE):
+                for info in page:
+                    active_aids.add(info['child_order_acceptance_id'])
+                    if self.__update(info):
+                        changed.append(info['child_order_acceptance_id'])
+
+            # tracked orders which are not ACTIVE any more (or not known yet)
+            missing = [aid for aid, order in self.orders.items()
+                       if aid not in active_aids and order.order_state not in self.FINAL_STATES]
+            if len(missing) > 0:    # pylint: disable-msg=C1801
+                known = [self.__aid_to_seq[aid] for aid in missing if aid in self.__aid_to_seq]
+                stop_seq = min(known) if len(known) == len(missing) else None
+                missing_set = set(missing)
+                for page in self.__iter_pages(stop_seq=stop_seq):
+                    for info in page:
+                        aid = info['child_order_acceptance_id']
+                        if aid in missing_set:
+                            missing_set.discard(aid)
+                            if self.__update(info):
+                                changed.append(aid)
+                    if len(missing_set) == 0:   # pylint: disable-msg=C1801
+                        break
+
+                # fallback for orders out of the pages
+                for aid in missing_set:
+                    self.request_count += 1
+                    res_infos = self.__broker._prv_api.get_childorders(   # pylint: disable=protected-access
+                        self.__broker.product_code, child_order_acceptance_id=aid)
+                    if len(res_infos) > 0:  # pylint: disable-msg=C1801
+                        if self.__update(res_infos[0]):
+                            changed.append(aid)
+            result = True
+        except:     # pylint: disable-msg=W0702
+            result = False
+        return result, changed
+
+    def get(self, acceptance_id):
+        '''OrderInfo of the local table'''
+        return self.orders.get(acceptance_id)
+
+    def child_order_id(self, acceptance_id):
+        '''child_order_id of child_order_acceptance_id (cached)'''
+        return self.__aid_to_oid.get(acceptance_id)
+
+    def parent_aid_to_oid(self, acceptance_id):
+        '''Get parent_order_id from parent_order_acceptance_id (cached)'''
+        oid = self.__parent_aid_to_oid.get(acceptance_id)
+        if oid is not None:
+            return True, oid
+        self.request_count += 1
+        result, oid = self.__broker.parent_aid_to_oid(acceptance_id)
+        if result:
+            self.__parent_aid_to_oid.put(acceptance_id, oid)
+        return result, oid
+
+    def wait_for_orders(self, acceptance_ids,
+                        *,
+                        states=FINAL_STATES,
+                        timeout=None,
+                        min_interval=0.2,
+                        max_interval=5.0,
+                        backoff=1.5):
+        '''
+        Wait until all orders reach one of states
+
+        The polling interval starts from min_interval and is multiplied
+        by backoff while nothing changes (up to max_interval).
+        It is reset to min_interval when an order changes.
+        return: (result, dict of acceptance id -> OrderInfo)
+        '''
+        for aid in acceptance_ids:
+            self.track(aid)
+        interval = min_interval
+        limit_time = None if timeout is None else time.time() + timeout
+        while True:
+            _, changed = self.sync()
+            res_orders = {aid: self.orders.get(aid) for aid in acceptance_ids}
+            if all(order is not None and order.order_state in states for order in res_orders.values()):
+                return True, res_orders
+
+            if len(changed) > 0:    # pylint: disable-msg=C1801
+                interval = min_interval
+            else:
+                interval = min(interval * backoff, max_interval)
+
+            if limit_time is not None:
+                remain = limit_time - time.time()
+                if remain <= 0:
+                    return False, res_orders
+                interval = min(interval, remain)
+            time.sleep(interval)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''redundant realtime API module
+
+Two or more connections subscribe the same channels and the messages
+are merged. The first copy of each message is delivered and the later
+copies are dropped.
+
+*** Dedupe key ***
+executions      : execution id
+ticker          : tick_id
+
+*** Board ***
+Board messages have no id, and the same difference can legally repeat,
+so they are not deduped by content. The board and the board snapshot
+are delivered from one primary connection. When the primary is
+disconnected, the next connected one becomes the primary: its board
+snapshot channels are subscribed again and the board differences are
+not delivered until its board snapshot.
+
+The callbacks are the same form as RealtimeAPI (the first argument is
+this object), except that on_close and on_error receive the connection
+index after it. They are called without the lock of the merge, so they
+can call get_stats().
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from .realtime import RealtimeAPI, parse_channel
+
+
+class RedundantRealtimeAPI(object):
+    '''Redundant realtime API by multiple connections'''
+
+    class ConnectionStats(object):
+        '''statistics of a connection'''
+        def __init__(self, index):
+            self.index = index
+            self.messages = 0       # received messages (including duplicates)
+            self.leads = 0          # delivered first
+            self.lags = 0           # arrived later than the other connection
+            self.lag_total = 0.0    # seconds
+            self.lag_max = 0.0      # seconds
+            self.reconnects = 0
+
+        def to_dict(self):
+            '''statistics as dict'''
+            return {
+                'index': self.index,
+                'messages': self.messages,
+                'leads': self.leads,
+                'lags': self.lags,
+                'lag_ave': self.lag_total / self.lags if self.lags > 0 else 0.0,
+                'lag_max': self.lag_max,
+                'reconnects': self.reconnects
+            }
+
+    def __init__(self,
+                 channel_list,
+                 *,
+                 connections=2,
+                 on_message_board=None,
+                 on_message_board_snapshot=None,
+                 on_message_ticker=None,
+                 on_message_executions=None,
+                 on_close=None,
+                 on_error=None,
+                 ping_interval=30,
+                 ping_timeout=10,
+                 dedupe_size=10000,
+                 reconnect_min_wait=0.05,
+                 reconnect_max_wait=10.0,
+                 ws_backend=None):
+
+        # callback
+        self.__cb_on_message_board = on_message_board
+        self.__cb_on_message_board_snapshot = on_message_board_snapshot
+        self.__cb_on_message_ticker = on_message_ticker
+        self.__cb_on_message_executions = on_message_executions
+        self.__cb_on_close = on_close
+        self.__cb_on_error = on_error
+
+        self.__seen = OrderedDict()
+        self.__dedupe_size = dedupe_size
+        self.__lock = threading.Lock()
+        self.__threads = []
+        self.board_primary = 0                  # connection index of the board
+        self.__connected = [True] * connections
+        self.__board_stale = set()              # pairs waiting for the snapshot of the primary
+
+        self.stats = [self.ConnectionStats(i) for i in range(connections)]
+        self.__apis = [self.__make_api(channel_list, i,
+                                       ping_interval=ping_interval,
+                                       ping_timeout=ping_timeout,
+                                       reconnect_min_wait=reconnect_min_wait,
+                                       reconnect_max_wait=reconnect_max_wait,
+                                       ws_backend=ws_backend)
+                       for i in range(connections)]
+
+    def __make_api(self, channel_list, index, **kwargs):
+        return RealtimeAPI(channel_list,
+                           on_message_board=lambda _, pair, data: self.__on_board(index, pair, data, False),
+                           on_message_board_snapshot=lambda _, pair, data: self.__on_board(index, pair, data, True),
+                           on_message_ticker=lambda _, pair, data: self.__on_ticker(index, pair, data),
+                           on_message_executions=lambda _, pair, dlist: self.__on_executions(index, pair, dlist),
+                           on_close=lambda _, *args: self.__on_close(index, *args),
+                           on_error=lambda _, e: self.__callback(self.__cb_on_error, index, e),
+                           on_reconnect=lambda *_: self.__on_reconnect(index),
+                           reconnect=True,
+                           **kwargs)
+
+    def __first(self, index, key, now):
+        '''True if the message of key arrived first (with lock)'''
+        stats = self.stats[index]
+        stats.messages += 1
+        seen = self.__seen.get(key)
+        if seen is None:
+            self.__seen[key] = now
+            if len(self.__seen) > self.__dedupe_size:
+                self.__seen.popitem(last=False)
+            stats.leads += 1
+            return True
+        lag = now - seen
+        stats.lags += 1
+        stats.lag_total += lag
+        if lag > stats.lag_max:
+            stats.lag_max = lag
+        return False
+
+    def __on_board(self, index, pair, data, snapshot):
+        with self.__lock:
+            self.stats[index].messages += 1
+            if index != self.board_primary:
+                return
+            self.stats[index].leads += 1
+            if snapshot:
+                self.__board_stale.discard(pair)
+                callback = self.__cb_on_message_board_snapshot
+            elif pair not in self.__board_stale:
+                callback = self.__cb_on_message_board
+            else:
+                return
+        self.__callback(callback, pair, data)
+
+    def __failover(self, index):
+        '''Change the board primary to the connection of index (with lock)'''
+        api = self.__apis[index]
+        self.board_primary = index
+        channels = [RealtimeAPI.ListenChannel(channel) for channel in api.listen_channels
+                    if parse_channel(channel)[0] == RealtimeAPI.InfoChannel.BOARD_SNAPSHOT.value]
+        self.__board_stale = set(parse_channel(channel.value)[1] for channel in channels)
+
+        def resubscribe():
+            # the snapshot is sent on subscription
+            for channel in channels:
+                api.unsubscribe(channel)
+                api.subscribe(channel)
+
+        if len(channels) > 0:   # pylint: disable-msg=C1801
+            threading.Thread(target=resubscribe, daemon=True).start()
+
+    def __on_close(self, index, *args):
+        with self.__lock:
+            self.__connected[index] = False
+            if index == self.board_primary:
+                for other in range(len(self.__apis)):
+                    if self.__connected[other]:
+                        self.__failover(other)
+                        break
+        self.__callback(self.__cb_on_close, index, *args)
+
+    def __on_ticker(self, index, pair, data):
+        with self.__lock:
+            first = self.__first(index, ('T', pair, data.tick_id), time.time())
+        if first:
+            self.__callback(self.__cb_on_message_ticker, pair, data)
+
+    def __on_executions(self, index, pair, data_list):
+        with self.__lock:
+            now = time.time()
+            res_list = [data for data in data_list if self.__first(index, ('E', pair, data.order_id), now)]
+        if len(res_list) > 0:   # pylint: disable-msg=C1801
+            self.__callback(self.__cb_on_message_executions, pair, res_list)
+
+    def __callback(self, callback, *args):
+        if callback:
+            try:
+                callback(self, *args)
+            except:     # pylint: disable-msg=W0702
+                import traceback
+                traceback.print_exc()
+
+    def __on_reconnect(self, index):
+        with self.__lock:
+            self.stats[index].reconnects += 1
+            self.__connected[index] = True
+            if not self.__connected[self.board_primary]:
+                # the board of the reconnected one waits for its snapshot (see RealtimeAPI)
+                self.board_primary = index
+                self.__board_stale = set()
+
+    def subscribe(self, channel, *, timeout=None):
+        '''Subscribe the channel on all connections (see RealtimeAPI.subscribe)'''
+        return all([api.subscribe(channel, timeout=timeout) for api in self.__apis])
+
+    def unsubscribe(self, channel, *, timeout=None):
+        '''Unsubscribe the channel on all connections (see RealtimeAPI.unsubscribe)'''
+        return all([api.unsubscribe(channel, timeout=timeout) for api in self.__apis])
+
+    def get_stats(self):
+        '''per-connection lead/lag statistics'''
+        with self.__lock:
+            return [stats.to_dict() for stats in self.stats]
+
+    def start(self):
+        '''To start listening (blocking until stop)'''
+        self.__threads = [threading.Thread(target=api.start, daemon=True) for api in self.__apis]
+        for thread in self.__threads:
+            thread.start()
+        for thread in self.__threads:
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def stop(self):
+        '''To stop listening'''
+        for api in self.__apis:
+            api.stop()
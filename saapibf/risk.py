@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+'''pre-trade risk check module
+
+Exposure, open order notional and order counts are kept in memory and
+updated from order responses and fills, so each check costs O(1)
+without REST calls.
+
+The check reserves the exposure and the rate slot of the order under
+the lock, so concurrent senders cannot pass together over the limits.
+The reservation is confirmed by on_order() when the order is accepted,
+or released by release() when it is not.
+
+usage:
+    gate = RiskGate(RiskLimits(max_order_amount=0.1, max_position=0.5))
+    broker.set_risk_gate(gate)
+    broker.set_fill_tracker(tracker)    # fills are applied to the gate
+'''
+
+import threading
+import time
+from collections import deque
+from .common import s2d
+from .const import OrderSide
+
+
+class RiskLimits(object):
+    '''risk limits (None is unlimited)'''
+
+    def __init__(self, *,
+                 max_order_amount=None,
+                 max_position=None,
+                 max_open_notional=None,
+                 max_orders_per_interval=None,
+                 interval=1.0):
+        self.max_order_amount = max_order_amount                # 1注文の最大数量
+        self.max_position = max_position                        # 最大建玉(未約定注文を含む絶対値)
+        self.max_open_notional = max_open_notional              # 未約定注文の最大総額(JPY)
+        self.max_orders_per_interval = max_orders_per_interval  # interval秒あたりの最大注文数
+        self.interval = interval
+
+
+class RiskReservation(object):   # pylint: disable=too-few-public-methods
+    '''exposure and rate slot reserved by RiskGate.check()'''
+
+    def __init__(self, side, price, amount, order_time):
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.order_time = order_time
+        self.active = True
+
+
+class RiskGate(object):
+    '''Pre-trade risk gate'''
+
+    class Reason():     # pylint: disable=too-few-public-methods
+        '''reject reason'''
+        ORDER_AMOUNT = 'ORDER_AMOUNT'
+        POSITION = 'POSITION'
+        OPEN_NOTIONAL = 'OPEN_NOTIONAL'
+        ORDER_RATE = 'ORDER_RATE'
+
+    def __init__(self, limits, *, position=0.0):
+        self.limits = limits
+        self.position = float(position)     # 建玉(買い:正, 売り:負)
+        self.open_buy_amount = 0.0
+        self.open_sell_amount = 0.0
+        self.open_notional = 0.0
+        self.ref_price = None               # 成行注文の評価価格
+        self.__open_orders = {}             # order id: [side, price, remaining amount]
+        self.__order_times = deque()
+        self.__lock = threading.Lock()
+
+    def check(self, side, price, amount):
+        '''
+        Check the order and reserve its exposure and rate slot
+
+        return: (True, RiskReservation) or (False, reject reason)
+        The reservation must be passed to on_order() or release().
+        '''
+        limits = self.limits
+        amount = float(amount)
+        price = float(price) if price is not None else self.ref_price
+        with self.__lock:
+            if limits.max_order_amount is not None and amount > limits.max_order_amount:
+                return False, self.Reason.ORDER_AMOUNT
+
+            if limits.max_position is not None:
+                if side == OrderSide.BUY:
+                    worst = self.position + self.open_buy_amount + amount
+                else:
+                    worst = -self.position + self.open_sell_amount + amount
+                if worst > limits.max_position:
+                    return False, self.Reason.POSITION
+
+            if limits.max_open_notional is not None and price is not None:
+                if self.open_notional + (price * amount) > limits.max_open_notional:
+                    return False, self.Reason.OPEN_NOTIONAL
+
+            now = time.time()
+            if limits.max_orders_per_interval is not None:
+                limit_time = now - limits.interval
+                order_times = self.__order_times
+                while len(order_times) > 0 and order_times[0] < limit_time:     # pylint: disable-msg=C1801
+                    order_times.popleft()
+                if len(order_times) >= limits.max_orders_per_interval:
+                    return False, self.Reason.ORDER_RATE
+
+            self.__order_times.append(now)
+            self.__add_open(side, price, amount)
+        return True, RiskReservation(side, price, amount, now)
+
+    def on_order(self, order_id, side, price, amount, reservation=None):
+        '''apply the accepted order (confirm the reservation of check())'''
+        amount = float(amount)
+        price = float(price) if price is not None else self.ref_price
+        with self.__lock:
+            if reservation is not None and reservation.active:
+                # already counted by check()
+                reservation.active = False
+                self.__open_orders[order_id] = [reservation.side, reservation.price, reservation.amount]
+                return
+            self.__order_times.append(time.time())
+            self.__open_orders[order_id] = [side, price, amount]
+            self.__add_open(side, price, amount)
+
+    def release(self, reservation, *, sent=True):
+        '''
+        release the reservation of the order not accepted
+
+        sent: the order request was sent (the rate slot is kept)
+        '''
+        with self.__lock:
+            if not reservation.active:
+                return
+            reservation.active = False
+            self.__add_open(reservation.side, reservation.price, -reservation.amount)
+            if not sent:
+                try:
+                    self.__order_times.remove(reservation.order_time)
+                except ValueError:
+                    pass
+
+    def __add_open(self, side, price, amount):
+        if side == OrderSide.BUY:
+            self.open_buy_amount += amount
+        else:
+            self.open_sell_amount += amount
+        if price is not None:
+            self.open_notional += price * amount
+
+    def apply_fill(self, order_id, side, size):
+        '''apply the fill of the order'''
+        size = float(size)
+        with self.__lock:
+            self.position += size if side == OrderSide.BUY else -size
+            order = self.__open_orders.get(order_id)
+            if order is None:
+                return
+            filled = min(size, order[2])
+            self.__add_open(order[0], order[1], -filled)
+            order[2] -= filled
+            if order[2] <= 0:
+                del self.__open_orders[order_id]
+
+    def on_cancel(self, order_id):
+        '''remove the open order'''
+        with self.__lock:
+            order = self.__open_orders.pop(order_id, None)
+            if order is not None:
+                self.__add_open(order[0], order[1], -order[2])
+
+    def on_cancel_all(self):
+        '''remove all open orders'''
+        with self.__lock:
+            self.__open_orders = {}
+            self.open_buy_amount = 0.0
+            self.open_sell_amount = 0.0
+            self.open_notional = 0.0
+
+    # callbacks
+    def on_fill(self, _, order, __, size):
+        '''[callback] fill of FillTracker'''
+        self.apply_fill(order.order_id, order.order_side, s2d(size))
+
+    def on_message_ticker(self, _, __, data):
+        '''[callback] ticker of RealtimeAPI (reference price of market orders)'''
+        self.ref_price = float(data.ltp)
+
+    def set_ref_price(self, price):
+        '''set reference price of market orders'''
+        self.ref_price = float(price)
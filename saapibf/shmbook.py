@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+'''shared memory order book module
+
+One feed process keeps the order book and the top of book/ticker state
+in a multiprocessing.shared_memory segment, and any number of reader
+processes read it without extra sockets or decoding.
+
+*** Segment layout (little endian) ***
+header : seq(Q) depth(I) bid_count(I) ask_count(I) pad(I)
+         mid_price(d) tick_id(q) best_bid(d) best_ask(d)
+         best_bid_size(d) best_ask_size(d) ltp(d) volume(d)
+         timestamp(32s)
+bids   : depth * (price(d), size(d))  best price first
+asks   : depth * (price(d), size(d))  best price first
+
+seq is a seqlock counter. The single writer makes it odd before
+it changes the segment and even again after the change (the values are
+converted before, so a bad value does not leave seq odd). A reader
+retries while seq is odd or has moved during the read, and raises
+TimeoutError if no consistent copy is read within timeout seconds.
+'''
+
+import heapq
+import struct
+import time
+from multiprocessing import shared_memory
+
+_HEADER_FMT = '<QIIII dqdddddd32s'
+_HEADER_SIZE = struct.calcsize(_HEADER_FMT)
+_SEQ_FMT = '<Q'
+_LEVEL_FMT = '<dd'
+_LEVEL_SIZE = struct.calcsize(_LEVEL_FMT)
+_OFFSET_DEPTH = struct.calcsize('<Q')
+_OFFSET_COUNT = struct.calcsize('<QI')
+_OFFSET_MID = struct.calcsize('<QIIII')
+_OFFSET_TICKER = struct.calcsize('<QIIII d')
+
+
+def segment_name(pair):
+    '''default shared memory name for the pair'''
+    return 'saapibf_book_' + pair
+
+
+def segment_size(depth):
+    '''size of the shared memory segment for the depth'''
+    return _HEADER_SIZE + (_LEVEL_SIZE * depth * 2)
+
+
+class SharedBookPublisher(object):
+    '''
+    Order book publisher (single writer)
+
+    The callbacks can be passed directly to RealtimeAPI.
+        publisher = SharedBookPublisher('FX_BTC_JPY')
+        RealtimeAPI(channels,
+                    on_message_board_snapshot=publisher.on_message_board_snapshot,
+                    on_message_board=publisher.on_message_board,
+                    on_message_ticker=publisher.on_message_ticker)
+    '''
+
+    def __init__(self, pair, *, depth=100, name=None):
+        self.pair = pair
+        self.depth = depth
+        self.name = name if name is not None else segment_name(pair)
+        self.__bids = {}
+        self.__asks = {}
+        self.__seq = 0
+        self.__shm = shared_memory.SharedMemory(name=self.name, create=True, size=segment_size(depth))
+        struct.pack_into(_HEADER_FMT, self.__shm.buf, 0,
+                         0, depth, 0, 0, 0,
+                         0.0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, b'')
+
+    def __begin_write(self):
+        self.__seq += 1
+        struct.pack_into(_SEQ_FMT, self.__shm.buf, 0, self.__seq)
+
+    def __end_write(self):
+        self.__seq += 1
+        struct.pack_into(_SEQ_FMT, self.__shm.buf, 0, self.__seq)
+
+    @staticmethod
+    def __apply(book, levels):
+        '''Apply board levels to the book (size 0 removes the level).'''
+        for level in levels:
+            price = float(level['price'])
+            size = float(level['size'])
+            if size == 0:
+                book.pop(price, None)
+            else:
+                book[price] = size
+
+    def __write_book(self, mid_price):
+        mid_price = float(mid_price)
+        bids = heapq.nlargest(self.depth, self.__bids.items())
+        asks = heapq.nsmallest(self.depth, self.__asks.items())
+        buf = self.__shm.buf
+        self.__begin_write()
+        try:
+            struct.pack_into('<II', buf, _OFFSET_COUNT, len(bids), len(asks))
+            struct.pack_into('<d', buf, _OFFSET_MID, mid_price)
+            offset = _HEADER_SIZE
+            for price, size in bids:
+                struct.pack_into(_LEVEL_FMT, buf, offset, price, size)
+                offset += _LEVEL_SIZE
+            offset = _HEADER_SIZE + (_LEVEL_SIZE * self.depth)
+            for price, size in asks:
+                struct.pack_into(_LEVEL_FMT, buf, offset, price, size)
+                offset += _LEVEL_SIZE
+        finally:
+            self.__end_write()
+
+    def update_board_snapshot(self, data):
+        '''replace the book with board snapshot data'''
+        self.__bids = {}
+        self.__asks = {}
+        self.__apply(self.__bids, data.bids)
+        self.__apply(self.__asks, data.asks)
+        self.__write_book(data.mid_price)
+
+    def update_board(self, data):
+        '''apply board difference data'''
+        self.__apply(self.__bids, data.bids)
+        self.__apply(self.__asks, data.asks)
+        self.__write_book(data.mid_price)
+
+    def update_ticker(self, data):
+        '''write ticker data'''
+        values = (int(data.tick_id),
+                  float(data.best_bid), float(data.best_ask),
+                  float(data.best_bid_size), float(data.best_ask_size),
+                  float(data.ltp), float(data.volume),
+                  str(data.timestamp).encode('ascii')[:32])
+        self.__begin_write()
+        try:
+            struct.pack_into('<qdddddd32s', self.__shm.buf, _OFFSET_TICKER, *values)
+        finally:
+            self.__end_write()
+
+    # callbacks for RealtimeAPI
+    def on_message_board_snapshot(self, _, pair, data):
+        '''[callback] board snapshot'''
+        if pair == self.pair:
+            self.update_board_snapshot(data)
+
+    def on_message_board(self, _, pair, data):
+        '''[callback] board'''
+        if pair == self.pair:
+            self.update_board(data)
+
+    def on_message_ticker(self, _, pair, data):
+        '''[callback] ticker'''
+        if pair == self.pair:
+            self.update_ticker(data)
+
+    def close(self):
+        '''close and remove the segment'''
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm.unlink()
+        self.__shm = None
+
+
+class SharedBook(object):
+    '''consistent copy of the shared book (same attributes as BoardData/TickerData)'''
+    seq = None
+    mid_price = None
+    bids = None
+    asks = None
+    tick_id = None
+    best_bid = None
+    best_ask = None
+    best_bid_size = None
+    best_ask_size = None
+    ltp = None
+    volume = None
+    timestamp = None
+
+
+class SharedBookReader(object):
+    '''Order book reader (any number of processes)'''
+
+    def __init__(self, pair, *, name=None, retry_wait=0.0, timeout=1.0):
+        self.pair = pair
+        self.name = name if name is not None else segment_name(pair)
+        self.__retry_wait = retry_wait
+        self.__timeout = timeout
+        self.__shm = shared_memory.SharedMemory(name=self.name, create=False)
+        try:
+            # The segment is owned by the publisher. Do not let the
+            # resource tracker of this process unlink it at exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.__shm._name, 'shared_memory')  # pylint: disable=protected-access
+        except Exception:   # pylint: disable=broad-except
+            pass
+        self.depth = struct.unpack_from('<I', self.__shm.buf, _OFFSET_DEPTH)[0]
+
+    @property
+    def seq(self):
+        '''[property] current sequence number (changes on every update)'''
+        return struct.unpack_from(_SEQ_FMT, self.__shm.buf, 0)[0]
+
+    def __read_once(self, buf, levels):
+        header = struct.unpack_from(_HEADER_FMT, buf, 0)
+        book = SharedBook()
+        book.seq = header[0]
+        book.mid_price = header[5]
+        book.tick_id = header[6]
+        book.best_bid = header[7]
+        book.best_ask = header[8]
+        book.best_bid_size = header[9]
+        book.best_ask_size = header[10]
+        book.ltp = header[11]
+        book.volume = header[12]
+        book.timestamp = header[13].rstrip(b'\x00').decode('ascii')
+        bid_count = min(header[2], levels)
+        ask_count = min(header[3], levels)
+        fmt = '<' + 'dd' * bid_count
+        raw = struct.unpack_from(fmt, buf, _HEADER_SIZE)
+        book.bids = [{'price': raw[i], 'size': raw[i + 1]} for i in range(0, len(raw), 2)]
+        fmt = '<' + 'dd' * ask_count
+        raw = struct.unpack_from(fmt, buf, _HEADER_SIZE + (_LEVEL_SIZE * self.depth))
+        book.asks = [{'price': raw[i], 'size': raw[i + 1]} for i in range(0, len(raw), 2)]
+        return book
+
+    def read(self, levels=None, *, timeout=None):
+        '''
+        read a consistent copy of the book (top levels only if specified)
+
+        timeout: seconds to retry (None: the timeout of the reader).
+        TimeoutError is raised if the writer does not finish the update
+        (e.g. the publisher process died while writing).
+        '''
+        buf = self.__shm.buf
+        levels = self.depth if levels is None else min(levels, self.depth)
+        timeout = self.__timeout if timeout is None else timeout
+        deadline = None
+        while True:
+            seq_begin = struct.unpack_from(_SEQ_FMT, buf, 0)[0]
+            if seq_begin % 2 == 0:
+                book = self.__read_once(buf, levels)
+                if struct.unpack_from(_SEQ_FMT, buf, 0)[0] == seq_begin:
+                    return book
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + timeout
+            elif now >= deadline:
+                raise TimeoutError('shared book {} is not readable (seq={})'.format(self.name, seq_begin))
+            if self.__retry_wait > 0:
+                time.sleep(self.__retry_wait)
+
+    def close(self):
+        '''close the segment (the publisher removes it)'''
+        if self.__shm is not None:
+            self.__shm.close()
+        self.__shm = None
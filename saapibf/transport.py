@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+'''HTTP transport module for the REST clients
+
+PublicAPI and PrivateAPI send requests by a transport object:
+    get(url, *, headers=None, timeout=None) -> response
+    post(url, data, *, headers=None, timeout=None) -> response
+    reset(generation=None)
+                drop the pooled connections (called on connection error).
+                If generation is given and the connections are already
+                replaced after it, nothing is done (the other thread reset).
+    generation          counter of the reset (read before the request)
+    connection_errors   tuple of exceptions of the broken connection
+The response has status_code and json() (see common.error_parser).
+
+*** Backends ***
+RequestsTransport   requests.Session (default)
+Urllib3Transport    urllib3 connection pool without the requests layers
+FakeTransport       in-process responses for tests and benchmarks
+'''
+
+import json
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+
+class TransportResponse(object):
+    '''response of the transport'''
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        '''[property] body as string'''
+        if isinstance(self.content, bytes):
+            return self.content.decode('utf-8')
+        return self.content
+
+    def json(self):
+        '''body as JSON'''
+        return json.loads(self.text)
+
+
+class RequestsTransport(object):
+    '''
+    transport by requests.Session
+
+    The session is shared by threads (pool_size connections), or each
+    thread has its own session if thread_local is True. close() closes
+    the sessions of all threads (they are created again if used).
+    '''
+
+    def __init__(self, *, pool_size=10, thread_local=False):
+        import requests
+        self.__requests = requests
+        self.__pool_size = pool_size
+        self.__thread_local = threading.local() if thread_local else None
+        self.__local_sessions = weakref.WeakSet()   # sessions of the threads (for close)
+        self.__session = None
+        self.__lock = threading.Lock()
+        self.generation = 0
+        self.connection_errors = (requests.exceptions.ConnectionError,)
+
+    def __new_session(self):
+        session = self.__requests.Session()
+        adapter = self.__requests.adapters.HTTPAdapter(pool_connections=1,
+                                                       pool_maxsize=self.__pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def __get_session(self):
+        local = self.__thread_local
+        if local is not None:
+            session = getattr(local, 'session', None)
+            if session is None or local.generation != self.generation:
+                with self.__lock:
+                    session = self.__new_session()
+                    self.__local_sessions.add(session)
+                    local.generation = self.generation
+                local.session = session
+            return session
+
+        session = self.__session
+        if session is None:
+            with self.__lock:
+                if self.__session is None:
+                    self.__session = self.__new_session()
+                session = self.__session
+        return session
+
+    @property
+    def pool_size(self):
+        '''[property] maximum connections of a session'''
+        return self.__pool_size
+
+    @property
+    def thread_local(self):
+        '''[property] True if each thread has its own session'''
+        return self.__thread_local is not None
+
+    def session(self):
+        '''requests.Session of the current thread (created if not yet)'''
+        return self.__get_session()
+
+    def get(self, url, *, headers=None, timeout=None):
+        '''GET'''
+        return self.__get_session().get(url, headers=headers, timeout=timeout)
+
+    def post(self, url, data, *, headers=None, timeout=None):
+        '''POST'''
+        return self.__get_session().post(url, data=data, headers=headers, timeout=timeout)
+
+    def reset(self, generation=None):
+        '''drop the session (of the thread if thread_local)'''
+        local = self.__thread_local
+        if local is not None:
+            session = getattr(local, 'session', None)
+            local.session = None
+            if session is not None:
+                with self.__lock:
+                    self.__local_sessions.discard(session)
+                session.close()
+            return
+        with self.__lock:
+            if generation is not None and generation != self.generation:
+                return  # already reset by the other thread
+            self.generation += 1
+            self.__session = None
+        # The old session is not closed here; the requests of the other
+        # threads on it are finished and its connections are closed by GC.
+
+    def close(self):
+        '''close the sessions (of all threads if thread_local)'''
+        with self.__lock:
+            self.generation += 1    # the sessions of the threads are replaced on the next use
+            sessions = list(self.__local_sessions)
+            self.__local_sessions.clear()
+            if self.__session is not None:
+                sessions.append(self.__session)
+            self.__session = None
+        for session in sessions:
+            session.close()
+
+
+class Urllib3Transport(object):
+    '''transport by urllib3 connection pool (no hooks, adapters and cookies)'''
+
+    def __init__(self, *, pool_size=10):
+        import urllib3
+        self.__urllib3 = urllib3
+        self.__pool = urllib3.PoolManager(maxsize=pool_size, retries=False)
+        self.__lock = threading.Lock()
+        self.generation = 0
+        self.connection_errors = (urllib3.exceptions.ProtocolError,
+                                  urllib3.exceptions.NewConnectionError,
+                                  ConnectionError)
+
+    def __request(self, method, url, body, headers, timeout):
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = self.__urllib3.Timeout(total=timeout)
+        response = self.__pool.urlopen(method, url, body=body, headers=headers,
+                                       retries=False, preload_content=True, **kwargs)
+        return TransportResponse(response.status, response.data)
+
+    def get(self, url, *, headers=None, timeout=None):
+        '''GET'''
+        return self.__request('GET', url, None, headers, timeout)
+
+    def post(self, url, data, *, headers=None, timeout=None):
+        '''POST'''
+        return self.__request('POST', url, data, headers, timeout)
+
+    def reset(self, generation=None):
+        '''drop the pooled connections'''
+        with self.__lock:
+            if generation is not None and generation != self.generation:
+                return  # already reset by the other thread
+            self.generation += 1
+        self.__pool.clear()
+
+    def close(self):
+        '''close the transport'''
+        self.reset()
+
+
+class FakeTransport(object):
+    '''
+    in-process transport for tests and benchmarks
+
+    The response is looked up by (method, path). The value is the JSON
+    body, or a function (method, url, headers, data) -> (status code, JSON body).
+    The requests are kept in requests as (method, url, headers, data).
+    '''
+
+    connection_errors = (ConnectionError,)
+    generation = 0
+
+    def __init__(self, routes=None, *, record=True):
+        self.routes = dict(routes) if routes is not None else {}
+        self.requests = []
+        self.__record = record
+
+    def add(self, method, path, body, status_code=200):
+        '''add the response'''
+        if callable(body):
+            self.routes[(method, path)] = body
+        else:
+            self.routes[(method, path)] = lambda *_: (status_code, body)
+
+    def __request(self, method, url, headers, data):
+        if self.__record:
+            self.requests.append((method, url, headers, data))
+        handler = self.routes.get((method, urlsplit(url).path))
+        if handler is None:
+            return TransportResponse(404, json.dumps({'status': -1, 'error_message': 'not found'}))
+        if not callable(handler):
+            return TransportResponse(200, json.dumps(handler))
+        status_code, body = handler(method, url, headers, data)
+        return TransportResponse(status_code, json.dumps(body))
+
+    def get(self, url, *, headers=None, timeout=None):    # pylint: disable=unused-argument
+        '''GET'''
+        return self.__request('GET', url, headers, None)
+
+    def post(self, url, data, *, headers=None, timeout=None):     # pylint: disable=unused-argument
+        '''POST'''
+        return self.__request('POST', url, headers, data)
+
+    def reset(self, generation=None):
+        '''nothing to drop'''
+
+    def close(self):
+        '''nothing to close'''
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+'''client-side conditional order trigger module
+
+Price and time triggers are armed locally and checked on every realtime
+price (ticker ltp or execution price). The fired trigger sends the order
+by BrokerAPI on a worker thread.
+
+*** Index ***
+ABOVE (fires when price >= level): min-heap of level
+BELOW (fires when price <= level): max-heap of level
+TIME  (fires when time >= fire time): min-heap of fire time
+TRAIL (fires when price moves offset against the best price since armed):
+    triggers armed at the same best price form a group (min-heap of
+    offset). When the price makes a new best, the groups behind it are
+    merged, so all triggers of a group share the best price. The groups
+    are kept in a heap of their nearest level.
+Checking a price costs O(log n + fired) (amortized for the merge).
+Cancelled triggers are removed lazily when they reach the top of the heap.
+
+*** Connection ***
+The connection of the private API is opened in advance and kept warm
+every warm_interval seconds by BrokerAPI.warm_connection(), so the fired
+order does not wait for the TCP/TLS handshake.
+
+usage:
+    engine = TriggerEngine(broker, on_fired=...)
+    engine.add_stop(OrderSide.SELL, 4900000, 0.01)
+    engine.add_trailing(OrderSide.SELL, 20000, 0.01)
+    RealtimeAPI([RealtimeAPI.ListenChannel.EXECUTIONS_BTC_JPY],
+                on_message_executions=engine.on_message_executions)
+
+*** The description of callback ***
+on_fired(engine, trigger, result, order_id) is called after the order of
+the fired trigger is sent. If the trigger has action, action(engine,
+trigger, price) is called instead of sending the order.
+'''
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .const import OrderSide
+
+
+class Trigger(object):
+    '''armed trigger'''
+
+    class Kind():   # pylint: disable=too-few-public-methods
+        '''trigger kind'''
+        ABOVE = 'ABOVE'
+        BELOW = 'BELOW'
+        TRAIL = 'TRAIL'
+        TIME = 'TIME'
+
+    def __init__(self, trigger_id, kind, level, side, amount, price, action):
+        self.trigger_id = trigger_id
+        self.kind = kind
+        self.level = level          # price (ABOVE, BELOW), offset (TRAIL) or time (TIME)
+        self.side = side            # side of the order
+        self.amount = amount
+        self.price = price          # limit price of the order (None: market)
+        self.action = action
+        self.cancelled = False
+        self.fired_price = None
+        self.fired_time = None
+
+
+class _TrailGroup(object):
+    '''trailing triggers sharing the best price (in the signed price)'''
+
+    def __init__(self, best):
+        self.best = best
+        self.heap = []      # (offset, seq, trigger)
+        self.version = 0
+
+
+class _TrailBook(object):
+    '''
+    trailing triggers of one direction
+
+    The price is signed so that the trigger fires when the price falls
+    (sell: price, buy: -price).
+    '''
+
+    def __init__(self):
+        self.groups = []        # stack of groups (the last one has the lowest best)
+        self.levels = []        # max-heap of (-level, version, seq, group)
+        self.seq = itertools.count()
+
+    def add(self, trigger, last):
+        '''arm the trigger at the last signed price'''
+        groups = self.groups
+        if len(groups) > 0 and groups[-1].best == last:     # pylint: disable-msg=C1801
+            group = groups[-1]
+        else:
+            group = _TrailGroup(last)
+            groups.append(group)
+        heapq.heappush(group.heap, (trigger.level, next(self.seq), trigger))
+        self.__push(group)
+
+    def __push(self, group):
+        if len(group.heap) > 0:     # pylint: disable-msg=C1801
+            group.version += 1
+            level = group.best - group.heap[0][0]
+            heapq.heappush(self.levels, (-level, group.version, next(self.seq), group))
+
+    def update(self, price, fired):
+        '''update the best price and append the fired triggers'''
+        groups = self.groups
+
+        # merge the groups behind the new best price (smaller into larger)
+        if len(groups) > 0 and groups[-1].best < price:     # pylint: disable-msg=C1801
+            behind = []
+            while len(groups) > 0 and groups[-1].best < price:  # pylint: disable-msg=C1801
+                behind.append(groups.pop())
+            if len(groups) > 0 and groups[-1].best == price:    # pylint: disable-msg=C1801
+                behind.append(groups.pop())
+            merged = max(behind, key=lambda group: len(group.heap))
+            merged.best = price
+            for group in behind:
+                if group is not merged:
+                    group.version += 1      # invalidate the levels
+                    for item in group.heap:
+                        heapq.heappush(merged.heap, item)
+            groups.append(merged)
+            self.__push(merged)
+
+        # fire
+        levels = self.levels
+        while len(levels) > 0 and -levels[0][0] >= price:   # pylint: disable-msg=C1801
+            _, version, _, group = heapq.heappop(levels)
+            if version != group.version:
+                continue
+            heap = group.heap
+            while len(heap) > 0 and group.best - heap[0][0] >= price:  # pylint: disable-msg=C1801
+                trigger = heapq.heappop(heap)[2]
+                if not trigger.cancelled:
+                    fired.append(trigger)
+            self.__push(group)
+
+
+class TriggerEngine(object):
+    '''Client-side trigger engine'''
+
+    def __init__(self, broker, *, workers=2, warm_interval=30.0, on_fired=None):
+        self.__broker = broker
+        self.__cb_on_fired = on_fired
+        self.__warm_interval = warm_interval
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__ids = itertools.count(1)
+        self.__seq = itertools.count()
+
+        self.__above = []       # (level, seq, trigger)
+        self.__below = []       # (-level, seq, trigger)
+        self.__time = []        # (time, seq, trigger)
+        self.__trail_sell = _TrailBook()    # fires when price falls
+        self.__trail_buy = _TrailBook()     # fires when price rises
+        self.triggers = {}      # trigger id: Trigger (armed)
+        self.last_price = None
+        self.__last_warm_time = None
+        if warm_interval is not None:
+            self.warm()
+
+    # arm
+    def __arm(self, kind, level, side, amount, price, action):
+        trigger = Trigger(next(self.__ids), kind, level, side, amount, price, action)
+        with self.__lock:
+            self.triggers[trigger.trigger_id] = trigger
+            if kind == Trigger.Kind.ABOVE:
+                heapq.heappush(self.__above, (level, next(self.__seq), trigger))
+            elif kind == Trigger.Kind.BELOW:
+                heapq.heappush(self.__below, (-level, next(self.__seq), trigger))
+            elif kind == Trigger.Kind.TIME:
+                heapq.heappush(self.__time, (level, next(self.__seq), trigger))
+            else:
+                if self.last_price is None:
+                    del self.triggers[trigger.trigger_id]
+                    raise ValueError('trailing trigger requires the last price')
+                if side == OrderSide.SELL:
+                    self.__trail_sell.add(trigger, self.last_price)
+                else:
+                    self.__trail_buy.add(trigger, -self.last_price)
+        return trigger.trigger_id
+
+    def add_above(self, side, level, amount, *, price=None, action=None):
+        '''arm the trigger fired when price >= level'''
+        return self.__arm(Trigger.Kind.ABOVE, float(level), side, amount, price, action)
+
+    def add_below(self, side, level, amount, *, price=None, action=None):
+        '''arm the trigger fired when price <= level'''
+        return self.__arm(Trigger.Kind.BELOW, float(level), side, amount, price, action)
+
+    def add_stop(self, side, trigger_price, amount, *, price=None, action=None):
+        '''arm the stop order (buy: price >= trigger_price, sell: price <= trigger_price)'''
+        if side == OrderSide.BUY:
+            return self.add_above(side, trigger_price, amount, price=price, action=action)
+        return self.add_below(side, trigger_price, amount, price=price, action=action)
+
+    def add_take_profit(self, side, trigger_price, amount, *, price=None, action=None):
+        '''arm the take profit order (buy: price <= trigger_price, sell: price >= trigger_price)'''
+        if side == OrderSide.BUY:
+            return self.add_below(side, trigger_price, amount, price=price, action=action)
+        return self.add_above(side, trigger_price, amount, price=price, action=action)
+
+    def add_trailing(self, side, offset, amount, *, price=None, action=None):
+        '''
+        arm the trailing stop order
+
+        sell: fired when price <= (highest price since armed) - offset
+        buy : fired when price >= (lowest price since armed) + offset
+        The last price must be known (at least one price is received).
+        '''
+        return self.__arm(Trigger.Kind.TRAIL, float(offset), side, amount, price, action)
+
+    def add_time(self, side, fire_time, amount, *, price=None, action=None):
+        '''arm the trigger fired at fire_time (epoch seconds, checked on prices and poll())'''
+        return self.__arm(Trigger.Kind.TIME, float(fire_time), side, amount, price, action)
+
+    def cancel(self, trigger_id):
+        '''cancel the armed trigger'''
+        with self.__lock:
+            trigger = self.triggers.pop(trigger_id, None)
+        if trigger is None:
+            return False
+        trigger.cancelled = True
+        return True
+
+    # check
+    def update_price(self, price, now=None):
+        '''check the triggers by the price'''
+        price = float(price)
+        now = time.time() if now is None else now
+        fired = []
+        with self.__lock:
+            self.last_price = price
+            above = self.__above
+            while len(above) > 0 and above[0][0] <= price:  # pylint: disable-msg=C1801
+                fired.append(heapq.heappop(above)[2])
+            below = self.__below
+            while len(below) > 0 and -below[0][0] >= price:     # pylint: disable-msg=C1801
+                fired.append(heapq.heappop(below)[2])
+            self.__trail_sell.update(price, fired)
+            self.__trail_buy.update(-price, fired)
+            self.__pop_time(now, fired)
+            fired = self.__take(fired)
+        self.__fire(fired, price, now)
+        self.__warm_if_needed(now)
+
+    def poll(self, now=None):
+        '''check the time triggers (for no price)'''
+        now = time.time() if now is None else now
+        fired = []
+        with self.__lock:
+            self.__pop_time(now, fired)
+            fired = self.__take(fired)
+        self.__fire(fired, self.last_price, now)
+        self.__warm_if_needed(now)
+
+    def __pop_time(self, now, fired):
+        heap = self.__time
+        while len(heap) > 0 and heap[0][0] <= now:  # pylint: disable-msg=C1801
+            fired.append(heapq.heappop(heap)[2])
+
+    def __take(self, fired):
+        '''remove the fired triggers from the armed ones (with lock)'''
+        res_list = []
+        for trigger in fired:
+            if not trigger.cancelled and self.triggers.pop(trigger.trigger_id, None) is not None:
+                res_list.append(trigger)
+        return res_list
+
+    def __fire(self, fired, price, now):
+        for trigger in fired:
+            trigger.fired_price = price
+            trigger.fired_time = now
+            self.__executor.submit(self.__execute, trigger)
+
+    def __execute(self, trigger):
+        try:
+            if trigger.action is not None:
+                trigger.action(self, trigger, trigger.fired_price)
+                return
+            broker = self.__broker
+            if trigger.side == OrderSide.BUY:
+                if trigger.price is None:
+                    res = broker.order_buy_market(trigger.amount)
+                else:
+                    res = broker.order_buy_limit(trigger.price, trigger.amount)
+            else:
+                if trigger.price is None:
+                    res = broker.order_sell_market(trigger.amount)
+                else:
+                    res = broker.order_sell_limit(trigger.price, trigger.amount)
+            result, order_id = res if isinstance(res, tuple) else (res, None)
+            if self.__cb_on_fired:
+                self.__cb_on_fired(self, trigger, result, order_id)
+        except:     # pylint: disable-msg=W0702
+            import traceback
+            traceback.print_exc()
+
+    # connection
+    def warm(self):
+        '''open the connection of the private API (on a worker thread)'''
+        self.__last_warm_time = time.time()
+        self.__executor.submit(self.__broker.warm_connection)
+
+    def __warm_if_needed(self, now):
+        if self.__warm_interval is None:
+            return
+        if now - self.__last_warm_time >= self.__warm_interval:
+            self.warm()
+
+    def close(self):
+        '''stop the worker threads (after the fired orders are sent)'''
+        self.__executor.shutdown(wait=True)
+
+    # callbacks
+    def on_message_ticker(self, _, __, data):
+        '''[callback] ticker of RealtimeAPI'''
+        self.update_price(data.ltp)
+
+    def on_message_executions(self, _, __, data_list):
+        '''[callback] executions of RealtimeAPI'''
+        for data in data_list:
+            self.update_price(data.price)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+'''WebSocket backend module for RealtimeAPI
+
+A backend is a callable which creates one connection:
+    backend(url, *, on_open, on_message, on_close, on_error) -> connection
+The callbacks are the same form as websocket.WebSocketApp (the first
+argument is the connection). An exception raised by on_open/on_message
+is given to on_error and the connection is kept. The connection has:
+    run_forever(ping_interval, ping_timeout)  blocking until closed
+    send(text)
+    close()
+    connection_errors   tuple of exceptions of the broken connection
+
+*** Backends ***
+WebSocketClientBackend  websocket-client (default). The UTF-8 validation
+                        can be skipped by skip_utf8_validation=True
+                        (the messages are given as bytes then).
+                        If wsaccel is installed, websocket-client uses
+                        it for masking and validation.
+WebsocketsBackend       threaded client of websockets (C accelerated
+                        frame parsing, requires websockets>=13).
+
+Other options are given by functools.partial, e.g.
+    partial(WebSocketClientBackend, skip_utf8_validation=True)
+'''
+
+
+class WebSocketClientBackend(object):
+    '''connection by websocket-client'''
+
+    def __init__(self, url, *, on_open, on_message, on_close, on_error, skip_utf8_validation=False):
+        import websocket
+        self.__skip_utf8_validation = skip_utf8_validation
+        self.__app = websocket.WebSocketApp(url,
+                                            on_message=lambda _, message: on_message(self, message),
+                                            on_open=lambda _: on_open(self),
+                                            on_close=lambda _, *close_args: on_close(self, *close_args),
+                                            on_error=lambda _, e: on_error(self, e))
+        self.connection_errors = (websocket.WebSocketException, OSError)
+
+    def run_forever(self, ping_interval, ping_timeout):
+        '''run until closed'''
+        self.__app.run_forever(ping_interval=ping_interval,
+                               ping_timeout=ping_timeout,
+                               skip_utf8_validation=self.__skip_utf8_validation)
+
+    def send(self, text):
+        '''send text frame'''
+        self.__app.send(text)
+
+    def close(self):
+        '''close the connection'''
+        self.__app.close()
+
+
+class WebsocketsBackend(object):
+    '''connection by the threaded client of websockets'''
+
+    def __init__(self, url, *, on_open, on_message, on_close, on_error, compression=None):
+        import websockets
+        self.__url = url
+        self.__compression = compression
+        self.__cb_on_open = on_open
+        self.__cb_on_message = on_message
+        self.__cb_on_close = on_close
+        self.__cb_on_error = on_error
+        self.__conn = None
+        self.__closed = False
+        self.connection_errors = (websockets.exceptions.WebSocketException, OSError)
+
+    def run_forever(self, ping_interval, ping_timeout):
+        '''run until closed'''
+        from websockets.sync.client import connect
+        close_args = (None, None)
+        try:
+            with connect(self.__url,
+                         ping_interval=ping_interval or None,
+                         ping_timeout=ping_timeout,
+                         compression=self.__compression,
+                         max_size=None) as conn:
+                self.__conn = conn      # for send and close
+                if self.__closed:
+                    conn.close()
+                self.__callback(self.__cb_on_open)
+                for message in conn:
+                    self.__callback(self.__cb_on_message, message)
+        except self.connection_errors as e:
+            self.__cb_on_error(self, e)
+        finally:
+            conn = self.__conn
+            if conn is not None:
+                close_args = (conn.close_code, conn.close_reason)
+            self.__cb_on_close(self, *close_args)
+
+    def __callback(self, callback, *args):
+        '''call the callback, errors go to on_error and receiving goes on (same as websocket-client)'''
+        try:
+            callback(self, *args)
+        except Exception as e:  # pylint: disable=broad-except
+            self.__cb_on_error(self, e)
+
+    def send(self, text):
+        '''send text frame'''
+        self.__conn.send(text)
+
+    def close(self):
+        '''close the connection'''
+        self.__closed = True
+        if self.__conn is not None:
+            self.__conn.close()
@@ -12,5 +12,9 @@ setup(
         'requests==2.21.0',
         'urllib3==1.24.3',
         'websocket-client==0.48.0'
-    ]
+    ],
+    extras_require={
+        'analytics': ['numpy'],
+        'asyncio': ['websockets']
+    }
 )
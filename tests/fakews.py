@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+'''in-process stand-in of the lightstream server (ws_backend for RealtimeAPI)'''
+
+import json
+import queue
+import threading
+import time
+
+
+def wait_for(predicate, timeout=2.0):
+    '''wait until predicate() is true (False if timed out)'''
+    end = time.time() + timeout
+    while not predicate():
+        if time.time() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class FakeServer(object):
+    '''
+    stand-in server
+
+    server.backend is given as ws_backend. The subscribe/unsubscribe
+    requests are confirmed and kept in requests as (connection index,
+    method, channel). The messages are sent by FakeConnection.push().
+    '''
+
+    def __init__(self):
+        self.connections = []
+        self.requests = []
+        self.__lock = threading.Lock()
+
+    def backend(self, url, *, on_open, on_message, on_close, on_error):
+        '''ws_backend'''
+        with self.__lock:
+            conn = FakeConnection(self, len(self.connections), on_open, on_message, on_close, on_error)
+            self.connections.append(conn)
+        return conn
+
+    def record(self, index, method, channel):
+        '''record the request'''
+        with self.__lock:
+            self.requests.append((index, method, channel))
+
+    def subscribed(self, index, channel):
+        '''number of the subscribe requests of the channel on the connection'''
+        with self.__lock:
+            return self.requests.count((index, 'subscribe', channel))
+
+
+class FakeConnection(object):
+    '''connection of FakeServer'''
+
+    connection_errors = (ConnectionError,)
+
+    def __init__(self, server, index, on_open, on_message, on_close, on_error):
+        self.server = server
+        self.index = index
+        self.opened = threading.Event()
+        self.__on_open = on_open
+        self.__on_message = on_message
+        self.__on_close = on_close
+        self.__on_error = on_error
+        self.__queue = queue.Queue()
+
+    def run_forever(self, ping_interval, ping_timeout):    # pylint: disable=unused-argument
+        '''deliver the pushed messages until closed'''
+        self.__on_open(self)
+        self.opened.set()
+        while True:
+            message = self.__queue.get()
+            if message is None:
+                break
+            try:
+                self.__on_message(self, message)
+            except Exception as e:     # pylint: disable=broad-except
+                self.__on_error(self, e)
+        self.__on_close(self, None, None)
+
+    def send(self, text):
+        '''request from the client (confirmed at once)'''
+        request = json.loads(text)
+        self.server.record(self.index, request['method'], request['params']['channel'])
+        if 'id' in request:
+            self.__queue.put(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': True}))
+
+    def push(self, channel, message):
+        '''send the channel message'''
+        self.__queue.put(json.dumps({'jsonrpc': '2.0', 'method': 'channelMessage',
+                                     'params': {'channel': channel, 'message': message}}))
+
+    def drop(self):
+        '''close the connection from the server'''
+        self.__queue.put(None)
+
+    def close(self):
+        '''close the connection from the client'''
+        self.__queue.put(None)
+
+
+def ticker_message(tick_id, ltp=5000000.0):
+    '''ticker message'''
+    return {'product_code': 'BTC_JPY', 'timestamp': '2019-01-01T00:00:00.1234567Z', 'tick_id': tick_id,
+            'best_bid': ltp - 1, 'best_ask': ltp + 1, 'best_bid_size': 0.1, 'best_ask_size': 0.1,
+            'total_bid_depth': 1.0, 'total_ask_depth': 1.0, 'ltp': ltp,
+            'volume': 1.0, 'volume_by_product': 1.0}
+
+
+def executions_message(*exec_ids):
+    '''executions message'''
+    return [{'id': exec_id, 'side': 'BUY', 'price': 5000000.0, 'size': 0.01,
+             'exec_date': '2019-01-01T00:00:00.1234567Z',
+             'buy_child_order_acceptance_id': 'JRF%d' % exec_id,
+             'sell_child_order_acceptance_id': 'JRF%d' % -exec_id} for exec_id in exec_ids]
+
+
+def board_message(size, price=5000000.0):
+    '''board (or board snapshot) message of one bid'''
+    return {'mid_price': price, 'bids': [{'price': price, 'size': size}], 'asks': []}
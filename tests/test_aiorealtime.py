@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+'''tests of AsyncRealtimeAPI against a local asyncio WebSocket server'''
+
+import asyncio
+import json
+import unittest
+
+import websockets
+
+from saapibf.aiorealtime import AsyncRealtimeAPI
+
+TICKER_CHANNEL = 'lightning_ticker_BTC_JPY'
+
+
+def channel_message(channel, message):
+    '''JSON-RPC notification of the channel message'''
+    return json.dumps({'jsonrpc': '2.0', 'method': 'channelMessage',
+                       'params': {'channel': channel, 'message': message}})
+
+
+def ticker(tick_id, ltp=5000000.0):
+    '''ticker message'''
+    return {'product_code': 'BTC_JPY', 'timestamp': '2019-01-01T00:00:00.1234567Z', 'tick_id': tick_id,
+            'best_bid': ltp - 1, 'best_ask': ltp + 1, 'best_bid_size': 0.1, 'best_ask_size': 0.1,
+            'total_bid_depth': 1.0, 'total_ask_depth': 1.0, 'ltp': ltp,
+            'volume': 1.0, 'volume_by_product': 1.0}
+
+
+class StandInServer(object):
+    '''local stand-in of the lightstream server
+
+    on_subscribe(server, ws, channel, connection index) sends the messages.
+    The first reject_handshakes handshakes are answered by HTTP 503.
+    '''
+
+    def __init__(self, on_subscribe, *, reject_handshakes=0):
+        self.on_subscribe = on_subscribe
+        self.connections = 0
+        self.requests = []
+        self.rejected = 0
+        self.__reject_handshakes = reject_handshakes
+        self.__server = None
+
+    def __process_request(self, connection, _):
+        if self.rejected < self.__reject_handshakes:
+            self.rejected += 1
+            return connection.respond(503, 'Service Unavailable\n')
+        return None
+
+    async def __handler(self, ws):
+        index = self.connections
+        self.connections += 1
+        async for message in ws:
+            request = json.loads(message)
+            self.requests.append((index, request))
+            if request['method'] == 'subscribe':
+                await self.on_subscribe(self, ws, request['params']['channel'], index)
+
+    async def __aenter__(self):
+        self.__server = await websockets.serve(self.__handler, '127.0.0.1', 0,
+                                               process_request=self.__process_request)
+        return self
+
+    async def __aexit__(self, *_):
+        self.__server.close()
+        await self.__server.wait_closed()
+
+    @property
+    def url(self):
+        '''[property] URL of the server'''
+        return 'ws://127.0.0.1:%d' % self.__server.sockets[0].getsockname()[1]
+
+
+def make_feed(server, **kwargs):
+    '''AsyncRealtimeAPI connecting to the stand-in server'''
+    kwargs.setdefault('reconnect_min_wait', 0.01)
+    kwargs.setdefault('reconnect_max_wait', 0.05)
+    feed = AsyncRealtimeAPI(**kwargs)
+    feed.WS_URL = server.url
+    return feed
+
+
+class AsyncRealtimeAPITest(unittest.IsolatedAsyncioTestCase):
+    '''AsyncRealtimeAPI'''
+
+    async def test_subscribe(self):
+        '''messages of the subscribed channel are delivered'''
+        async def on_subscribe(_, ws, channel, __):
+            await ws.send(channel_message(channel, ticker(1, 5000000.0)))
+
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server)
+            sub = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            msg = await asyncio.wait_for(sub.get(), 5)
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual(msg.channel, TICKER_CHANNEL)
+        self.assertEqual(msg.pair, 'BTC_JPY')
+        self.assertEqual(msg.data.ltp, 5000000.0)
+        self.assertIsNone(await sub.get())     # ended by run()
+
+    async def test_stop_before_run(self):
+        '''run() returns at once if stop() is called before'''
+        async def on_subscribe(*_):
+            pass
+
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server)
+            await feed.stop()
+            await asyncio.wait_for(feed.run(), 5)
+            self.assertEqual(server.connections, 0)
+
+    async def test_bad_message(self):
+        '''an error in a message is passed to on_error and the later messages are delivered'''
+        async def on_subscribe(_, ws, channel, __):
+            await ws.send('{not json')
+            await ws.send(channel_message(channel, {'tick_id': 1}))    # missing fields
+            await ws.send(channel_message(channel, ticker(2)))
+
+        errors = []
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server, on_error=lambda _, e: errors.append(e))
+            sub = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            msg = await asyncio.wait_for(sub.get(), 5)
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual(msg.data.tick_id, 2)
+        self.assertEqual([type(e) for e in errors], [json.JSONDecodeError, KeyError])
+        self.assertEqual(feed.reconnect_count, 0)
+
+    async def test_drop_oldest(self):
+        '''a full queue drops the oldest message'''
+        async def on_subscribe(_, ws, channel, __):
+            for tick_id in range(5):
+                await ws.send(channel_message(channel, ticker(tick_id)))
+            await ws.send(channel_message('lightning_ticker_FX_BTC_JPY', ticker(99)))
+
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server)
+            sub = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY, queue_size=2)
+            marker = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_FX_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            await asyncio.wait_for(marker.get(), 5)     # all messages are received
+            tick_ids = [(await sub.get()).data.tick_id for _ in range(2)]
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual(tick_ids, [3, 4])
+        self.assertEqual(sub.dropped, 3)
+
+    async def test_reconnect(self):
+        '''the channels are subscribed again after the connection is dropped'''
+        async def on_subscribe(_, ws, channel, index):
+            if index == 0:
+                await ws.close()
+            else:
+                await ws.send(channel_message(channel, ticker(1)))
+
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server)
+            sub = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            msg = await asyncio.wait_for(sub.get(), 5)
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual(msg.data.tick_id, 1)
+        self.assertEqual(feed.reconnect_count, 1)
+        self.assertEqual([(index, req['params']['channel']) for index, req in server.requests],
+                         [(0, TICKER_CHANNEL), (1, TICKER_CHANNEL)])
+
+    async def test_reconnect_rejected_handshake(self):
+        '''the connection is retried after the handshake is rejected'''
+        async def on_subscribe(_, ws, channel, __):
+            await ws.send(channel_message(channel, ticker(1)))
+
+        errors = []
+        async with StandInServer(on_subscribe, reject_handshakes=1) as server:
+            feed = make_feed(server, on_error=lambda _, e: errors.append(e))
+            sub = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            msg = await asyncio.wait_for(sub.get(), 5)
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual(msg.data.tick_id, 1)
+        self.assertEqual(server.rejected, 1)
+        self.assertEqual(feed.reconnect_count, 1)
+        self.assertEqual([type(e) for e in errors], [websockets.exceptions.InvalidStatus])
+        self.assertEqual(errors[0].response.status_code, 503)
+
+    async def test_unsubscribe(self):
+        '''the channel is unsubscribed when the last subscription is closed'''
+        async def on_subscribe(_, ws, channel, __):
+            await ws.send(channel_message(channel, ticker(1)))
+
+        async with StandInServer(on_subscribe) as server:
+            feed = make_feed(server)
+            sub1 = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            sub2 = feed.subscribe(AsyncRealtimeAPI.ListenChannel.TICKER_BTC_JPY)
+            task = asyncio.ensure_future(feed.run())
+            await asyncio.wait_for(sub1.get(), 5)
+            await asyncio.wait_for(sub2.get(), 5)
+            sub1.close()
+            self.assertIsNone(await sub1.get())
+            sub2.close()
+            for _ in range(100):
+                if len(server.requests) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            await feed.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual([req['method'] for _, req in server.requests], ['subscribe', 'unsubscribe'])
+
+
+if __name__ == '__main__':
+    unittest.main()
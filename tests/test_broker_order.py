@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''tests of the child orders of BrokerAPI through FakeTransport'''
+
+import unittest
+
+from saapibf.broker import BrokerAPI
+from saapibf.filltracker import FillTracker
+from saapibf.risk import RiskGate, RiskLimits
+from saapibf.transport import FakeTransport
+
+SEND_PATH = '/v1/me/sendchildorder'
+CANCEL_PATH = '/v1/me/cancelchildorder'
+CANCEL_ALL_PATH = '/v1/me/cancelallchildorders'
+
+
+class OrderCancelTest(unittest.TestCase):
+    '''order_cancel / order_all_cancel'''
+
+    def setUp(self):
+        self.accepted = 0
+        self.transport = FakeTransport()
+        self.transport.add('POST', SEND_PATH, self.accept)
+        self.transport.add('POST', CANCEL_PATH, {})
+        self.transport.add('POST', CANCEL_ALL_PATH, {})
+        self.broker = BrokerAPI('key', 'secret', log=False, transport=self.transport)
+        self.gate = RiskGate(RiskLimits(max_position=1.0))
+        self.tracker = FillTracker()
+        self.broker.set_risk_gate(self.gate)
+        self.broker.set_fill_tracker(self.tracker)
+
+    def tearDown(self):
+        self.broker.close()
+
+    def accept(self, *_):
+        '''sendchildorder accepting the order with a new id'''
+        self.accepted += 1
+        return 200, {'child_order_acceptance_id': 'JRF%d' % self.accepted}
+
+    def test_cancel_unregisters(self):
+        '''the canceled order is not tracked any more'''
+        _, first = self.broker.order_buy_limit(100, 0.1)
+        _, second = self.broker.order_sell_limit(110, 0.1)
+        self.assertIsNotNone(self.tracker.get(first))
+
+        self.assertTrue(self.broker.order_cancel(first))
+        self.assertIsNone(self.tracker.get(first))
+        self.assertIsNotNone(self.tracker.get(second))
+        self.assertEqual(self.gate.open_buy_amount, 0.0)
+
+    def test_cancel_failed_keeps(self):
+        '''the order is still tracked when the cancel is rejected'''
+        self.transport.add('POST', CANCEL_PATH, {'status': -111, 'error_message': 'rejected'}, 400)
+        _, order_id = self.broker.order_buy_limit(100, 0.1)
+
+        self.assertFalse(self.broker.order_cancel(order_id))
+        self.assertIsNotNone(self.tracker.get(order_id))
+
+    def test_all_cancel_unregisters(self):
+        '''all the orders of the pair are not tracked after order_all_cancel'''
+        ids = [self.broker.order_buy_limit(100, 0.1)[1] for _ in range(3)]
+        self.tracker.register('JRF_OTHER', 'ETH_BTC', 'BUY', 'LIMIT', 0.03, 1.0)
+
+        self.assertTrue(self.broker.order_all_cancel())
+        for order_id in ids:
+            self.assertIsNone(self.tracker.get(order_id))
+        self.assertIsNotNone(self.tracker.get('JRF_OTHER'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+'''tests of the special orders of BrokerAPI through FakeTransport'''
+
+import json
+import unittest
+from types import SimpleNamespace
+
+from saapibf.broker import BrokerAPI
+from saapibf.const import OrderSide, OrderType, OrderConditionType
+from saapibf.filltracker import FillTracker
+from saapibf.risk import RiskGate, RiskLimits
+from saapibf.transport import FakeTransport
+
+SEND_PATH = '/v1/me/sendparentorder'
+CANCEL_PATH = '/v1/me/cancelparentorder'
+PARENT_PATH = '/v1/me/getparentorder'
+PARENTS_PATH = '/v1/me/getparentorders'
+CHILDREN_PATH = '/v1/me/getchildorders'
+
+
+def parent(acceptance_id, state):
+    '''parent order of getparentorders'''
+    return {'parent_order_id': 'JCP' + acceptance_id[3:], 'parent_order_acceptance_id': acceptance_id,
+            'parent_order_state': state}
+
+
+def child(acceptance_id, side, price, size):
+    '''child order of getchildorders'''
+    return {'child_order_acceptance_id': acceptance_id, 'side': side, 'child_order_type': 'LIMIT',
+            'price': price, 'size': size}
+
+
+def execution(buy_id, sell_id, price, size):
+    '''execution of the realtime API'''
+    return SimpleNamespace(buy_child_order_acceptance_id=buy_id, sell_child_order_acceptance_id=sell_id,
+                           price=price, size=size)
+
+
+class SpecialOrderTest(unittest.TestCase):
+    '''so_send / so_bracket / so_cancel'''
+
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.transport.add('POST', SEND_PATH, {'parent_order_acceptance_id': 'JRP1'})
+        self.transport.add('POST', CANCEL_PATH, {})
+        self.broker = BrokerAPI('key', 'secret', log=False, transport=self.transport)
+        self.gate = RiskGate(RiskLimits(max_position=1.0))
+        self.tracker = FillTracker()
+        self.broker.set_risk_gate(self.gate)
+        self.broker.set_fill_tracker(self.tracker)
+
+    def tearDown(self):
+        self.broker.close()
+
+    def sent_parameters(self):
+        '''parameters of the last parent order request'''
+        return json.loads(self.transport.requests[-1][3])['parameters']
+
+    def test_send_registers_order(self):
+        '''the accepted parent order keeps the exposure until canceled'''
+        result, order_id = self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.25, stop_price=95)
+        self.assertEqual((result, order_id), (True, 'JRP1'))
+        self.assertEqual(self.gate.open_buy_amount, 0.25)
+        self.assertEqual(self.gate.open_notional, 25.0)
+        self.assertIsNone(self.tracker.get('JRP1'))     # the executions have the child ids only
+
+        self.assertTrue(self.broker.so_cancel(parent_order_acceptance_id='JRP1'))
+        self.assertEqual(self.gate.open_buy_amount, 0.0)
+        self.assertEqual(self.gate.open_notional, 0.0)
+
+    def test_cancel_by_parent_order_id(self):
+        '''the order canceled by parent_order_id is released'''
+        self.transport.add('GET', PARENT_PATH, {'parent_order_id': 'JCP1', 'parent_order_acceptance_id': 'JRP1'})
+        self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.25, stop_price=95)
+        self.assertTrue(self.broker.so_cancel(parent_order_id='JCP1'))
+        self.assertEqual(self.gate.open_buy_amount, 0.0)
+        self.assertEqual(self.gate.open_notional, 0.0)
+
+    def test_sync(self):
+        '''the executions of the child orders are applied, and the finished order is released'''
+        self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.25, stop_price=95)
+        self.transport.add('GET', CHILDREN_PATH, [child('JRF1', OrderSide.BUY, 100, 0.25)])
+        self.transport.add('GET', PARENTS_PATH, [parent('JRP1', 'ACTIVE')])
+        self.assertTrue(self.broker.so_sync())
+        self.assertEqual(self.gate.open_buy_amount, 0.25)
+
+        self.tracker.on_message_executions(None, None, [execution('JRF1', 'x', 100, 0.25)])
+        self.assertEqual(self.gate.position, 0.25)
+
+        self.transport.add('GET', CHILDREN_PATH, [child('JRF1', OrderSide.BUY, 100, 0.25),
+                                                  child('JRF2', OrderSide.SELL, 110, 0.25)])
+        self.tracker.on_message_executions(None, None, [execution('y', 'JRF2', 110, 0.25)])
+        self.transport.add('GET', PARENTS_PATH, [parent('JRP1', 'COMPLETED')])
+        self.assertTrue(self.broker.so_sync())
+        self.assertEqual(self.gate.position, 0.0)   # the execution before the sync is applied too
+        self.assertEqual(self.gate.open_buy_amount, 0.0)
+        self.assertEqual(self.gate.open_notional, 0.0)
+
+        requests = len(self.transport.requests)
+        self.assertTrue(self.broker.so_sync())      # nothing to sync
+        self.assertEqual(len(self.transport.requests), requests)
+
+    def test_send_rejected_releases(self):
+        '''the reservation is released when the order is not accepted'''
+        self.transport.add('POST', SEND_PATH, {'status': -200, 'error_message': 'Insufficient funds'}, 400)
+        result, order_id = self.broker.so_send(OrderType.SIMPLE, [
+            self.broker.so_mk_prms_limit(self.broker.product_code, OrderSide.SELL, 100.0, 0.5)])
+        self.assertEqual((result, order_id), (False, None))
+        self.assertEqual(self.gate.open_sell_amount, 0.0)
+        self.assertEqual(self.gate.open_notional, 0.0)
+
+    def test_send_over_limit(self):
+        '''the first order is checked by RiskGate'''
+        result, _ = self.broker.so_bracket(OrderSide.SELL, None, 90, 2.0, trail_offset=5)
+        self.assertFalse(result)
+        self.assertEqual(self.transport.requests, [])
+
+    def test_bracket_exit(self):
+        '''the exit is the stop order or the trailing stop'''
+        self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.1, stop_price=95)
+        self.assertEqual([p['condition_type'] for p in self.sent_parameters()],
+                         [OrderConditionType.LIMIT, OrderConditionType.LIMIT, OrderConditionType.STOP])
+        self.broker.so_bracket(OrderSide.SELL, None, 90, 0.1, trail_offset=5)
+        parameters = self.sent_parameters()
+        self.assertEqual([p['condition_type'] for p in parameters],
+                         [OrderConditionType.MARKET, OrderConditionType.LIMIT, OrderConditionType.TRAIL])
+        self.assertEqual(parameters[2]['offset'], 5.0)
+
+    def test_bracket_exit_required(self):
+        '''exactly one of stop_price and trail_offset is required'''
+        with self.assertRaises(ValueError):
+            self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.1)
+        with self.assertRaises(ValueError):
+            self.broker.so_bracket(OrderSide.BUY, 100, 110, 0.1, stop_price=95, trail_offset=5)
+        self.assertEqual(self.transport.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
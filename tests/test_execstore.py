@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+'''tests of the execution store'''
+
+import datetime
+import tempfile
+import unittest
+
+from saapibf.execstore import ExecutionStoreWriter, ExecutionStoreReader, INDEX_STRIDE
+
+DAY_NS = 86400 * 1000000000
+START_NS = 1546300800 * 1000000000     # 2019-01-01T00:00:00Z
+STEP_NS = 1000000                       # 1 ms between the executions
+
+
+def ns2str(exec_ns):
+    '''nanoseconds to the exec_date string of the API'''
+    value = datetime.datetime.fromtimestamp(exec_ns // 1000000000, datetime.timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S') + '.%07dZ' % (exec_ns % 1000000000 // 100)
+
+
+def executions(first_id, count, start_ns=START_NS):
+    '''getexecutions dicts of 1 ms interval'''
+    return [{'id': exec_id, 'side': 'BUY' if exec_id % 2 else 'SELL', 'price': 5000000.0 + exec_id,
+             'size': 0.01, 'exec_date': ns2str(start_ns + (exec_id - first_id) * STEP_NS),
+             'buy_child_order_acceptance_id': 'JRF%d' % exec_id,
+             'sell_child_order_acceptance_id': 'JRF%d' % -exec_id}
+            for exec_id in range(first_id, first_id + count)]
+
+
+class ExecutionStoreTest(unittest.TestCase):
+    '''ExecutionStoreWriter / ExecutionStoreReader'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.writer = ExecutionStoreWriter(self.tmp_dir.name, capacity=INDEX_STRIDE)
+        self.addCleanup(self.writer.close)
+        self.reader = ExecutionStoreReader(self.tmp_dir.name)
+
+    def test_day_boundary(self):
+        '''one append across the day boundary is stored in both days'''
+        self.writer.append(executions(1, 10, START_NS + DAY_NS - 5 * STEP_NS))
+        self.assertEqual(self.reader.days(), ['20190101', '20190102'])
+        chunks = self.reader.range(START_NS, START_NS + 2 * DAY_NS)
+        self.assertEqual([(chunk.day, list(chunk.id)) for chunk in chunks],
+                         [('20190101', [1, 2, 3, 4, 5]), ('20190102', [6, 7, 8, 9, 10])])
+        self.assertEqual(list(chunks[1].side), [-1, 1, -1, 1, -1])
+        self.assertEqual(chunks[1].buy_aid[0], b'JRF6')
+        self.assertEqual([len(chunk) for chunk in self.reader.range(START_NS + DAY_NS, START_NS + 2 * DAY_NS)], [5])
+
+    def test_grow_seen_by_live_reader(self):
+        '''the reader opened before the files grow reads the new rows'''
+        self.writer.append(executions(1, 100))
+        self.assertEqual(len(self.reader.range(START_NS, START_NS + DAY_NS)[0]), 100)
+        count = 3 * INDEX_STRIDE + 10      # grows twice
+        self.writer.append(executions(101, count - 100, START_NS + 100 * STEP_NS))
+        chunk = self.reader.range(START_NS, START_NS + DAY_NS)[0]
+        self.assertEqual(len(chunk), count)
+        self.assertEqual(list(chunk.id[-3:]), [count - 2, count - 1, count])
+        self.assertEqual(chunk.price[-1], 5000000.0 + count)
+
+    def test_range_stride_boundaries(self):
+        '''range() around the sparse index entries'''
+        count = 3 * INDEX_STRIDE
+        self.writer.append(executions(0, count))
+        for row in (0, 1, INDEX_STRIDE - 1, INDEX_STRIDE, INDEX_STRIDE + 1, 2 * INDEX_STRIDE, count - 1):
+            row_ns = START_NS + row * STEP_NS
+            chunks = self.reader.range(row_ns, row_ns + STEP_NS)
+            self.assertEqual([list(chunk.id) for chunk in chunks], [[row]], row)
+            chunks = self.reader.range(row_ns, START_NS + count * STEP_NS)
+            self.assertEqual((chunks[0].id[0], len(chunks[0])), (row, count - row), row)
+        self.assertEqual(self.reader.range(START_NS + count * STEP_NS, START_NS + DAY_NS), [])
+        self.assertEqual(self.reader.range(START_NS - DAY_NS, START_NS), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+'''import regression guard of the package (the subsystems are imported lazily)'''
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules which must not be imported by "import saapibf"
+HEAVY_MODULES = ('requests', 'urllib3', 'websocket', 'websockets', 'numpy', 'decimal', 'ssl')
+
+
+def run_python(args):
+    '''run python with the args in a new process and return (stdout, stderr)'''
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable] + args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    return proc.stdout, proc.stderr
+
+
+def imported_modules(statement):
+    '''sys.modules after the statement'''
+    stdout, _ = run_python(['-c', statement + '; import sys; print(" ".join(sys.modules))'])
+    return set(stdout.split())
+
+
+def import_time(statement):
+    '''cumulative import time of saapibf (microseconds) by python -X importtime'''
+    _, stderr = run_python(['-X', 'importtime', '-c', statement])
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and line.split('|')[-1].strip() == 'saapibf':
+            return int(line.split('|')[1])
+    return None
+
+
+class ImportTimeTest(unittest.TestCase):
+    '''import saapibf'''
+
+    def test_no_heavy_modules(self):
+        '''the subsystems are not imported until used'''
+        modules = imported_modules('import saapibf')
+        self.assertIn('saapibf', modules)
+        self.assertEqual(sorted(name for name in modules if name.split('.')[0] in HEAVY_MODULES), [])
+        self.assertEqual(sorted(name for name in modules if name.startswith('saapibf.')), [])
+
+    def test_import_time(self):
+        '''cumulative import time of saapibf (reported, not checked: it depends on the machine)'''
+        times = [import_time('import saapibf') for _ in range(3)]
+        self.assertNotIn(None, times)
+        print('\nimport saapibf: %.1f ms' % (min(times) / 1000), file=sys.stderr)
+
+    def test_lazy_attribute(self):
+        '''the attribute imports its module on first use'''
+        modules = imported_modules('import saapibf; saapibf.RealtimeAPI')
+        self.assertIn('saapibf.realtime', modules)
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('numpy', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
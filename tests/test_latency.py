@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+'''tests of latency.LatencyHistogram / LatencyMonitor'''
+
+import threading
+import time
+import unittest
+
+from saapibf.latency import LatencyHistogram, LatencyMonitor
+
+
+def exchange_time(sec):
+    '''exchange time string (ISO8601 UTC) of the epoch seconds'''
+    frac = round((sec - int(sec)) * 1000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(int(sec))) + '.%03dZ' % frac
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    '''buckets and percentiles'''
+
+    def test_buckets(self):
+        '''a value on the bound is counted in the bucket of the bound'''
+        hist = LatencyHistogram()
+        for value in (0.00005, 0.0001, 0.003, 0.003, 10.0):
+            hist.add(value)
+        buckets = dict(hist.to_dict()['buckets'])
+        self.assertEqual(buckets[0.0001], 2)
+        self.assertEqual(buckets[0.005], 2)
+        self.assertEqual(buckets[None], 1)
+        self.assertEqual(hist.count, 5)
+        self.assertEqual(hist.min, 0.00005)
+        self.assertEqual(hist.max, 10.0)
+
+    def test_percentile(self):
+        '''the percentile is the upper bound of the bucket, capped by max'''
+        hist = LatencyHistogram()
+        self.assertIsNone(hist.percentile(50))
+        for _ in range(98):
+            hist.add(0.0015)
+        hist.add(0.3)
+        hist.add(0.3)
+        self.assertEqual(hist.percentile(50), 0.002)
+        self.assertEqual(hist.percentile(98), 0.002)
+        self.assertEqual(hist.percentile(99), 0.3)      # max is below the bound (0.5)
+        hist.add(7.0)
+        self.assertEqual(hist.percentile(100), 7.0)     # unbounded bucket
+
+    def test_to_dict_empty(self):
+        '''empty histogram'''
+        res = LatencyHistogram().to_dict()
+        self.assertEqual(res['count'], 0)
+        self.assertIsNone(res['ave'])
+        self.assertIsNone(res['p99'])
+
+
+class ClockOffsetTest(unittest.TestCase):
+    '''clock offset estimate'''
+
+    def test_minimum_of_two_windows(self):
+        '''the minimum lag of the current and the previous window'''
+        monitor = LatencyMonitor()
+        self.assertIsNone(monitor.clock_offset)
+        base = int(time.time()) - 10
+
+        def receive(recv_time, lag):
+            monitor.end('lightning_ticker_BTC_JPY', recv_time, recv_time, exchange_time(recv_time - lag))
+
+        receive(base + 0.5, 0.5)
+        receive(base + 1.0, 0.2)
+        receive(base + 1.5, 0.4)
+        self.assertAlmostEqual(monitor.clock_offset, 0.2, places=3)
+
+        window = LatencyMonitor.OFFSET_WINDOW
+        receive(base + window + 20, 0.3)          # the next window keeps the previous minimum
+        self.assertAlmostEqual(monitor.clock_offset, 0.2, places=3)
+        receive(base + window * 2 + 30, 0.4)      # the window of 0.2 is dropped
+        self.assertAlmostEqual(monitor.clock_offset, 0.3, places=3)
+
+        metrics = monitor.get_metrics()
+        self.assertEqual(metrics['channels']['lightning_ticker_BTC_JPY']['recv_lag']['count'], 5)
+        self.assertAlmostEqual(metrics['clock_offset'], 0.3, places=3)
+
+    def test_board_has_no_offset(self):
+        '''the channel without exchange time records dispatch and callback only'''
+        monitor = LatencyMonitor()
+        now = time.time()
+        monitor.end('lightning_board_BTC_JPY', now, now)
+        channel = monitor.get_metrics()['channels']['lightning_board_BTC_JPY']
+        self.assertEqual(channel['callback']['count'], 1)
+        self.assertEqual(channel['recv_lag']['count'], 0)
+        self.assertIsNone(monitor.clock_offset)
+
+
+class WatchdogTest(unittest.TestCase):
+    '''slow callback watchdog'''
+
+    def setUp(self):
+        self.reports = []
+        self.reported = threading.Event()
+        self.monitor = LatencyMonitor(slow_callback=0.02, on_slow_callback=self.on_slow_callback)
+
+    def tearDown(self):
+        self.monitor.stop_watchdog()
+
+    def on_slow_callback(self, monitor, channel, elapsed, stack):
+        '''[callback] slow callback'''
+        self.reports.append((monitor, channel, elapsed, stack))
+        self.reported.set()
+
+    def slow_callback(self, channel):
+        '''callback of the feed blocking until reported'''
+        start_time = self.monitor.begin(channel)
+        self.assertTrue(self.reported.wait(2.0))
+        self.monitor.end(channel, start_time, start_time)
+
+    def test_reported_once(self):
+        '''the stack of the slow callback is reported once'''
+        self.monitor.start_watchdog()
+        self.slow_callback('lightning_ticker_BTC_JPY')
+        time.sleep(0.05)
+        self.assertEqual(len(self.reports), 1)
+        monitor, channel, elapsed, stack = self.reports[0]
+        self.assertIs(monitor, self.monitor)
+        self.assertEqual(channel, 'lightning_ticker_BTC_JPY')
+        self.assertGreater(elapsed, 0.02)
+        self.assertIn('slow_callback', stack)
+        self.assertEqual(self.monitor.slow_callbacks, 1)
+
+    def test_restart(self):
+        '''the watchdog restarted right after stop keeps running'''
+        self.monitor.start_watchdog()
+        self.monitor.stop_watchdog()
+        self.monitor.start_watchdog()
+        self.slow_callback('lightning_executions_BTC_JPY')
+        self.assertEqual(len(self.reports), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''tests of OrderPacer'''
+
+import time
+import unittest
+
+from saapibf.broker import BrokerAPI
+from saapibf.const import HealthStatus, StateStatus
+from saapibf.pacing import OrderPacer
+from saapibf.transport import FakeTransport
+
+CircuitState = OrderPacer.CircuitState
+
+
+def make_pacer(**kwargs):
+    '''pacer opened by 2 errors of 2 samples'''
+    kwargs.setdefault('base_rate', 1000.0)
+    return OrderPacer(min_samples=2, error_rate=0.5, latency_limit=None, **kwargs)
+
+
+class CircuitTest(unittest.TestCase):
+    '''circuit of the status and the error rate'''
+
+    def open_by_errors(self, pacer):
+        '''open the circuit by the error rate'''
+        for _ in range(2):
+            self.assertEqual(pacer.acquire(), (True, None))
+            pacer.record(False, 0.01)
+        self.assertEqual(pacer.circuit, CircuitState.OPEN)
+
+    def test_status(self):
+        '''the bad status opens the circuit until a good poll'''
+        pacer = make_pacer()
+        pacer.update_status(HealthStatus.STOP)
+        self.assertEqual(pacer.acquire(), (False, OrderPacer.Reason.CIRCUIT_OPEN))
+        pacer.update_status(HealthStatus.NORMAL, StateStatus.RUNNING)
+        self.assertEqual(pacer.circuit, CircuitState.CLOSED)
+        self.assertEqual(pacer.acquire(), (True, None))
+
+    def test_good_poll_keeps_error_cooldown(self):
+        '''a good poll does not close the circuit opened by the error rate'''
+        pacer = make_pacer(open_time=60.0)
+        self.open_by_errors(pacer)
+        pacer.update_status(HealthStatus.NORMAL)
+        self.assertEqual(pacer.circuit, CircuitState.OPEN)
+        pacer.update_status(HealthStatus.NO_ORDER)
+        pacer.update_status(HealthStatus.NORMAL)
+        self.assertEqual(pacer.circuit, CircuitState.OPEN)
+        self.assertEqual(pacer.acquire(), (False, OrderPacer.Reason.CIRCUIT_OPEN))
+
+    def test_cooldown_waits_status(self):
+        '''the circuit is closed when both the cooldown and the status are cleared'''
+        pacer = make_pacer(open_time=0.05)
+        self.open_by_errors(pacer)
+        pacer.update_status(HealthStatus.STOP)
+        time.sleep(0.06)
+        self.assertEqual(pacer.acquire(), (False, OrderPacer.Reason.CIRCUIT_OPEN))
+        pacer.update_status(HealthStatus.NORMAL)
+        self.assertEqual(pacer.acquire(), (True, None))     # trial
+        self.assertEqual(pacer.circuit, CircuitState.HALF_OPEN)
+        self.assertEqual(pacer.acquire(), (False, OrderPacer.Reason.CIRCUIT_OPEN))
+        pacer.record(True, 0.01)
+        self.assertEqual(pacer.circuit, CircuitState.CLOSED)
+
+    def test_rejected_not_error(self):
+        '''the orders rejected for their content are not errors'''
+        pacer = make_pacer()
+        for _ in range(5):
+            self.assertEqual(pacer.acquire(), (True, None))
+            pacer.record(False, 0.01, rejected=True)
+        self.assertEqual(pacer.circuit, CircuitState.CLOSED)
+        self.assertEqual(pacer.get_status()['error_rate'], 0.0)
+
+
+class BrokerPacingTest(unittest.TestCase):
+    '''the results of BrokerAPI recorded to OrderPacer'''
+
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.broker = BrokerAPI('key', 'secret', log=False, transport=self.transport)
+        self.pacer = make_pacer()
+        self.broker.set_pacer(self.pacer)
+
+    def tearDown(self):
+        self.broker.close()
+
+    def send_orders(self, status_code, body):
+        '''send 3 orders answered by the response'''
+        self.transport.add('POST', '/v1/me/sendchildorder', body, status_code)
+        return [self.broker.order_buy_limit(100, 0.01)[0] for _ in range(3)]
+
+    def test_business_rejection(self):
+        '''insufficient funds (HTTP 400) does not open the circuit'''
+        body = {'status': -200, 'error_message': 'Insufficient funds', 'data': None}
+        self.assertEqual(self.send_orders(400, body), [False] * 3)
+        self.assertEqual(self.pacer.circuit, CircuitState.CLOSED)
+
+    def test_server_error(self):
+        '''server errors open the circuit'''
+        body = {'status': -500, 'error_message': 'Internal server error', 'data': None}
+        self.assertEqual(self.send_orders(500, body), [False] * 3)
+        self.assertEqual(self.pacer.circuit, CircuitState.OPEN)
+        self.assertEqual(len(self.transport.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
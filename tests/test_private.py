@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''tests of PrivateAPI through FakeTransport'''
+
+import hashlib
+import hmac
+import os
+import tempfile
+import time
+import unittest
+
+from saapibf.private import PrivateAPI
+from saapibf.transport import FakeTransport
+
+API_SECRET = 'secret'
+
+
+def valid_sign(method, path, data, headers):
+    '''the signature of the request is valid'''
+    text = headers['ACCESS-TIMESTAMP'] + method + path + data
+    return hmac.new(API_SECRET.encode(), text.encode(), hashlib.sha256).hexdigest() == headers['ACCESS-SIGN']
+
+
+class RetryTest(unittest.TestCase):
+    '''retry on the broken connection'''
+
+    def setUp(self):
+        # the retry appends error_session.log to the current directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        self.transport = FakeTransport()
+        self.api = PrivateAPI('key', API_SECRET, get_timeout=None, post_timeout=None, transport=self.transport)
+        self.failures = 1
+
+        def cancel(*_):
+            if self.failures > 0:
+                self.failures -= 1
+                time.sleep(0.01)
+                raise ConnectionError('broken pipe')
+            return 200, {}
+
+        self.transport.add('POST', '/v1/me/cancelallchildorders', cancel)
+
+    def assert_logged(self):
+        '''the retry is logged'''
+        with open('error_session.log') as ferr:
+            self.assertEqual(len(ferr.readlines()), 1)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_post_signed_for_each_attempt(self):
+        '''the retried POST has a new timestamp and a valid signature'''
+        self.api.send_cancelallchildorders('BTC_JPY')
+        self.assertEqual(len(self.transport.requests), 2)
+        (_, _, headers1, data1), (_, _, headers2, data2) = self.transport.requests
+        self.assertEqual(data1, data2)
+        self.assertNotEqual(headers1['ACCESS-TIMESTAMP'], headers2['ACCESS-TIMESTAMP'])
+        for headers in (headers1, headers2):
+            self.assertTrue(valid_sign('POST', '/v1/me/cancelallchildorders', data1, headers))
+        self.assert_logged()
+
+    def test_staged_signed_for_each_attempt(self):
+        '''the retried staged POST has a new timestamp and a valid signature'''
+        staged = self.api.stage_post('/v1/me/cancelallchildorders', {'product_code': 'BTC_JPY'})
+        self.api.send_staged(staged)
+        (_, _, headers1, data1), (_, _, headers2, _) = self.transport.requests
+        self.assertNotEqual(headers1['ACCESS-TIMESTAMP'], headers2['ACCESS-TIMESTAMP'])
+        for headers in (headers1, headers2):
+            self.assertTrue(valid_sign('POST', '/v1/me/cancelallchildorders', data1, headers))
+        self.assert_logged()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+'''tests of the hedged requests of PublicAPI through FakeTransport'''
+
+import threading
+import time
+import unittest
+
+from saapibf.public import PublicAPI
+from saapibf.transport import FakeTransport
+
+TICKER_PATH = '/v1/getticker'
+
+
+class SlowFirstRoute(object):
+    '''route answering the first attempt of each request after delay, and the others at once'''
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, *_):
+        with self.__lock:
+            self.calls += 1
+            attempt = self.calls
+        if attempt % 2 == 1 and self.delay > 0:
+            time.sleep(self.delay)
+            return 200, {'attempt': 'first'}
+        return 200, {'attempt': 'second'}
+
+
+class HedgeTest(unittest.TestCase):
+    '''hedged requests'''
+
+    def make_api(self, route, **kwargs):
+        '''PublicAPI with hedge of the route'''
+        transport = FakeTransport()
+        transport.add('GET', TICKER_PATH, route)
+        api = PublicAPI(hedge=True, transport=transport, **kwargs)
+        self.addCleanup(api.close)
+        return api, transport
+
+    def test_fast_not_hedged(self):
+        '''the response within the delay is not hedged'''
+        api, transport = self.make_api(SlowFirstRoute(0.0), hedge_delay=1.0, hedge_max_ratio=1.0)
+        self.assertEqual(api.get_ticker('BTC_JPY'), {'attempt': 'second'})
+        self.assertEqual(len(transport.requests), 1)
+        self.assertEqual(api.get_hedge_stats()['hedged'], 0)
+
+    def test_hedge_wins(self):
+        '''the second request is sent after the delay and the first response wins'''
+        api, transport = self.make_api(SlowFirstRoute(0.3), hedge_delay=0.02, hedge_max_ratio=1.0)
+        start_time = time.time()
+        self.assertEqual(api.get_ticker('BTC_JPY'), {'attempt': 'second'})
+        self.assertLess(time.time() - start_time, 0.25)
+        self.assertEqual(len(transport.requests), 2)
+        stats = api.get_hedge_stats()
+        self.assertEqual((stats['requests'], stats['hedged'], stats['hedge_wins']), (1, 1, 1))
+
+    def test_first_wins(self):
+        '''the first request still wins if it answers before the hedge'''
+        def route(*_):
+            with lock:
+                calls.append(None)
+                attempt = len(calls)
+            time.sleep(0.05 if attempt == 1 else 0.5)
+            return 200, {'attempt': attempt}
+
+        calls = []
+        lock = threading.Lock()
+        api, _ = self.make_api(route, hedge_delay=0.02, hedge_max_ratio=1.0)
+        self.assertEqual(api.get_ticker('BTC_JPY'), {'attempt': 1})
+        stats = api.get_hedge_stats()
+        self.assertEqual((stats['hedged'], stats['hedge_wins']), (1, 0))
+
+    def test_ratio_cap(self):
+        '''the ratio of the hedged requests is capped by hedge_max_ratio'''
+        route = SlowFirstRoute(0.05)
+        api, _ = self.make_api(route, hedge_delay=0.01, hedge_max_ratio=0.5)
+        for _ in range(4):
+            api.get_ticker('BTC_JPY')
+        # 1/1 > 0.5: not hedged, 1/2: hedged, 2/3: not hedged, 2/4: hedged
+        stats = api.get_hedge_stats()
+        self.assertEqual((stats['requests'], stats['hedged'], stats['hedge_ratio']), (4, 2, 0.5))
+
+    def test_p95_recomputed_periodically(self):
+        '''p95 is recomputed every 50 samples after the window is full'''
+        def route(*_):
+            time.sleep(delay[0])
+            return 200, {}
+
+        delay = [0.0]
+        api, _ = self.make_api(route, hedge_delay=5.0, hedge_max_ratio=0.0)
+        for _ in range(PublicAPI.LATENCY_WINDOW):
+            api.get_ticker('BTC_JPY')
+        p95 = api.get_hedge_stats()['p95_latency']
+        delay[0] = 0.01
+        for _ in range(49):     # over 5% of the window
+            api.get_ticker('BTC_JPY')
+        self.assertEqual(api.get_hedge_stats()['p95_latency'], p95)
+        api.get_ticker('BTC_JPY')
+        self.assertGreaterEqual(api.get_hedge_stats()['p95_latency'], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
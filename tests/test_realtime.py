@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''tests of the reconnect of RealtimeAPI with the stand-in backend'''
+
+import threading
+import unittest
+
+from saapibf.realtime import RealtimeAPI
+
+from fakews import FakeServer, wait_for, board_message
+
+Channel = RealtimeAPI.ListenChannel
+
+
+class ReconnectTest(unittest.TestCase):
+    '''resubscribe and board resync after the connection is dropped'''
+
+    def start(self, channels, **kwargs):
+        '''start the feed and wait for the connection'''
+        self.server = FakeServer()
+        self.boards = []
+        self.gaps = []
+        self.feed = RealtimeAPI(channels, reconnect=True, reconnect_min_wait=0.01, reconnect_max_wait=0.01,
+                                ws_backend=self.server.backend,
+                                on_message_board=lambda _, __, data: self.boards.append(('B', data.bids[0]['size'])),
+                                on_message_board_snapshot=lambda _, __, data: self.boards.append(
+                                    ('S', data.bids[0]['size'])),
+                                on_reconnect=lambda _, gap: self.gaps.append(gap), **kwargs)
+        self.thread = threading.Thread(target=self.feed.start, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.wait_connection(0))
+        return self.server.connections[0]
+
+    def wait_connection(self, index):
+        '''wait for the connection of the index to be opened'''
+        return wait_for(lambda: len(self.server.connections) > index
+                        and self.server.connections[index].opened.is_set())
+
+    def tearDown(self):
+        self.feed.stop()
+        self.thread.join(2.0)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_resync_by_snapshot(self):
+        '''the differences are dropped after the gap until the next snapshot'''
+        channels = [Channel.BOARD_SNAPSHOT_BTC_JPY, Channel.BOARD_BTC_JPY]
+        conn0 = self.start(channels)
+        snapshot_channel = Channel.BOARD_SNAPSHOT_BTC_JPY.value
+        board_channel = Channel.BOARD_BTC_JPY.value
+        conn0.push(snapshot_channel, board_message(1))
+        conn0.push(board_channel, board_message(2))
+        self.assertTrue(wait_for(lambda: len(self.boards) == 2))
+        self.assertFalse(self.feed.is_board_stale('BTC_JPY'))
+
+        conn0.drop()
+        self.assertTrue(self.wait_connection(1))
+        self.assertTrue(wait_for(lambda: len(self.gaps) == 1))
+        for channel in channels:
+            self.assertEqual(self.server.subscribed(1, channel.value), 1)
+        self.assertEqual(self.feed.reconnect_count, 1)
+        self.assertTrue(self.feed.is_board_stale('BTC_JPY'))
+
+        conn1 = self.server.connections[1]
+        conn1.push(board_channel, board_message(3))     # dropped
+        conn1.push(snapshot_channel, board_message(4))
+        conn1.push(board_channel, board_message(5))
+        self.assertTrue(wait_for(lambda: len(self.boards) == 4))
+        self.assertEqual(self.boards[2:], [('S', 4), ('B', 5)])
+        self.assertFalse(self.feed.is_board_stale('BTC_JPY'))
+
+    def test_board_only(self):
+        '''the board without the snapshot is marked stale, and the differences are delivered'''
+        conn0 = self.start([Channel.BOARD_BTC_JPY])
+        conn0.drop()
+        self.assertTrue(self.wait_connection(1))
+        self.assertEqual(self.server.subscribed(1, Channel.BOARD_BTC_JPY.value), 1)
+        self.assertTrue(self.feed.is_board_stale('BTC_JPY'))
+        self.assertEqual(self.feed.get_metrics()['stale_pairs'], ['BTC_JPY'])
+
+        self.server.connections[1].push(Channel.BOARD_BTC_JPY.value, board_message(1))
+        self.assertTrue(wait_for(lambda: len(self.boards) == 1))
+        self.assertTrue(self.feed.is_board_stale('BTC_JPY'))
+        self.feed.clear_board_stale('BTC_JPY')
+        self.assertFalse(self.feed.is_board_stale('BTC_JPY'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''tests of RedundantRealtimeAPI with the stand-in backend'''
+
+import threading
+import unittest
+
+from saapibf.realtime import RealtimeAPI
+from saapibf.redundant import RedundantRealtimeAPI
+
+from fakews import FakeServer, wait_for, ticker_message, executions_message, board_message
+
+Channel = RealtimeAPI.ListenChannel
+
+
+class RedundantTest(unittest.TestCase):
+    '''RedundantRealtimeAPI of 2 connections'''
+
+    def start(self, channels, **kwargs):
+        '''start the feed and wait for the 2 connections'''
+        self.server = FakeServer()
+        kwargs.setdefault('reconnect_min_wait', 10.0)     # the dropped connection stays down
+        kwargs.setdefault('reconnect_max_wait', 10.0)
+        self.feed = RedundantRealtimeAPI(channels, connections=2, ws_backend=self.server.backend, **kwargs)
+        self.thread = threading.Thread(target=self.feed.start, daemon=True)
+        self.thread.start()
+        self.assertTrue(wait_for(lambda: len(self.server.connections) == 2
+                                 and all(conn.opened.is_set() for conn in self.server.connections)))
+        return self.server.connections
+
+    def tearDown(self):
+        self.feed.stop()
+        self.thread.join(2.0)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_dedupe_and_stats(self):
+        '''the executions are delivered once, and the leads and lags are counted'''
+        received = []
+        conn0, conn1 = self.start([Channel.EXECUTIONS_BTC_JPY],
+                                  on_message_executions=lambda _, __, dlist: received.extend(
+                                      data.order_id for data in dlist))
+        channel = Channel.EXECUTIONS_BTC_JPY.value
+        conn0.push(channel, executions_message(1, 2))
+        self.assertTrue(wait_for(lambda: len(received) == 2))
+        conn1.push(channel, executions_message(1, 2, 3))
+        self.assertTrue(wait_for(lambda: len(received) == 3))
+        self.assertEqual(received, [1, 2, 3])
+
+        stats = self.feed.get_stats()
+        self.assertEqual([(st['messages'], st['leads'], st['lags']) for st in stats], [(2, 2, 0), (3, 1, 2)])
+        self.assertGreaterEqual(stats[1]['lag_max'], 0.0)
+
+    def test_callback_calls_get_stats(self):
+        '''the callbacks are called without the lock (get_stats in the callback)'''
+        stats_list = []
+        self.start([Channel.TICKER_BTC_JPY],
+                   on_message_ticker=lambda api, _, __: stats_list.append(api.get_stats()))
+        for conn in self.server.connections:
+            conn.push(Channel.TICKER_BTC_JPY.value, ticker_message(1))
+        self.assertTrue(wait_for(lambda: sum(st['messages'] for st in self.feed.get_stats()) == 2))
+        self.assertEqual(len(stats_list), 1)
+
+    def test_board_failover(self):
+        '''the board is delivered from the primary, and from the next one after its snapshot'''
+        boards = []
+        conn0, conn1 = self.start([Channel.BOARD_SNAPSHOT_BTC_JPY, Channel.BOARD_BTC_JPY],
+                                  on_message_board=lambda _, __, data: boards.append(('B', data.bids[0]['size'])),
+                                  on_message_board_snapshot=lambda _, __, data: boards.append(
+                                      ('S', data.bids[0]['size'])))
+        snapshot_channel = Channel.BOARD_SNAPSHOT_BTC_JPY.value
+        board_channel = Channel.BOARD_BTC_JPY.value
+        for conn in (conn0, conn1):
+            conn.push(snapshot_channel, board_message(1))
+            conn.push(board_channel, board_message(2))
+            # the same difference can repeat legally
+            conn.push(board_channel, board_message(2))
+        self.assertTrue(wait_for(lambda: sum(st['messages'] for st in self.feed.get_stats()) == 6))
+        self.assertEqual(boards, [('S', 1), ('B', 2), ('B', 2)])
+        self.assertEqual(self.feed.board_primary, 0)
+
+        conn0.drop()
+        # the snapshot is subscribed again on the new primary
+        self.assertTrue(wait_for(lambda: self.server.subscribed(1, snapshot_channel) == 2))
+        self.assertEqual(self.feed.board_primary, 1)
+        conn1.push(board_channel, board_message(3))     # waiting for the snapshot
+        conn1.push(snapshot_channel, board_message(4))
+        conn1.push(board_channel, board_message(5))
+        self.assertTrue(wait_for(lambda: len(boards) == 5))
+        self.assertEqual(boards[3:], [('S', 4), ('B', 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''tests of the transports'''
+
+import threading
+import unittest
+
+import requests
+
+from saapibf.broker import BrokerAPI
+from saapibf.private import PrivateAPI
+from saapibf.transport import RequestsTransport, FakeTransport
+
+THREADS = 16
+CALLS = 50
+
+
+class LocalAdapter(requests.adapters.BaseAdapter):
+    '''requests adapter answering {"path": path} without network'''
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+        self.closed = False
+
+    def send(self, request, **kwargs):     # pylint: disable=arguments-differ,unused-argument
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = ('{"path": "%s"}' % request.path_url).encode()  # pylint: disable=protected-access
+        response.request = request
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+def run_threads(target, count=THREADS):
+    '''run target(index) in the threads started at once, and return the results'''
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10.0)
+    return results
+
+
+class RequestsTransportTest(unittest.TestCase):
+    '''RequestsTransport'''
+
+    def stress(self, thread_local):
+        '''the threads share one PrivateAPI, and return (session, adapter, paths) of each thread'''
+        transport = RequestsTransport(thread_local=thread_local)
+        api = PrivateAPI('key', 'secret', transport=transport)
+        lock = threading.Lock()
+
+        def worker(_):
+            session = transport.session()
+            with lock:
+                adapter = session.get_adapter('https://api.bitflyer.com')
+                if not isinstance(adapter, LocalAdapter):
+                    adapter = LocalAdapter()
+                    session.mount('https://', adapter)
+            paths = [api.get_getbalance()['path'] for _ in range(CALLS)]
+            return session, adapter, paths
+
+        results = run_threads(worker)
+        self.assertNotIn(None, results)
+        for _, _, paths in results:
+            self.assertEqual(paths, ['/v1/me/getbalance'] * CALLS)
+        transport.close()
+        return results
+
+    def test_stress_thread_local(self):
+        '''each thread has its own session, and close() closes all of them'''
+        results = self.stress(thread_local=True)
+        self.assertEqual(len(set(id(session) for session, _, _ in results)), THREADS)
+        for _, adapter, _ in results:
+            self.assertEqual(adapter.sent, CALLS)
+            self.assertTrue(adapter.closed)
+
+    def test_stress_shared(self):
+        '''the threads share one session'''
+        results = self.stress(thread_local=False)
+        self.assertEqual(len(set(id(session) for session, _, _ in results)), 1)
+        adapter = results[0][1]
+        self.assertEqual(adapter.sent, THREADS * CALLS)
+        self.assertTrue(adapter.closed)
+
+    def test_session_after_close(self):
+        '''the session is created again after close()'''
+        for thread_local in (False, True):
+            transport = RequestsTransport(thread_local=thread_local)
+            session = transport.session()
+            transport.close()
+            self.assertIsNot(transport.session(), session)
+            transport.close()
+
+
+class FakeTransportTest(unittest.TestCase):
+    '''FakeTransport shared by threads'''
+
+    def test_stress(self):
+        '''all the requests of the threads are answered and recorded'''
+        transport = FakeTransport()
+        transport.add('GET', '/v1/me/getbalance', lambda *_: (200, [{'currency_code': 'JPY', 'amount': 1.0}]))
+        api = PrivateAPI('key', 'secret', transport=transport)
+        results = run_threads(lambda _: [api.get_getbalance()[0]['amount'] for _ in range(CALLS)])
+        self.assertEqual(results, [[1.0] * CALLS] * THREADS)
+        self.assertEqual(len(transport.requests), THREADS * CALLS)
+
+
+class BrokerTransportTest(unittest.TestCase):
+    '''transport options of BrokerAPI'''
+
+    def test_private_options(self):
+        '''pool_size and thread_local are given to the private API, and close() closes it'''
+        broker = BrokerAPI('key', 'secret', log=False, pool_size=32, thread_local=True)
+        transport = broker._prv_api.transport     # pylint: disable=protected-access
+        self.assertEqual(transport.pool_size, 32)
+        self.assertTrue(transport.thread_local)
+        adapter = LocalAdapter()
+        transport.session().mount('https://', adapter)
+        broker.close()
+        self.assertTrue(adapter.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
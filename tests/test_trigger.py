@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+'''tests of trigger.TriggerEngine'''
+
+import unittest
+
+from saapibf.const import OrderSide
+from saapibf.trigger import TriggerEngine
+
+
+class StandInBroker(object):
+    '''broker recording the orders'''
+
+    def __init__(self):
+        self.orders = []
+
+    def order_sell_market(self, amount):
+        '''market sell'''
+        self.orders.append(('SELL', None, amount))
+        return True, 'JRF%d' % len(self.orders)
+
+    def order_buy_limit(self, price, amount):
+        '''limit buy'''
+        self.orders.append(('BUY', price, amount))
+        return True, 'JRF%d' % len(self.orders)
+
+    def warm_connection(self):
+        '''nothing to open'''
+
+
+class TriggerEngineTest(unittest.TestCase):
+    '''triggers fired by the prices and the time'''
+
+    def setUp(self):
+        self.fired = []
+        self.engine = TriggerEngine(None, workers=1, warm_interval=None)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def action(self, _, trigger, price):
+        '''action recording the fired trigger'''
+        self.fired.append((trigger.trigger_id, price))
+
+    def add(self, method, level, side=OrderSide.SELL):
+        '''arm the trigger with the recording action'''
+        return method(side, level, 0.01, action=self.action)
+
+    def fired_ids(self):
+        '''ids of the fired triggers (after the worker has run them)'''
+        self.engine.close()
+        return [trigger_id for trigger_id, _ in self.fired]
+
+    def test_order(self):
+        '''ABOVE fires in the order of the level, then BELOW and TIME'''
+        engine = self.engine
+        above_110 = self.add(engine.add_above, 110)
+        above_103 = self.add(engine.add_above, 103)
+        above_105 = self.add(engine.add_above, 105)
+        below_90 = self.add(engine.add_below, 90)
+        below_95 = self.add(engine.add_below, 95)
+        at_100 = self.add(engine.add_time, 100.0)
+
+        engine.update_price(100, now=50.0)
+        engine.update_price(106, now=60.0)
+        engine.update_price(94, now=70.0)
+        engine.poll(now=80.0)
+        self.assertEqual(set(engine.triggers), {above_110, below_90, at_100})
+        engine.update_price(120, now=100.0)       # ABOVE before TIME in one update
+        engine.update_price(90, now=110.0)
+        self.assertEqual(engine.triggers, {})
+        self.assertEqual(self.fired_ids(), [above_103, above_105, below_95, above_110, at_100, below_90])
+        self.assertEqual(self.fired[0][1], 106.0)
+        self.assertEqual(self.fired[4][1], 120.0)
+
+    def test_poll_time(self):
+        '''the time trigger fires by poll() without prices, with the last price'''
+        at_100 = self.add(self.engine.add_time, 100.0)
+        self.engine.poll(now=99.0)
+        self.engine.update_price(5000, now=99.5)
+        self.engine.poll(now=100.0)
+        self.assertEqual(self.fired_ids(), [at_100])
+        self.assertEqual(self.fired, [(at_100, 5000.0)])
+
+    def test_cancel(self):
+        '''the cancelled trigger does not fire'''
+        engine = self.engine
+        engine.update_price(100)
+        below = self.add(engine.add_below, 90)
+        trail = self.add(engine.add_trailing, 5)
+        kept = self.add(engine.add_below, 85)
+        self.assertTrue(engine.cancel(below))
+        self.assertTrue(engine.cancel(trail))
+        self.assertFalse(engine.cancel(below))
+        engine.update_price(80)
+        self.assertEqual(self.fired_ids(), [kept])
+
+    def test_trailing_merge(self):
+        '''the triggers armed at different bests share the new best after merged'''
+        engine = self.engine
+        engine.update_price(100)
+        first = self.add(engine.add_trailing, 10)       # best 100
+        engine.update_price(98)
+        second = self.add(engine.add_trailing, 3)       # best 98 (another group)
+        engine.update_price(99)                         # second: best 99, level 96
+        engine.update_price(104)                        # merged: best 104, levels 94 and 101
+        engine.update_price(102)
+        self.assertEqual(set(engine.triggers), {first, second})
+        engine.update_price(101)
+        self.assertEqual(set(engine.triggers), {first})
+        engine.update_price(94.5)
+        engine.update_price(94)
+        self.assertEqual(self.fired_ids(), [second, first])
+        self.assertEqual(self.fired, [(second, 101.0), (first, 94.0)])
+
+    def test_trailing_buy(self):
+        '''the buy trailing trigger fires when price rises offset from the lowest'''
+        engine = self.engine
+        engine.update_price(100)
+        buy = self.add(engine.add_trailing, 5, OrderSide.BUY)
+        engine.update_price(104)
+        engine.update_price(95)
+        engine.update_price(99)
+        self.assertIn(buy, engine.triggers)
+        engine.update_price(100)
+        self.assertEqual(self.fired_ids(), [buy])
+        self.assertEqual(self.fired, [(buy, 100.0)])
+
+    def test_trailing_without_price(self):
+        '''the trailing trigger requires the last price'''
+        with self.assertRaises(ValueError):
+            self.add(self.engine.add_trailing, 10)
+        self.assertEqual(self.engine.triggers, {})
+
+
+class TriggerOrderTest(unittest.TestCase):
+    '''orders sent by the fired triggers'''
+
+    def test_on_fired(self):
+        '''the market and limit orders are sent, and on_fired is called'''
+        broker = StandInBroker()
+        fired = []
+        engine = TriggerEngine(broker, workers=1,
+                               on_fired=lambda _, trigger, result, order_id: fired.append(
+                                   (trigger.trigger_id, result, order_id)))
+        stop = engine.add_stop(OrderSide.SELL, 95, 0.01)
+        entry = engine.add_take_profit(OrderSide.BUY, 90, 0.02, price=89)
+        engine.update_price(94)
+        engine.update_price(90)
+        engine.close()
+        self.assertEqual(broker.orders, [('SELL', None, 0.01), ('BUY', 89, 0.02)])
+        self.assertEqual(fired, [(stop, True, 'JRF1'), (entry, True, 'JRF2')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+'''tests of the WebSocket backends against a local server'''
+
+import threading
+import unittest
+import warnings
+
+from websockets.sync.server import serve
+
+from saapibf.wsbackend import WebSocketClientBackend, WebsocketsBackend
+
+MESSAGES = ['m1', 'm2', 'm3']
+
+
+class PushServer(object):
+    '''local server sending MESSAGES on each connection, then closing it'''
+
+    def __init__(self):
+        self.__server = serve(self.__handler, '127.0.0.1', 0, close_timeout=0.1)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @staticmethod
+    def __handler(ws):
+        for message in MESSAGES:
+            ws.send(message)
+        ws.close()
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.__server.shutdown()
+        self.__thread.join()
+
+    @property
+    def url(self):
+        '''[property] URL of the server'''
+        return 'ws://127.0.0.1:%d' % self.__server.socket.getsockname()[1]
+
+
+class BackendTestMixin(object):
+    '''common tests of the backends'''
+
+    backend = None
+
+    def run_backend(self, on_message, on_open=lambda _: None):
+        '''run one connection, return the errors given to on_error except the closed connection'''
+        errors = []
+        closed = []
+        with PushServer() as server:
+            conn = self.backend(server.url,
+                                on_open=on_open,
+                                on_message=on_message,
+                                on_close=lambda _, *args: closed.append(args),
+                                on_error=lambda _, e: errors.append(e))
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always', DeprecationWarning)
+                conn.run_forever(0, 1)
+        self.assertEqual([str(w.message) for w in caught if issubclass(w.category, DeprecationWarning)], [])
+        self.assertEqual(len(closed), 1)
+        return [e for e in errors if not isinstance(e, conn.connection_errors)]
+
+    def test_messages(self):
+        '''all messages are delivered'''
+        received = []
+        errors = self.run_backend(lambda _, message: received.append(message))
+        self.assertEqual(received, MESSAGES)
+        self.assertEqual(errors, [])
+
+    def test_message_handler_error(self):
+        '''an error of on_message goes to on_error and the next messages are delivered'''
+        received = []
+
+        def on_message(_, message):
+            received.append(message)
+            if message == 'm1':
+                raise ValueError('bad message')
+
+        errors = self.run_backend(on_message)
+        self.assertEqual(received, MESSAGES)
+        self.assertEqual([type(e) for e in errors], [ValueError])
+
+    def test_open_handler_error(self):
+        '''an error of on_open goes to on_error and the messages are delivered'''
+        received = []
+
+        def on_open(_):
+            raise ValueError('bad open')
+
+        errors = self.run_backend(lambda _, message: received.append(message), on_open=on_open)
+        self.assertEqual(received, MESSAGES)
+        self.assertEqual([type(e) for e in errors], [ValueError])
+
+
+class WebSocketClientBackendTest(BackendTestMixin, unittest.TestCase):
+    '''WebSocketClientBackend'''
+
+    backend = WebSocketClientBackend
+
+
+class WebsocketsBackendTest(BackendTestMixin, unittest.TestCase):
+    '''WebsocketsBackend'''
+
+    backend = WebsocketsBackend
+
+
+if __name__ == '__main__':
+    unittest.main()